@@ -1,9 +1,18 @@
-import requests
+import contextlib
 import json
+import httpx
 from abc import ABC, abstractmethod
+from utils.http_client import get_client
+from utils.error_handler import APIError
+from utils.rate_limiter import estimate_tokens, get_limiter
+from utils.request_policy import call_with_policy
+from utils.single_flight import SingleFlight, payload_key
 import config
 
 class BaseAgent(ABC):
+    # Selects the deadline and latency histogram of the agent's model calls
+    call_type = "default"
+
     def __init__(self, model_name):
         self.api_url = config.DEEPSEEK_API_URL
         self.api_key = config.DEEPSEEK_API_KEY
@@ -12,12 +21,12 @@ class BaseAgent(ABC):
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-    
-    def call_api(self, messages, max_tokens=512, temperature=0.7):
-        """Call the DeepSeek API with the given messages."""
-        payload = {
+
+    def _build_payload(self, messages, max_tokens, temperature, stream):
+        """Build the request payload for the chat completions endpoint."""
+        return {
             "model": self.model_name,
-            "stream": False,
+            "stream": stream,
             "max_tokens": max_tokens,
             "enable_thinking": True,
             "thinking_budget": 512,
@@ -30,14 +39,98 @@ class BaseAgent(ABC):
             "stop": [],
             "messages": messages
         }
-        
-        try:
-            response = requests.post(self.api_url, json=payload, headers=self.headers)
+
+    async def call_api(self, messages, max_tokens=512, temperature=0.7):
+        """Call the DeepSeek API with the given messages."""
+        payload = self._build_payload(messages, max_tokens, temperature, stream=False)
+        limiter = get_limiter(self.model_name)
+        tokens = estimate_tokens(messages, max_tokens)
+
+        async def send():
+            response = await get_client().post(self.api_url, json=payload, headers=self.headers)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"API call failed: {str(e)}")
-    
+            try:
+                result = response.json()
+            except ValueError as e:
+                # Retried like a dropped connection: the body was most likely cut off
+                raise httpx.DecodingError(f"Malformed response body: {str(e)}", request=response.request)
+            usage = (result.get("usage") or {}).get("total_tokens")
+            if usage:
+                limiter.record_usage(tokens, usage)
+            return result
+
+        async def call():
+            return await call_with_policy(self.call_type, send, limiter, tokens)
+
+        try:
+            if config.SINGLE_FLIGHT_ENABLED:
+                # Identical requests already in flight (e.g. a burst of equal intents) are sent once
+                return await SingleFlight().do(payload_key(self.api_url, payload), call)
+            return await call()
+        except httpx.HTTPError as e:
+            raise APIError(f"API call failed: {str(e)}")
+
+    async def stream_api(self, messages, max_tokens=512, temperature=0.7):
+        """Call the DeepSeek API in streaming mode and yield content deltas as they arrive.
+
+        Opening the stream and waiting for its first delta go through the same
+        deadline and retries as call_api; once a delta was yielded the stream
+        is not retried. Streams are not shared between identical calls.
+        """
+        payload = self._build_payload(messages, max_tokens, temperature, stream=True)
+        limiter = get_limiter(self.model_name)
+
+        async def connect():
+            stack = contextlib.AsyncExitStack()
+            try:
+                response = await stack.enter_async_context(
+                    get_client().stream("POST", self.api_url, json=payload, headers=self.headers)
+                )
+                response.raise_for_status()
+                deltas = self._stream_deltas(response)
+                stack.push_async_callback(deltas.aclose)
+                first = await anext(deltas, None)
+            except BaseException:
+                await stack.aclose()
+                raise
+            return stack, first, deltas
+
+        try:
+            # The slot is held for the whole stream, not just until the first delta
+            async with limiter.slot(estimate_tokens(messages, max_tokens)):
+                stack, first, deltas = await call_with_policy(self.call_type, connect, stream=True)
+                async with stack:
+                    if first is None:
+                        return
+                    yield first
+                    async for content in deltas:
+                        yield content
+        except httpx.HTTPError as e:
+            raise APIError(f"API call failed: {str(e)}")
+
+    @staticmethod
+    async def _stream_deltas(response):
+        """Yield the content deltas of a server-sent event stream."""
+        async for line in response.aiter_lines():
+            # Server-sent events: only "data:" lines carry chunks
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+
+            try:
+                chunk = json.loads(data)
+            except json.JSONDecodeError:
+                raise httpx.DecodingError(f"Malformed stream chunk: {data}", request=response.request)
+
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
+
     @abstractmethod
     def process(self, *args, **kwargs):
         """Process method to be implemented by each agent."""
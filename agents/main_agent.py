@@ -1,89 +1,141 @@
+import asyncio
 import json
 import re
 from agents.base_agent import BaseAgent
 from agents.vision_agent import VisionAgent
 from agents.operation_agent import OperationAgent
+from executor.command_compiler import compile_command, compile_commands
 from executor.command_executor import CommandExecutor
-from system.screenshot import take_screenshot
+from executor.command_templates import fill_templates
+from executor.optimizer import PeepholeOptimizer, optimize
+from executor.plan_graph import CAPTURE, EXECUTE, GENERATE, LOCATE, PlanGraph
+from executor.speculation import rebase, symbolic_elements
+from system.backend import desktop_lock
+from system.element_library import ElementLibrary
+from system.element_store import ElementStore
+from system.frame_diff import FrameDiffer
+from system.plan_cache import PlanCache
+from system.regions import box_area, box_center, box_contains, boxes_intersect, expand_box, first_box, union_box
+from system.screenshot import take_screenshot_async
 from system.state_manager import StateManager
+from system.trace_cache import TraceCache, fingerprint, match_fingerprint
 from utils.logger import get_logger
-from utils.error_handler import handle_error, AutomationError
+from utils.rate_limiter import set_task_priority
+from utils.error_handler import handle_error, AutomationError, OperationError, VisionError
+from utils.streaming import JSONArrayStream, read_ahead
 import config
 
 logger = get_logger(__name__)
 
+# Bump whenever the planner prompt changes so cached plans are not reused
+PLAN_PROMPT_VERSION = "1"
+FUSED_PLAN_PROMPT_VERSION = "1"
+
+# "standard" plans instructions for the operation agent; "fused" plans the commands
+# themselves, with element placeholders filled in from the vision results
+PLANNING_MODES = ("standard", "fused")
+
 class MainAgent(BaseAgent):
+    call_type = "plan"
+    
     def __init__(self):
         super().__init__(config.MAIN_AGENT_MODEL)
         self.vision_agent = VisionAgent()
         self.operation_agent = OperationAgent()
         self.command_executor = CommandExecutor()
         self.state_manager = StateManager()
+        self.plan_cache = PlanCache()
+        self.frame_differ = FrameDiffer()
+        self.trace_cache = TraceCache()
+        self.element_library = ElementLibrary()
+        # Where the last plan came from: "trace", "cache", "model" or "default"
+        self.plan_source = None
+        self.planning_mode = config.PLANNING_MODE
     
     @handle_error
-    def process(self, intent):
+    async def process(self, intent):
         """Process the user's intent."""
-        plan = self._create_plan(intent)
-        return self._execute_plan(plan)
+        plan = await self._create_plan(intent)
+        return await self._execute_plan(plan)
     
     @handle_error
-    async def process_intent(self, intent, task_id, session_id):
+    async def process_intent(self, intent, task_id, session_id, stream=None, planning_mode=None):
         """Process the user's intent and coordinate the automation."""
         
         logger.debug("Invoked MainAgent.process_intent")
+        # Model calls of tasks that started earlier go first when a model is saturated
+        set_task_priority()
+        if stream is None:
+            stream = config.STREAM_RESPONSES
+        if planning_mode is not None:
+            self.planning_mode = planning_mode
+        
+        trace = None
+        self.plan_source = None
         try:
             # Update task status
             self.state_manager.update_task_status(
                 task_id, "planning", "Creating automation plan"
             )
             
-            # Generate plan
-            plan = self._create_plan(intent)
-            logger.info(f"Created plan with {len(plan)} steps")
-            
-            # Execute each step in the plan
-            for step_idx, step in enumerate(plan):
-                # Update status
-                self.state_manager.update_task_status(
-                    task_id, "executing", f"Executing step {step_idx+1}/{len(plan)}: {step['description']}"
-                )
-                
-                # Execute the step based on its type
-                if step["type"] == "screenshot":
-                    screenshot_path = take_screenshot()
-                    self.state_manager.set_task_data(task_id, "last_screenshot", screenshot_path)
-                    logger.info(f"Took screenshot: {screenshot_path}")
-                
-                elif step["type"] == "vision_analysis":
-                    screenshot_path = self.state_manager.get_task_data(task_id, "last_screenshot")
-                    if not screenshot_path:
-                        # Take a screenshot if we don't have one
-                        screenshot_path = take_screenshot()
-                        self.state_manager.set_task_data(task_id, "last_screenshot", screenshot_path)
-                    
-                    element_data = self.vision_agent.analyze_screenshot(
-                        screenshot_path, step["prompt"]
+            # One record per executed step, to replay the task next time
+            records = []
+            replayed = 0
+            trace = await asyncio.to_thread(self.trace_cache.get, intent)
+            if trace:
+                # Replay the recorded task while the screen matches it, then continue with the model
+                plan = trace["plan"]
+                self.plan_source = "trace"
+                records = await self._replay_trace(task_id, trace)
+                replayed = len(records)
+                records.extend(await self._run_plan(task_id, plan, replayed))
+            elif stream:
+                # Execute plan steps as soon as the planner has finished emitting them
+                plan = []
+                async for step in read_ahead(self._stream_plan(intent)):
+                    plan.append(step)
+                    self.state_manager.update_task_status(
+                        task_id, "executing", f"Executing step {len(plan)}: {step['description']}"
                     )
-                    self.state_manager.set_task_data(task_id, "element_data", element_data)
-                    logger.info(f"Vision analysis complete: {element_data}")
+                    records.append(await self._run_step(task_id, step, stream=True))
+                logger.info(f"Executed streamed plan with {len(plan)} steps")
+            else:
+                # Generate plan
+                plan = await self._create_plan(intent)
+                logger.info(f"Created plan with {len(plan)} steps")
                 
-                elif step["type"] == "operation":
-                    element_data = self.state_manager.get_task_data(task_id, "element_data")
-                    operation_commands = self.operation_agent.generate_commands(
-                        step["instruction"], element_data
-                    )
-                    
-                    # Execute each command
-                    for cmd in operation_commands:
-                        logger.info(f"Executing command: {cmd}")
-                        self.command_executor.execute(cmd)
+                # Execute each step in the plan
+                records = await self._run_plan(task_id, plan)
             
             # Update task status to completed
             self.state_manager.update_task_status(
                 task_id, "completed", "Automation task completed successfully"
             )
             
+            # Only plans that passed validation and completed are worth reusing
+            if self.plan_source == "model":
+                await asyncio.to_thread(
+                    self.plan_cache.put, intent, self.model_name, self._plan_version(), plan
+                )
+            
+            # A fully replayed trace is already stored; anything else is new or updated
+            if not (trace and replayed == len(plan)):
+                await asyncio.to_thread(self.trace_cache.put, intent, plan, records)
+            
         except Exception as e:
+            if trace:
+                # The recorded trace led to a failure, so do not replay it again
+                await asyncio.to_thread(self.trace_cache.invalidate, intent)
+            if self.plan_source == "cache":
+                # Neither should a cached plan that no longer works
+                await asyncio.to_thread(
+                    self.plan_cache.invalidate, intent, self.model_name, self._plan_version()
+                )
+            # Any element matched locally may have been the wrong one
+            for prompt in self.state_manager.get_task_data(task_id, "library_matches") or {}:
+                logger.info(f"Forgetting locally matched element '{prompt}' after the failure")
+                await asyncio.to_thread(self.element_library.forget, prompt)
+            
             # Update task status to failed
             error_message = str(e)
             logger.error(f"Automation failed: {error_message}")
@@ -91,12 +143,529 @@ class MainAgent(BaseAgent):
                 task_id, "failed", f"Automation failed: {error_message}"
             )
     
-    @handle_error
-    def _create_plan(self, intent):
-        """Create a step-by-step plan based on the user's intent."""
-        logger.info(f"Creating plan for intent: {intent}")
+    async def _replay_trace(self, task_id, trace):
+        """Re-run a recorded trace without model calls while the screen matches it.
+        
+        Returns:
+            list: The records of the replayed steps; shorter than the plan when a
+                vision step no longer matches, or an operation step is not preceded
+                by a matching vision step, and the model has to take over
+        """
+        plan, recorded = trace["plan"], trace["records"]
+        records = []
+        # Whether the current screen was checked against the trace since it last changed
+        verified = False
+        for step_idx, (step, record) in enumerate(zip(plan, recorded)):
+            self.state_manager.update_task_status(
+                task_id, "executing", f"Replaying step {step_idx+1}/{len(plan)}: {step['description']}"
+            )
+            
+            if step["type"] == "screenshot":
+                frame = await self._screenshot()
+                self.state_manager.set_task_data(task_id, "last_frame", frame)
+                verified = False
+            
+            elif step["type"] == "vision_analysis":
+                frame = self.state_manager.get_task_data(task_id, "last_frame")
+                if not frame:
+                    frame = await self._screenshot()
+                    self.state_manager.set_task_data(task_id, "last_frame", frame)
+                
+                if not record.get("fingerprint") or not await asyncio.to_thread(
+                    match_fingerprint, frame, record["fingerprint"]
+                ):
+                    logger.info(f"Screen no longer matches the trace at step {step_idx+1}, falling back to the model")
+                    break
+                elements = await self._element_store(task_id, frame)
+                elements.add(step["prompt"], record["element_data"])
+                self._name_element(task_id, step)
+                self.state_manager.set_task_data(task_id, "elements", elements)
+                self.state_manager.set_task_data(task_id, "element_data", record["element_data"])
+                verified = True
+            
+            elif step["type"] == "operation":
+                if not verified:
+                    # Recorded input is only sent to a screen that was just checked against the trace
+                    logger.info(f"No verified screen for step {step_idx+1}, falling back to the model")
+                    break
+                async with desktop_lock():
+                    for instruction in compile_commands(record["commands"]):
+                        logger.info(f"Replaying command: {instruction}")
+                        await self.command_executor.execute_async(instruction)
+                verified = False
+            
+            records.append(record)
+        
+        self.trace_cache.record_replay(len(records), len(records) < len(plan))
+        logger.info(f"Replayed {len(records)}/{len(plan)} steps from the trace")
+        return records
+    
+    async def _run_step(self, task_id, step, stream=False, prompts=None):
+        """Execute a single plan step for a task.
+        
+        Args:
+            prompts (list): Prompts of the vision steps that will look at the same
+                frame, so a vision step can locate all of them with one request
+        
+        Returns:
+            dict: What the step did, for the task's trace
+        """
+        record = {}
         
-        messages = [
+        # Execute the step based on its type
+        if step["type"] == "screenshot":
+            await self._capture(task_id)
+        
+        elif step["type"] == "vision_analysis":
+            frame = await self._last_frame(task_id)
+            record = await self._locate(task_id, step, frame, prompts)
+        
+        elif step["type"] == "operation":
+            if stream and "commands" not in step:
+                element_data = self.state_manager.get_task_data(task_id, "element_data")
+                elements = self.state_manager.get_task_data(task_id, "elements")
+                elements = elements.to_dict() if elements else None
+                record["commands"] = executed = []
+                # Execute each command as soon as it has been generated; the optimizer
+                # only holds a command back while the next one might merge with it
+                optimizer = PeepholeOptimizer() if config.OPTIMIZER_ENABLED else None
+                async for cmd in read_ahead(
+                    self.operation_agent.stream_commands(step["instruction"], element_data, elements)
+                ):
+                    instruction = compile_command(cmd)
+                    ready = optimizer.feed(instruction) if optimizer else [instruction]
+                    # The desktop is only held while commands run, not while waiting for the model
+                    executed.extend(await self._perform(ready))
+                if optimizer:
+                    executed.extend(await self._perform(optimizer.flush()))
+            else:
+                element_data = self.state_manager.get_task_data(task_id, "element_data")
+                program = await self._generate(task_id, step, element_data)
+                record["commands"] = await self._perform(program)
+        
+        return record
+    
+    async def _run_plan(self, task_id, plan, start=0):
+        """Execute the plan from step start on, one step after another unless PLAN_GRAPH_ENABLED."""
+        if config.PLAN_GRAPH_ENABLED:
+            return await self._run_graph(task_id, plan, start)
+        
+        records = []
+        for step_idx in range(start, len(plan)):
+            step = plan[step_idx]
+            # Update status
+            self.state_manager.update_task_status(
+                task_id, "executing", f"Executing step {step_idx+1}/{len(plan)}: {step['description']}"
+            )
+            records.append(await self._run_step(task_id, step, prompts=self._frame_prompts(plan, step_idx)))
+        return records
+    
+    async def _run_graph(self, task_id, plan, start=0):
+        """Execute the plan from step start on, overlapping the steps that do not depend on each other.
+        
+        Returns:
+            list: What each step did, for the task's trace
+        """
+        graph = PlanGraph(plan, start)
+        frames, records, programs = {}, {}, {}
+        # Commands generated ahead of time for operation steps, by step index
+        speculations = {}
+        
+        async def run_node(node):
+            step_idx, kind = node
+            step = plan[step_idx]
+            self.state_manager.update_task_status(
+                task_id, "executing", f"Executing step {step_idx+1}/{len(plan)}: {step['description']}"
+            )
+            
+            if kind == CAPTURE:
+                frames[step_idx] = await self._capture(task_id)
+                records[step_idx] = {}
+            
+            elif kind == LOCATE:
+                frame_step = graph.frame_steps[step_idx]
+                frame = frames[frame_step] if frame_step is not None else await self._last_frame(task_id)
+                records[step_idx] = await self._locate(task_id, step, frame, self._frame_prompts(plan, step_idx))
+            
+            elif kind == GENERATE:
+                element_step = graph.element_steps[step_idx]
+                if element_step is not None:
+                    element_data = records[element_step]["element_data"]
+                else:
+                    element_data = self.state_manager.get_task_data(task_id, "element_data")
+                program = None
+                if step_idx in speculations:
+                    program = await self._adopt_speculation(task_id, speculations.pop(step_idx), element_data)
+                if program is None:
+                    program = await self._generate(task_id, step, element_data)
+                programs[step_idx] = program
+            
+            elif kind == EXECUTE:
+                next_idx = graph.next_operation(step_idx)
+                if config.SPECULATION_ENABLED and next_idx is not None and self._can_speculate(graph, step_idx, next_idx):
+                    # The next operation waits for a screenshot after this one; generate its
+                    # commands against stand-in elements while this step's input runs
+                    speculations[next_idx] = asyncio.ensure_future(
+                        self._speculate(task_id, graph, next_idx)
+                    )
+                records[step_idx] = {"commands": await self._perform(programs.pop(step_idx))}
+        
+        try:
+            await graph.run(run_node)
+        finally:
+            for task in speculations.values():
+                task.cancel()
+        return [records[step_idx] for step_idx in range(start, len(plan))]
+    
+    @staticmethod
+    def _can_speculate(graph, step_idx, next_idx):
+        """Check whether an operation step only gets its element after a screenshot that follows step_idx."""
+        step = graph.plan[next_idx]
+        frame_step = graph.frame_steps[next_idx]
+        return ("instruction" in step and "commands" not in step
+                and graph.element_steps[next_idx] is not None
+                and frame_step is not None and frame_step > step_idx)
+    
+    async def _speculate(self, task_id, graph, step_idx):
+        """Generate an operation step's commands before its elements are located.
+        
+        The elements the step will see are given stand-in boxes, so the
+        commands can be moved onto the real boxes once they are known.
+        
+        Returns:
+            tuple: (stand-in elements, name of the step's element, boxes of the
+                elements carried over from the current screen, compiled commands)
+        """
+        plan = graph.plan
+        # What the element store will most likely hold: the elements carried over from
+        # now, plus everything the vision steps on the step's frame look for
+        elements = self.state_manager.get_task_data(task_id, "elements")
+        carried = elements.to_dict() if elements and config.FRAME_DIFF_ENABLED else {}
+        expected = {name: first_box(data["coordinates"]) for name, data in carried.items()}
+        names = list(expected)
+        names += [prompt for prompt in self._frame_prompts(plan, graph.frame_steps[step_idx] + 1)
+                  if prompt not in names]
+        symbolic = symbolic_elements(names)
+        element_name = plan[graph.element_steps[step_idx]]["prompt"]
+        
+        logger.info(f"Speculatively generating commands for step {step_idx+1}")
+        commands = await self.operation_agent.generate_commands(
+            plan[step_idx]["instruction"], symbolic[element_name], symbolic
+        )
+        return symbolic, element_name, expected, compile_commands(commands)
+    
+    async def _adopt_speculation(self, task_id, speculation, element_data):
+        """Rebase speculatively generated commands onto the located elements.
+        
+        Returns:
+            list: The compiled commands, or None when the screen turned out
+                differently than expected and the commands must be generated again
+        """
+        try:
+            symbolic, element_name, expected, program = await speculation
+        except AutomationError as e:
+            logger.warning(f"Speculative command generation failed: {e.message}")
+            return None
+        
+        elements = self.state_manager.get_task_data(task_id, "elements")
+        elements = elements.to_dict() if elements else {}
+        if element_data:
+            elements[element_name] = element_data
+        if element_name not in elements or not self._kept_in_place(expected, elements):
+            logger.info("Screen differs from the speculation, discarding its commands")
+            return None
+        
+        program = rebase(program, symbolic, elements)
+        if program is None:
+            logger.info("Speculative commands use positions outside the expected elements, discarding them")
+            return None
+        
+        logger.info(f"Using speculatively generated commands: {program}")
+        if config.OPTIMIZER_ENABLED:
+            program = optimize(program)
+        return program
+    
+    @staticmethod
+    def _kept_in_place(expected, elements):
+        """Check whether the elements a speculation saw on the screen are still where they were.
+        
+        An element counts as in place when its located box still holds the
+        center of the box it had, so small shifts from locating it again do not matter.
+        """
+        for name, box in expected.items():
+            if name not in elements:
+                return False
+            x, y = box_center(box)
+            x1, y1, x2, y2 = first_box(elements[name]["coordinates"])
+            if not (x1 <= x <= x2 and y1 <= y <= y2):
+                return False
+        return True
+    
+    async def _capture(self, task_id):
+        """Take a screenshot for a task and start preparing it for the vision model."""
+        frame = await self._screenshot()
+        self.state_manager.set_task_data(task_id, "last_frame", frame)
+        logger.info(f"Took screenshot: {frame}")
+        # Encode the upload in the background while the rest of the plan catches up
+        task = asyncio.ensure_future(asyncio.to_thread(frame.data_url))
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return frame
+    
+    @staticmethod
+    async def _screenshot():
+        """Take a screenshot once no other task is sending input."""
+        async with desktop_lock():
+            return await take_screenshot_async()
+    
+    async def _last_frame(self, task_id):
+        """Get the task's latest screenshot, taking one if there is none yet."""
+        frame = self.state_manager.get_task_data(task_id, "last_frame")
+        if not frame:
+            frame = await self._capture(task_id)
+        return frame
+    
+    async def _locate(self, task_id, step, frame, prompts=None):
+        """Find the element of a vision step on a frame.
+        
+        Returns:
+            dict: The element data and the frame's fingerprint, for the task's trace
+        """
+        record = {}
+        elements = await self._element_store(task_id, frame)
+        element = elements.get(step["prompt"])
+        if element is None:
+            # Look for every element the plan needs on this frame in one go
+            pending = [step["prompt"]] + [
+                prompt for prompt in prompts or []
+                if prompt != step["prompt"] and prompt not in elements
+            ]
+            for prompt, data in (await self._analyze_frame(task_id, frame, pending)).items():
+                elements.add(prompt, data)
+            element = elements.get(step["prompt"])
+        elif element.frame_id != frame.frame_id:
+            logger.info(f"Reusing '{element.name}' found on frame {element.frame_id}")
+        element_data = element.data
+        self._name_element(task_id, step)
+        
+        self.state_manager.set_task_data(task_id, "elements", elements)
+        self.state_manager.set_task_data(task_id, "element_data", element_data)
+        logger.info(f"Vision analysis complete: {element_data}")
+        
+        record["element_data"] = element_data
+        if self.trace_cache.enabled:
+            try:
+                record["fingerprint"] = await asyncio.to_thread(
+                    fingerprint, frame, element_data["coordinates"]
+                )
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                logger.warning(f"Cannot fingerprint vision step, it will not be replayed: {str(e)}")
+        
+        return record
+    
+    async def _generate(self, task_id, step, element_data):
+        """Get the compiled commands of an operation step, without executing them."""
+        elements = self.state_manager.get_task_data(task_id, "elements")
+        named = self._named_elements(task_id, elements)
+        elements = elements.to_dict() if elements else None
+        operation_commands = await self._operation_commands(step, element_data, elements, named)
+        
+        # Compile the whole list up front so a bad command fails before any input is sent
+        return self._compile_program(operation_commands)
+    
+    async def _perform(self, program):
+        """Execute compiled commands; returns them as strings, for the task's trace.
+        
+        Other tasks cannot use the desktop until all of the commands are done.
+        """
+        executed = []
+        if not program:
+            return executed
+        async with desktop_lock():
+            for instruction in program:
+                logger.info(f"Executing command: {instruction}")
+                await self.command_executor.execute_async(instruction)
+                executed.append(repr(instruction))
+        return executed
+    
+    async def _operation_commands(self, step, element_data, elements=None, named=None):
+        """Get the commands of an operation step.
+        
+        Commands planned in fused mode only need their element placeholders
+        filled in; otherwise the operation agent generates them from the
+        step's instruction.
+        """
+        if "commands" in step:
+            try:
+                commands = fill_templates(step["commands"], named or {})
+                logger.info(f"Filled {len(commands)} planned commands without the operation agent")
+                return commands
+            except OperationError as e:
+                if "instruction" not in step:
+                    raise
+                logger.warning(f"Cannot fill planned commands, asking the operation agent: {e.message}")
+        
+        return await self.operation_agent.generate_commands(step["instruction"], element_data, elements)
+    
+    def _name_element(self, task_id, step):
+        """Remember the placeholder name a fused plan gave the element of a vision step."""
+        if "name" in step:
+            names = self.state_manager.get_task_data(task_id, "element_names") or {}
+            names[step["name"]] = step["prompt"]
+            self.state_manager.set_task_data(task_id, "element_names", names)
+    
+    def _named_elements(self, task_id, elements):
+        """Get the element data by placeholder name, for filling planned commands."""
+        names = self.state_manager.get_task_data(task_id, "element_names") or {}
+        if not elements:
+            return {}
+        return {name: elements.get(prompt).data for name, prompt in names.items() if prompt in elements}
+    
+    def _compile_program(self, commands):
+        """Compile generated commands and run the peephole optimizer over them."""
+        program = compile_commands(commands)
+        if config.OPTIMIZER_ENABLED:
+            program = optimize(program)
+        return program
+    
+    async def _analyze_frame(self, task_id, frame, prompts):
+        """Analyze a frame for one or more prompts.
+        
+        Earlier detections are reused or narrowed to the changed area where
+        possible; the prompts that still need the full frame are sent to the
+        vision model together.
+        
+        Returns:
+            dict: Element data per prompt
+        """
+        detections = self.state_manager.get_task_data(task_id, "detections") or {}
+        elements = {}
+        # Prompts whose element data came from the vision model (and is worth learning)
+        from_model = []
+        
+        # Element data of the prompts the element library matched during this task
+        library_matches = self.state_manager.get_task_data(task_id, "library_matches") or {}
+        
+        for prompt in prompts:
+            element_data, source = await self._analyze_locally(frame, prompt, detections.get(prompt))
+            if element_data is not None:
+                elements[prompt] = element_data
+                if source == "model":
+                    from_model.append(prompt)
+                elif source == "library":
+                    library_matches[prompt] = element_data
+        
+        pending = [prompt for prompt in prompts if prompt not in elements]
+        if pending:
+            elements.update(await self.vision_agent.analyze_elements(frame, pending))
+            from_model.extend(pending)
+        
+        if self.element_library.enabled:
+            for prompt in from_model:
+                matched = library_matches.pop(prompt, None)
+                if matched and not boxes_intersect(first_box(matched["coordinates"]),
+                                                   first_box(elements[prompt]["coordinates"])):
+                    # The vision model found the element somewhere else than the library did
+                    logger.info(f"Vision model disagrees with the local match for '{prompt}', forgetting it")
+                    await asyncio.to_thread(self.element_library.forget, prompt)
+                await asyncio.to_thread(self.element_library.learn, frame, prompt, elements[prompt])
+        self.state_manager.set_task_data(task_id, "library_matches", library_matches)
+        
+        for prompt in prompts:
+            detections[prompt] = (frame, elements[prompt])
+        self.state_manager.set_task_data(task_id, "detections", detections)
+        return elements
+    
+    async def _analyze_locally(self, frame, prompt, previous):
+        """Find an element without a full-frame vision request, when the screen changed little.
+        
+        Returns:
+            tuple: (element_data, source), source being "model" for a dirty region
+                analysis, "previous" for an earlier detection or "library" for a
+                local match; (None, None) when the full frame has to be analyzed
+        """
+        if previous and config.FRAME_DIFF_ENABLED:
+            previous_frame, previous_data = previous
+            dirty_rects = await asyncio.to_thread(self.frame_differ.diff, previous_frame, frame)
+            box = first_box(previous_data["coordinates"])
+            
+            if not any(boxes_intersect(box, rect) for rect in dirty_rects):
+                # The target region is unchanged, so the earlier detection still holds
+                logger.info(f"Screen unchanged around '{prompt}', reusing detection from frame {previous_frame.frame_id}")
+                return previous_data, "previous"
+            
+            dirty_region = expand_box(
+                union_box(dirty_rects),
+                margin_ratio=0.1,
+                min_size=config.VISION_FINE_MIN_SIZE,
+                bounds=frame.bounds
+            )
+            # Only the changed area needs to be looked at again, if the element was inside it
+            if (box_area(dirty_region) <= box_area(frame.bounds) * config.FRAME_DIFF_MAX_DIRTY_FRACTION
+                    and box_contains(dirty_region, box)):
+                logger.info(f"Analyzing dirty region {dirty_region} for '{prompt}'")
+                region_frame = await asyncio.to_thread(frame.crop, dirty_region)
+                try:
+                    element_data = await self.vision_agent.analyze_screenshot(region_frame, prompt)
+                except VisionError as e:
+                    logger.warning(f"Dirty region analysis failed, analyzing the full frame: {e.message}")
+                else:
+                    found = first_box(element_data["coordinates"])
+                    # The element changed, so it is where it was or somewhere that changed too;
+                    # anything else in the crop is more likely a different element
+                    if boxes_intersect(found, box) or any(boxes_intersect(found, rect) for rect in dirty_rects):
+                        return element_data, "model"
+                    logger.info(f"Dirty region match for '{prompt}' at {found} is outside the changes, "
+                                f"analyzing the full frame")
+        
+        if self.element_library.enabled:
+            # Elements located before can usually be found locally without a model call
+            element_data = await asyncio.to_thread(self.element_library.locate, frame, prompt)
+            if element_data is not None:
+                return element_data, "library"
+        
+        return None, None
+    
+    async def _element_store(self, task_id, frame):
+        """Get the elements known on a frame.
+        
+        Elements found on an earlier frame are carried over unless the screen
+        changed where they are.
+        """
+        elements = self.state_manager.get_task_data(task_id, "elements")
+        if elements is None or (len(elements) and not config.FRAME_DIFF_ENABLED):
+            return ElementStore(frame)
+        
+        if elements.frame_id != frame.frame_id:
+            if len(elements):
+                dirty_rects = await asyncio.to_thread(self.frame_differ.diff, elements.frame, frame)
+                removed = elements.invalidate(dirty_rects)
+                if removed:
+                    logger.info(f"Screen changed around {[element.name for element in removed]}, dropping them")
+            elements.frame = frame
+        return elements
+    
+    @staticmethod
+    def _frame_prompts(plan, step_idx):
+        """Get the prompts of the vision steps from step_idx up to the next screenshot, which all see the same frame."""
+        prompts = []
+        for step in plan[step_idx:]:
+            if step["type"] == "screenshot":
+                break
+            if step["type"] == "vision_analysis" and step["prompt"] not in prompts:
+                prompts.append(step["prompt"])
+        return prompts
+    
+    def _plan_version(self):
+        """Get the prompt version cached plans must match, which differs per planning mode."""
+        if self.planning_mode == "fused":
+            return f"fused-{FUSED_PLAN_PROMPT_VERSION}"
+        return PLAN_PROMPT_VERSION
+    
+    def _build_plan_messages(self, intent):
+        """Build the chat messages for the planner."""
+        if self.planning_mode == "fused":
+            return self._build_fused_plan_messages(intent)
+        return [
             {
                 "role": "system",
                 "content": """You are an AI automation planner. Your job is to create a detailed step-by-step plan to accomplish a user's intent using computer automation.
@@ -118,8 +687,124 @@ class MainAgent(BaseAgent):
                 "content": f"Create a plan to accomplish this intent: {intent}"
             }
         ]
+    
+    @staticmethod
+    def _build_fused_plan_messages(intent):
+        """Build the chat messages for a planner that also writes the operation commands."""
+        return [
+            {
+                "role": "system",
+                "content": """You are an AI automation planner. Your job is to create a detailed step-by-step plan to accomplish a user's intent using computer automation, including the exact commands to run.
+                Each step should be one of these types:
+                1. 'screenshot' - Take a screenshot of the current screen
+                2. 'vision_analysis' - Analyze the screenshot to find a UI element
+                3. 'operation' - Perform mouse or keyboard operations
+                
+                For each step, provide:
+                - 'type': The step type
+                - 'description': A brief description of the step
+                - 'prompt' (for vision_analysis): The prompt to send to the vision model
+                - 'name' (for vision_analysis): A short identifier for the element, e.g. 'search_box'
+                - 'commands' (for operation): The commands to run, as a JSON array of strings
+                - 'instruction' (for operation): The same operation in words, used if the commands cannot be run
+                
+                Available commands:
+                - mouse_move(x, y): Move the mouse to the specified coordinates
+                - mouse_left_click(x, y): Left click at the specified coordinates
+                - mouse_right_click(x, y): Right click at the specified coordinates
+                - mouse_double_click(x, y): Double click at the specified coordinates
+                - keyboard_type(text): Type the specified text (any language; long or non-ASCII text is pasted)
+                - keyboard_press(key): Press a specific key (e.g., 'enter', 'tab', 'esc')
+                - keyboard_hotkey(key1, key2, ...): Press a key combination (e.g., 'ctrl', 'c')
+                - wait(seconds): Wait for the specified number of seconds
+                - wait_stable(timeout): Wait until the screen stops changing, for at most timeout seconds
+                
+                Coordinates are not known yet, so refer to elements found by earlier
+                vision_analysis steps by name: @name.center (or just @name) for the center
+                point, @name.x and @name.y for its coordinates, @name.x1, @name.y1, @name.x2,
+                @name.y2 for the box edges. For example: "mouse_left_click(@search_box.center)".
+                
+                Return the plan as a JSON array of steps."""
+            },
+            {
+                "role": "user",
+                "content": f"Create a plan to accomplish this intent: {intent}"
+            }
+        ]
+    
+    @staticmethod
+    def _validate_step(step):
+        """Validate a single plan step."""
+        if not isinstance(step, dict):
+            raise AutomationError(f"Expected a step object, got {type(step)}", step)
+        
+        if "type" not in step:
+            raise AutomationError("Step missing 'type' field", step)
+        
+        if step["type"] not in ["screenshot", "vision_analysis", "operation"]:
+            raise AutomationError(f"Invalid step type: {step['type']}", step)
+        
+        if "description" not in step:
+            raise AutomationError("Step missing 'description' field", step)
+        
+        if step["type"] == "vision_analysis" and "prompt" not in step:
+            raise AutomationError("Vision analysis step missing 'prompt' field", step)
+        
+        if step["type"] == "vision_analysis" and "name" in step and not (
+            isinstance(step["name"], str) and step["name"].isidentifier()
+        ):
+            raise AutomationError(f"Invalid element name: {step['name']}", step)
+        
+        if step["type"] == "operation":
+            if "instruction" not in step and "commands" not in step:
+                raise AutomationError("Operation step missing 'instruction' or 'commands' field", step)
+            if "commands" in step and not (
+                isinstance(step["commands"], list) and all(isinstance(cmd, str) for cmd in step["commands"])
+            ):
+                raise AutomationError("Operation step 'commands' must be a list of strings", step)
+    
+    @staticmethod
+    def _default_plan(intent):
+        """Create a simple default plan for when the planner response cannot be parsed."""
+        return [
+            {
+                "type": "screenshot",
+                "description": "Take a screenshot of the current screen"
+            },
+            {
+                "type": "vision_analysis",
+                "description": "Identify the target element",
+                "prompt": f"Find the element needed to accomplish: {intent}"
+            },
+            {
+                "type": "operation",
+                "description": "Perform the required operation",
+                "instruction": f"Execute operations to accomplish: {intent}"
+            }
+        ]
+    
+    async def _get_cached_plan(self, intent):
+        """Look up a plan that previously completed for the same intent."""
+        plan = await asyncio.to_thread(
+            self.plan_cache.get, intent, self.model_name, self._plan_version()
+        )
+        if plan is not None:
+            logger.info(f"Using cached plan with {len(plan)} steps for intent: {intent}")
+            self.plan_source = "cache"
+        return plan
+    
+    @handle_error
+    async def _create_plan(self, intent):
+        """Create a step-by-step plan based on the user's intent."""
+        plan = await self._get_cached_plan(intent)
+        if plan is not None:
+            return plan
+        
+        logger.info(f"Creating plan for intent: {intent}")
+        
+        messages = self._build_plan_messages(intent)
         
-        response = self.call_api(messages)
+        response = await self.call_api(messages)
         plan_text = response["choices"][0]["message"]["content"]
         logger.debug(f"Plan response: {plan_text}")
         
@@ -139,50 +824,62 @@ class MainAgent(BaseAgent):
                 raise AutomationError("Expected a list of steps, got something else", plan_json)
             
             for step in plan:
-                if not isinstance(step, dict):
-                    raise AutomationError(f"Expected a step object, got {type(step)}", step)
-                
-                if "type" not in step:
-                    raise AutomationError("Step missing 'type' field", step)
-                
-                if step["type"] not in ["screenshot", "vision_analysis", "operation"]:
-                    raise AutomationError(f"Invalid step type: {step['type']}", step)
-                
-                if "description" not in step:
-                    raise AutomationError("Step missing 'description' field", step)
-                
-                if step["type"] == "vision_analysis" and "prompt" not in step:
-                    raise AutomationError("Vision analysis step missing 'prompt' field", step)
-                
-                if step["type"] == "operation" and "instruction" not in step:
-                    raise AutomationError("Operation step missing 'instruction' field", step)
+                self._validate_step(step)
             
+            self.plan_source = "model"
             return plan
             
         except json.JSONDecodeError:
             # If JSON parsing fails, create a simple default plan
             logger.warning("Failed to parse plan JSON, using default plan")
-            return [
-                {
-                    "type": "screenshot",
-                    "description": "Take a screenshot of the current screen"
-                },
-                {
-                    "type": "vision_analysis",
-                    "description": "Identify the target element",
-                    "prompt": f"Find the element needed to accomplish: {intent}"
-                },
-                {
-                    "type": "operation",
-                    "description": "Perform the required operation",
-                    "instruction": f"Execute operations to accomplish: {intent}"
-                }
-            ]
+            self.plan_source = "default"
+            return self._default_plan(intent)
+    
+    async def _stream_plan(self, intent):
+        """Stream the plan, yielding each validated step as soon as it is complete."""
+        plan = await self._get_cached_plan(intent)
+        if plan is not None:
+            for step in plan:
+                yield step
+            return
+        
+        logger.info(f"Streaming plan for intent: {intent}")
+        
+        messages = self._build_plan_messages(intent)
+        parser = JSONArrayStream()
+        plan_text = ""
+        step_count = 0
+        
+        try:
+            async for delta in self.stream_api(messages):
+                plan_text += delta
+                for step in parser.feed(delta):
+                    self._validate_step(step)
+                    step_count += 1
+                    yield step
+        except json.JSONDecodeError:
+            if step_count:
+                raise AutomationError("Failed to parse streamed plan step", plan_text)
+        
+        logger.debug(f"Plan response: {plan_text}")
+        
+        if not step_count:
+            # Nothing usable was streamed, fall back to the default plan
+            logger.warning("Failed to parse plan JSON, using default plan")
+            self.plan_source = "default"
+            for step in self._default_plan(intent):
+                yield step
+        elif not parser.finished:
+            raise AutomationError("Streamed plan was truncated", plan_text)
+        else:
+            self.plan_source = "model"
     
     @handle_error
-    def _execute_plan(self, plan):
+    async def _execute_plan(self, plan):
         """Execute a plan and return the results."""
         results = []
+        # Element data by placeholder name, for fused plans
+        named = {}
         
         for step_idx, step in enumerate(plan):
             logger.info(f"Executing step {step_idx+1}/{len(plan)}: {step['description']}")
@@ -191,29 +888,27 @@ class MainAgent(BaseAgent):
             
             try:
                 if step["type"] == "screenshot":
-                    screenshot_path = take_screenshot()
-                    result["screenshot_path"] = screenshot_path
+                    result["frame"] = await self._screenshot()
                 
                 elif step["type"] == "vision_analysis":
-                    screenshot_path = results[-1].get("screenshot_path") if results else take_screenshot()
-                    element_data = self.vision_agent.analyze_screenshot(
-                        screenshot_path, step["prompt"]
+                    frame = results[-1].get("frame") if results else None
+                    if not frame:
+                        frame = await self._screenshot()
+                    element_data = await self.vision_agent.analyze_screenshot(
+                        frame, step["prompt"]
                     )
                     result["element_data"] = element_data
+                    if "name" in step:
+                        named[step["name"]] = element_data
                 
                 elif step["type"] == "operation":
                     element_data = next((r.get("element_data") for r in reversed(results) if "element_data" in r), None)
-                    operation_commands = self.operation_agent.generate_commands(
-                        step["instruction"], element_data
-                    )
+                    operation_commands = await self._operation_commands(step, element_data, named=named)
                     
                     # Execute each command
-                    executed_commands = []
-                    for cmd in operation_commands:
-                        self.command_executor.execute(cmd)
-                        executed_commands.append(cmd)
-                    
-                    result["executed_commands"] = executed_commands
+                    result["executed_commands"] = await self._perform(
+                        self._compile_program(operation_commands)
+                    )
                 
             except Exception as e:
                 result["status"] = "failed"
@@ -1,6 +1,9 @@
 import json
 import re
 from agents.base_agent import BaseAgent
+from executor.instruction_compiler import compile_instruction
+from system.regions import box_center, first_box
+from utils.streaming import JSONArrayStream
 from utils.logger import get_logger
 from utils.error_handler import handle_error, OperationError
 import config
@@ -8,32 +11,39 @@ import config
 logger = get_logger(__name__)
 
 class OperationAgent(BaseAgent):
+    call_type = "operation"
+    
     def __init__(self):
         super().__init__(config.OPERATION_AGENT_MODEL)
     
     @handle_error
-    def process(self, instruction, element_data=None):
+    async def process(self, instruction, element_data=None, elements=None):
         """Process an instruction and generate commands."""
-        return self.generate_commands(instruction, element_data)
+        return await self.generate_commands(instruction, element_data, elements)
     
-    @handle_error
-    def generate_commands(self, instruction, element_data=None):
-        """Generate standardized commands based on the instruction and element data."""
-        logger.info(f"Generating commands for instruction: {instruction}")
+    def _build_messages(self, instruction, element_data=None, elements=None):
+        """Build the chat messages for an instruction and optional element data.
         
+        ``elements`` maps element names (vision prompts) to element data; when it
+        holds several elements they are all listed so commands can refer to any.
+        """
         # Prepare the context with element data if available
         context = ""
-        if element_data:
-            coords = element_data["coordinates"]
+        if elements and len(elements) > 1:
+            lines = []
+            for name, data in elements.items():
+                x1, y1, x2, y2 = first_box(data["coordinates"])
+                center_x, center_y = box_center((x1, y1, x2, y2))
+                lines.append(
+                    f"- {name}: Coordinates [x1={x1}, y1={y1}, x2={x2}, y2={y2}], Center point [x={center_x}, y={center_y}]"
+                )
+            context = "Elements on screen:\n" + "\n".join(lines)
+        elif element_data:
             # For multiple elements, use the first one or process all as needed
-            if isinstance(coords[0], list):
-                x1, y1, x2, y2 = coords[0]
-            else:
-                x1, y1, x2, y2 = coords
+            x1, y1, x2, y2 = first_box(element_data["coordinates"])
                 
             # Calculate center point
-            center_x = (x1 + x2) // 2
-            center_y = (y1 + y2) // 2
+            center_x, center_y = box_center((x1, y1, x2, y2))
             
             context = f"""
             Element information:
@@ -43,7 +53,7 @@ class OperationAgent(BaseAgent):
             """
         
         # Prepare the message
-        messages = [
+        return [
             {
                 "role": "system",
                 "content": """You are an operation agent that generates standardized commands for computer automation.
@@ -54,10 +64,11 @@ class OperationAgent(BaseAgent):
                 - mouse_left_click(): Perform a left mouse click
                 - mouse_right_click(): Perform a right mouse click
                 - mouse_double_click(): Perform a double click
-                - keyboard_type(text): Type the specified text
+                - keyboard_type(text): Type the specified text (any language; long or non-ASCII text is pasted)
                 - keyboard_press(key): Press a specific key (e.g., 'enter', 'tab', 'esc')
                 - keyboard_hotkey(key1, key2, ...): Press a key combination (e.g., 'ctrl', 'c')
                 - wait(seconds): Wait for the specified number of seconds
+                - wait_stable(timeout): Wait until the screen stops changing, for at most timeout seconds (prefer this over wait when waiting for the UI to respond)
                 
                 Return the commands as a JSON array of strings."""
             },
@@ -66,10 +77,45 @@ class OperationAgent(BaseAgent):
                 "content": f"{context}\n\nInstruction: {instruction}"
             }
         ]
+    
+    @staticmethod
+    def _validate_command(cmd):
+        """Validate that a generated command looks like a command string."""
+        if not isinstance(cmd, str):
+            raise OperationError(f"Expected a string command, got {type(cmd)}", cmd)
+        
+        # Basic validation that it looks like a command
+        if not re.match(r'^\w+\(.*\)$', cmd):
+            raise OperationError(f"Invalid command format: {cmd}")
+    
+    @staticmethod
+    def _extract_command_lines(commands_text):
+        """Extract commands line by line from a response that is not valid JSON."""
+        lines = commands_text.strip().split('\n')
+        commands = []
+        for line in lines:
+            # Remove common prefixes like "- ", numbers, etc.
+            clean_line = re.sub(r'^[\s\d\-\*\.]+', '', line).strip()
+            if clean_line and '(' in clean_line and ')' in clean_line:
+                commands.append(clean_line)
+        return commands
+    
+    @handle_error
+    async def generate_commands(self, instruction, element_data=None, elements=None):
+        """Generate standardized commands based on the instruction and element data."""
+        logger.info(f"Generating commands for instruction: {instruction}")
+        
+        # Formulaic instructions do not need a model round trip
+        if config.OPERATION_RULES_ENABLED:
+            commands = compile_instruction(instruction, elements)
+            if commands is not None:
+                return commands
+        
+        messages = self._build_messages(instruction, element_data, elements)
         
         # Call the API
         try:
-            response = self.call_api(messages)
+            response = await self.call_api(messages)
             commands_text = response["choices"][0]["message"]["content"]
             logger.debug(f"Operation agent response: {commands_text}")
             
@@ -90,25 +136,14 @@ class OperationAgent(BaseAgent):
                 
                 # Validate each command
                 for cmd in commands:
-                    if not isinstance(cmd, str):
-                        raise OperationError(f"Expected a string command, got {type(cmd)}", cmd)
-                    
-                    # Basic validation that it looks like a command
-                    if not re.match(r'^\w+\(.*\)$', cmd):
-                        raise OperationError(f"Invalid command format: {cmd}")
+                    self._validate_command(cmd)
                 
                 logger.info(f"Generated {len(commands)} commands")
                 return commands
                 
             except json.JSONDecodeError:
                 # If JSON parsing fails, try to extract commands line by line
-                lines = commands_text.strip().split('\n')
-                commands = []
-                for line in lines:
-                    # Remove common prefixes like "- ", numbers, etc.
-                    clean_line = re.sub(r'^[\s\d\-\*\.]+', '', line).strip()
-                    if clean_line and '(' in clean_line and ')' in clean_line:
-                        commands.append(clean_line)
+                commands = self._extract_command_lines(commands_text)
                 
                 if not commands:
                     raise OperationError("Failed to parse operation commands", commands_text)
@@ -120,3 +155,52 @@ class OperationAgent(BaseAgent):
             if isinstance(e, OperationError):
                 raise
             raise OperationError(f"Failed to generate commands: {str(e)}")
+    
+    async def stream_commands(self, instruction, element_data=None, elements=None):
+        """Stream commands for an instruction, yielding each one as soon as it is complete."""
+        logger.info(f"Streaming commands for instruction: {instruction}")
+        
+        # Formulaic instructions do not need a model round trip
+        if config.OPERATION_RULES_ENABLED:
+            commands = compile_instruction(instruction, elements)
+            if commands is not None:
+                for cmd in commands:
+                    yield cmd
+                return
+        
+        messages = self._build_messages(instruction, element_data, elements)
+        parser = JSONArrayStream()
+        commands_text = ""
+        count = 0
+        
+        try:
+            async for delta in self.stream_api(messages):
+                commands_text += delta
+                try:
+                    commands = parser.feed(delta)
+                except json.JSONDecodeError as e:
+                    raise OperationError(f"Failed to parse streamed command: {str(e)}", commands_text)
+                
+                for cmd in commands:
+                    self._validate_command(cmd)
+                    count += 1
+                    yield cmd
+        except Exception as e:
+            if isinstance(e, OperationError):
+                raise
+            raise OperationError(f"Failed to generate commands: {str(e)}")
+        
+        logger.debug(f"Operation agent response: {commands_text}")
+        
+        if not parser.started:
+            # No JSON array in the response, fall back to line extraction
+            commands = self._extract_command_lines(commands_text)
+            if not commands:
+                raise OperationError("Failed to parse operation commands", commands_text)
+            for cmd in commands:
+                count += 1
+                yield cmd
+        elif not parser.finished:
+            raise OperationError("Streamed command list was truncated", commands_text)
+        
+        logger.info(f"Streamed {count} commands")
@@ -1,48 +1,181 @@
-import base64
+import ast
+import asyncio
 from agents.base_agent import BaseAgent
+from system.frame import Frame
+from system.image_hash import dhash
+from system.regions import expand_box, first_box
+from system.vision_cache import VisionCache
 from utils.logger import get_logger
 from utils.error_handler import handle_error, VisionError
 import config
 import re
-import os
 
 logger = get_logger(__name__)
 
 class VisionAgent(BaseAgent):
+    call_type = "vision"
+    
     def __init__(self):
         super().__init__(config.VISION_AGENT_MODEL)
+        self.vision_cache = VisionCache()
     
     @handle_error
-    def process(self, screenshot_path, prompt):
-        """Process a screenshot with a prompt."""
-        return self.analyze_screenshot(screenshot_path, prompt)
+    async def process(self, frame, prompt):
+        """Process a screenshot frame with a prompt."""
+        return await self.analyze_screenshot(frame, prompt)
     
     @handle_error
-    def analyze_screenshot(self, screenshot_path, prompt):
-        """Analyze a screenshot to identify UI elements."""
-        logger.info(f"Analyzing screenshot: {screenshot_path}")
+    async def analyze_screenshot(self, frame, prompt):
+        """Analyze a screenshot frame (or a screenshot file path) to identify UI elements."""
+        if isinstance(frame, str):
+            try:
+                frame = await asyncio.to_thread(Frame.from_file, frame)
+            except Exception as e:
+                raise VisionError(f"Failed to read screenshot: {str(e)}")
+        
+        logger.info(f"Analyzing screenshot: {frame}")
         logger.info(f"Prompt: {prompt}")
         
-        # Read and encode the screenshot
+        # Reuse the result for a perceptually identical screen and prompt
+        image_hash = None
+        if self.vision_cache.enabled:
+            image_hash = await asyncio.to_thread(dhash, frame.image, config.VISION_CACHE_HASH_SIZE)
+            cached = self.vision_cache.get(image_hash, prompt, self.model_name, region=frame.bounds)
+            if cached is not None:
+                return cached
+        
+        if self._coarse_to_fine(frame):
+            coords, content, region = await self._locate_coarse_to_fine(frame, prompt)
+        else:
+            coords, content = await self._detect(frame, prompt)
+            region = list(frame.bounds)
+        
+        # Return the element data
+        result = {
+            "element_type": "ui_element",
+            "coordinates": coords,
+            "region": region,
+            "raw_response": content
+        }
+        
+        logger.info(f"Found element at coordinates: {coords}")
+        if image_hash is not None:
+            self.vision_cache.put(image_hash, prompt, self.model_name, result, region=frame.bounds)
+        return result
+    
+    @staticmethod
+    def _coarse_to_fine(frame):
+        """Check whether a frame is large enough to be located coarse to fine."""
+        return (config.VISION_LOCALIZATION == "coarse_to_fine"
+                and max(frame.size) > config.VISION_COARSE_DIMENSION)
+    
+    async def _locate_coarse_to_fine(self, frame, prompt):
+        """Locate an element on a downscaled frame, then refine it on a full-resolution crop.
+        
+        Returns:
+            tuple: (coords, raw_response, region) with coords in screen pixels and region
+                the screen area that produced them
+        """
+        # First pass: approximate box from a heavily downscaled full frame
+        coarse = await asyncio.to_thread(frame.crop, None, config.VISION_COARSE_DIMENSION)
+        coarse_coords, coarse_content = await self._detect(coarse, prompt)
+        return await self._refine(frame, prompt, coarse_coords, coarse_content)
+    
+    async def _refine(self, frame, prompt, coarse_coords, coarse_content):
+        """Refine a coarse box on a full-resolution crop around it; see _locate_coarse_to_fine."""
+        logger.info(f"Coarse localization of '{prompt}': {coarse_coords}")
+        
+        # Second pass: refine on a full-resolution crop around the coarse box
+        region = expand_box(
+            first_box(coarse_coords),
+            margin_ratio=config.VISION_FINE_MARGIN,
+            min_size=config.VISION_FINE_MIN_SIZE,
+            bounds=frame.bounds
+        )
+        fine = await asyncio.to_thread(frame.crop, region)
         try:
-            with open(screenshot_path, 'rb') as f:
-                image_data = f.read()
-        except Exception as e:
-            raise VisionError(f"Failed to read screenshot: {str(e)}")
+            coords, content = await self._detect(fine, prompt)
+        except VisionError as e:
+            logger.warning(f"Fine localization failed, using the coarse box: {e.message}")
+            return coarse_coords, coarse_content, list(frame.bounds)
+        
+        return coords, content, region
+    
+    @handle_error
+    async def analyze_elements(self, frame, prompts):
+        """Locate several elements on one frame, asking for all of them in one grounding request.
+        
+        Returns:
+            dict: Element data per prompt, as returned by analyze_screenshot
+        """
+        prompts = list(dict.fromkeys(prompts))
+        if len(prompts) == 1:
+            return {prompts[0]: await self.analyze_screenshot(frame, prompts[0])}
+        
+        logger.info(f"Analyzing screenshot: {frame}")
+        logger.info(f"Prompts: {prompts}")
+        
+        results = {}
+        image_hash = None
+        if self.vision_cache.enabled:
+            image_hash = await asyncio.to_thread(dhash, frame.image, config.VISION_CACHE_HASH_SIZE)
+            for prompt in prompts:
+                cached = self.vision_cache.get(image_hash, prompt, self.model_name, region=frame.bounds)
+                if cached is not None:
+                    results[prompt] = cached
         
-        # Get the format of the screenshot
-        ext = os.path.splitext(screenshot_path)[1]
+        missing = [prompt for prompt in prompts if prompt not in results]
+        if not missing:
+            return results
         
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        image_data_url = f"data:image/{ext};base64,{base64_image}"
+        # Coarse to fine: the shared request locates every element on a downscaled
+        # frame, then each one is refined on its own full-resolution crop
+        coarse_to_fine = self._coarse_to_fine(frame)
+        if coarse_to_fine:
+            target = await asyncio.to_thread(frame.crop, None, config.VISION_COARSE_DIMENSION)
+        else:
+            target = frame
+        detections = await self._detect_many(target, missing)
         
-        # Prepare the message with the reference prompt
+        # Prompts the response has no box for get their own requests, sharing the encoded upload
+        skipped = [prompt for prompt in missing if prompt not in detections]
+        if skipped:
+            logger.info(f"No box for {skipped} in the grounding response, asking separately")
+            found = await asyncio.gather(*(self._detect(target, prompt) for prompt in skipped))
+            detections.update(zip(skipped, found))
+        
+        if coarse_to_fine:
+            refined = await asyncio.gather(*(
+                self._refine(frame, prompt, *detections[prompt]) for prompt in missing
+            ))
+        else:
+            refined = [detections[prompt] + (list(frame.bounds),) for prompt in missing]
+        
+        for prompt, (coords, content, region) in zip(missing, refined):
+            result = {
+                "element_type": "ui_element",
+                "coordinates": coords,
+                "region": region,
+                "raw_response": content
+            }
+            logger.info(f"Found '{prompt}' at coordinates: {coords}")
+            if image_hash is not None:
+                self.vision_cache.put(image_hash, prompt, self.model_name, result, region=frame.bounds)
+            results[prompt] = result
+        return results
+    
+    async def _ground(self, frame, prompts):
+        """Send one grounding request for one or more prompts and return the response text."""
+        # Encode the in-memory frame off the event loop
+        image_data_url = await asyncio.to_thread(frame.data_url)
+        
+        # Prepare the message with the reference prompts
         messages = [
             {
                 "role": "user",
                 "content": [
                     {
-                        "text": f"<image>\n<|ref|>{prompt}<|/ref|>.",
+                        "text": "<image>\n" + "".join(f"<|ref|>{prompt}<|/ref|>." for prompt in prompts),
                         "type": "text"
                     },
                     {
@@ -58,39 +191,61 @@ class VisionAgent(BaseAgent):
         
         # Call the vision API
         try:
-            response = self.call_api(messages)
-            
-            # Parse the response to extract element coordinates
+            response = await self.call_api(messages)
             content = response["choices"][0]["message"]["content"]
-            logger.debug(f"Vision API response: {content}")
-            
-            # Extract coordinates from the response
-            # Format: <|ref|>prompt<|/ref|><|det|>[[x1, y1, x2, y2]]<|/det|>
-            coords_match = re.search(r'<\|det\|>(.*?)<\|/det\|>', content)
-            
-            if coords_match:
-                try:
-                    coords_str = coords_match.group(1)
-                    # Parse the coordinates (format: [[x1, y1, x2, y2]])
-                    import ast
-                    coords = ast.literal_eval(coords_str)
-                    
-                    # Return the element data
-                    result = {
-                        "element_type": "ui_element",
-                        "coordinates": coords,
-                        "raw_response": content
-                    }
-                    
-                    logger.info(f"Found element at coordinates: {coords}")
-                    return result
-                    
-                except Exception as e:
-                    raise VisionError(f"Failed to parse vision response: {str(e)}", content)
-            else:
-                raise VisionError("No element coordinates found in vision response", content)
-                
         except Exception as e:
-            if isinstance(e, VisionError):
-                raise
             raise VisionError(f"Vision API call failed: {str(e)}")
+        
+        logger.debug(f"Vision API response: {content}")
+        return content
+    
+    async def _detect_many(self, frame, prompts):
+        """Send one grounding request for several prompts.
+        
+        Returns:
+            dict: (coords, raw_response) per prompt found in the response, with
+                coords mapped to screen pixels
+        """
+        content = await self._ground(frame, prompts)
+        
+        # Format: <|ref|>prompt<|/ref|><|det|>[[x1, y1, x2, y2]]<|/det|> per element
+        by_ref = {prompt.strip().lower(): prompt for prompt in prompts}
+        detections = {}
+        for match in re.finditer(r'<\|ref\|>(.*?)<\|/ref\|>\s*<\|det\|>(.*?)<\|/det\|>', content, re.DOTALL):
+            ref, coords_str = match.groups()
+            prompt = by_ref.get(ref.strip().lower())
+            if prompt is None or prompt in detections:
+                continue
+            try:
+                coords = ast.literal_eval(coords_str)
+            except (SyntaxError, ValueError) as e:
+                logger.warning(f"Failed to parse box for '{prompt}': {str(e)}")
+                continue
+            detections[prompt] = (frame.to_screen(coords), content)
+        return detections
+    
+    async def _detect(self, frame, prompt):
+        """Send one grounding request for a frame.
+        
+        Returns:
+            tuple: (coords, raw_response) with coords mapped to screen pixels
+        """
+        content = await self._ground(frame, [prompt])
+        
+        # Extract coordinates from the response
+        # Format: <|ref|>prompt<|/ref|><|det|>[[x1, y1, x2, y2]]<|/det|>
+        coords_match = re.search(r'<\|det\|>(.*?)<\|/det\|>', content)
+        
+        if coords_match:
+            try:
+                coords_str = coords_match.group(1)
+                # Parse the coordinates (format: [[x1, y1, x2, y2]])
+                coords = ast.literal_eval(coords_str)
+                
+                # Map from the uploaded (downscaled or cropped) image to screen pixels
+                return frame.to_screen(coords), content
+                
+            except Exception as e:
+                raise VisionError(f"Failed to parse vision response: {str(e)}", content)
+        else:
+            raise VisionError("No element coordinates found in vision response", content)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the input/capture backend.
+Measures screen capture and input injection latency separately from the
+model calls, e.g. to pick the fastest backend for a host:
+
+    INPUT_BACKEND=x11 X11_DISPLAY=:99 python backend_benchmark.py
+"""
+
+import statistics
+import sys
+import time
+
+from system.backend import create_backend
+from system.encoder import encode_image
+
+def measure(func, samples):
+    """Return latency percentiles of a function in milliseconds."""
+    timings = []
+    for i in range(samples):
+        start = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50": statistics.median(timings),
+        "p95": timings[int(len(timings) * 0.95) - 1],
+        "max": timings[-1]
+    }
+
+def report(label, stats):
+    print(f"  {label:<18} p50={stats['p50']:7.2f}ms  p95={stats['p95']:7.2f}ms  max={stats['max']:7.2f}ms")
+
+def main():
+    """Main function."""
+    name = sys.argv[1] if len(sys.argv) > 1 else None
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    backend = create_backend(name)
+    width, height = backend.size()
+    
+    print(f"Backend {backend.name} ({width}x{height}), {samples} samples")
+    report("capture", measure(lambda i: backend.screenshot(), samples))
+    report("capture region", measure(lambda i: backend.screenshot(region=(0, 0, 400, 300)), samples))
+    image = backend.screenshot()
+    report("encode", measure(lambda i: encode_image(image), samples))
+    report("move", measure(lambda i: backend.move_to(100 + i % 200, 100 + i % 150), samples))
+    report("click", measure(lambda i: backend.click(100 + i % 200, 100 + i % 150), samples))
+    report("press", measure(lambda i: backend.press("shift"), samples))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for command parsing and validation.
+Compares the legacy CommandParser path (regex, quote splitting and eval per
+argument) with the command compiler on generated command lists.
+"""
+
+import random
+import sys
+import time
+
+from executor.command_compiler import compile_command, compile_commands
+from executor.command_parser import CommandParser
+
+WORDS = ["hello", "你好", "search term", "user@example.com", "a, b", "OK"]
+KEYS = ["enter", "tab", "esc", "backspace", "space"]
+
+def generate_commands(count, seed=0):
+    """Generate a realistic mix of command strings."""
+    rng = random.Random(seed)
+    commands = []
+    for _ in range(count):
+        kind = rng.randrange(8)
+        if kind == 0:
+            commands.append(f"mouse_move({rng.randrange(3840)}, {rng.randrange(2160)})")
+        elif kind == 1:
+            commands.append("mouse_left_click()")
+        elif kind == 2:
+            commands.append(f"mouse_double_click({rng.randrange(3840)}, {rng.randrange(2160)})")
+        elif kind == 3:
+            commands.append(f"keyboard_type('{rng.choice(WORDS)} {rng.randrange(1000)}')")
+        elif kind == 4:
+            commands.append(f"keyboard_press('{rng.choice(KEYS)}')")
+        elif kind == 5:
+            commands.append("keyboard_hotkey('ctrl', 'c')")
+        elif kind == 6:
+            commands.append(f"wait({rng.choice([0.5, 1, 2])})")
+        else:
+            commands.append(f"wait_stable(timeout={rng.randrange(1, 5)})")
+    return commands
+
+def legacy_path(commands):
+    """Parse and validate each command the way the executor used to."""
+    for command in commands:
+        name, args, kwargs = CommandParser.parse_command(command)
+        CommandParser.validate_command(name, args, kwargs)
+
+def compiled_path(commands):
+    """Compile the whole command list once."""
+    compile_command.cache_clear()
+    compile_commands(commands)
+
+def measure(func, commands, repeat=3):
+    """Return the best wall-clock time of several runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(commands)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    """Main function."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    commands = generate_commands(count)
+    
+    legacy = measure(legacy_path, commands)
+    compiled = measure(compiled_path, commands)
+    
+    print(f"Parsed and validated {count} commands")
+    print(f"  legacy parser:    {legacy:.3f}s ({legacy / count * 1e6:.2f} us/command)")
+    print(f"  command compiler: {compiled:.3f}s ({compiled / count * 1e6:.2f} us/command)")
+    print(f"  speedup:          {legacy / compiled:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -12,11 +12,135 @@ API_PORT = int(os.getenv('API_PORT', '8000'))
 DEEPSEEK_API_URL = os.getenv('DEEPSEEK_API_URL', 'https://api.siliconflow.cn/v1/chat/completions')
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', 'sk-123456789')  # Replace with actual key in .env
 
+# HTTP Client Configuration
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '120'))
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'true').lower() == 'true'
+
+# Request Policy Configuration
+LLM_DEADLINES = {  # Seconds per model call, including retries and hedges; 0 disables
+    "plan": float(os.getenv('LLM_DEADLINE_PLAN', '60')),
+    "vision": float(os.getenv('LLM_DEADLINE_VISION', '30')),
+    "operation": float(os.getenv('LLM_DEADLINE_OPERATION', '30')),
+    "default": float(os.getenv('LLM_DEADLINE_DEFAULT', '60')),
+}
+HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', 'true').lower() == 'true'
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))  # Send a duplicate once a call is slower than this percentile
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))  # Latency samples needed before hedging
+HEDGE_MAX_REQUESTS = int(os.getenv('HEDGE_MAX_REQUESTS', '2'))  # Requests per call, the original included
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', '3'))  # Per request, on 429/5xx and connection errors
+RETRY_BACKOFF_BASE = float(os.getenv('RETRY_BACKOFF_BASE', '0.5'))
+RETRY_BACKOFF_MAX = float(os.getenv('RETRY_BACKOFF_MAX', '8'))
+
+# Single-Flight Configuration
+SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'  # Send identical concurrent model calls once
+
+# Model Limits Configuration
+MODEL_MAX_CONCURRENCY = int(os.getenv('MODEL_MAX_CONCURRENCY', '8'))  # Concurrent requests per model, 0 for no limit
+MODEL_REQUESTS_PER_MINUTE = int(os.getenv('MODEL_REQUESTS_PER_MINUTE', '0'))  # 0 for no limit
+MODEL_TOKENS_PER_MINUTE = int(os.getenv('MODEL_TOKENS_PER_MINUTE', '0'))  # 0 for no limit
+# Per-model overrides: "model=concurrency/requests_per_minute/tokens_per_minute;..."
+MODEL_LIMITS = {
+    model.strip(): tuple(int(value) for value in limits.split('/'))
+    for model, limits in (item.split('=', 1) for item in os.getenv('MODEL_LIMITS', '').split(';') if item.strip())
+}
+
 # Agent Configuration
 MAIN_AGENT_MODEL = os.getenv('MAIN_AGENT_MODEL', 'deepseek-ai/DeepSeek-V3')
 VISION_AGENT_MODEL = os.getenv('VISION_AGENT_MODEL', 'deepseek-ai/deepseek-vl2')
 OPERATION_AGENT_MODEL = os.getenv('OPERATION_AGENT_MODEL', 'deepseek-ai/DeepSeek-V3')
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', 'false').lower() == 'true'
+PLANNING_MODE = os.getenv('PLANNING_MODE', 'standard')  # 'standard' or 'fused' (planner writes the commands)
+PLAN_GRAPH_ENABLED = os.getenv('PLAN_GRAPH_ENABLED', 'true').lower() == 'true'  # Overlap plan steps that do not depend on each other
+SPECULATION_ENABLED = os.getenv('SPECULATION_ENABLED', 'true').lower() == 'true'  # Generate the next operation's commands while the current one runs
+
+# Operation Rules Configuration
+OPERATION_RULES_ENABLED = os.getenv('OPERATION_RULES_ENABLED', 'true').lower() == 'true'  # Compile simple instructions without the model
+
+# Plan Cache Configuration
+PLAN_CACHE_ENABLED = os.getenv('PLAN_CACHE_ENABLED', 'true').lower() == 'true'
+PLAN_CACHE_DIR = os.getenv('PLAN_CACHE_DIR', './cache/plans')
+PLAN_CACHE_TTL = float(os.getenv('PLAN_CACHE_TTL', '604800'))  # Seconds, 0 disables expiry
+PLAN_CACHE_MEMORY_MAX_ENTRIES = int(os.getenv('PLAN_CACHE_MEMORY_MAX_ENTRIES', '1000'))
+PLAN_CACHE_DISK_MAX_ENTRIES = int(os.getenv('PLAN_CACHE_DISK_MAX_ENTRIES', '10000'))
+
+# Vision Cache Configuration
+VISION_CACHE_ENABLED = os.getenv('VISION_CACHE_ENABLED', 'true').lower() == 'true'
+VISION_CACHE_HASH_SIZE = int(os.getenv('VISION_CACHE_HASH_SIZE', '16'))  # Hash has size**2 bits
+VISION_CACHE_TOLERANCE = int(os.getenv('VISION_CACHE_TOLERANCE', '6'))  # Max Hamming distance
+VISION_CACHE_MAX_BYTES = int(os.getenv('VISION_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+
+# Trace Replay Configuration
+TRACE_CACHE_ENABLED = os.getenv('TRACE_CACHE_ENABLED', 'true').lower() == 'true'
+TRACE_CACHE_DIR = os.getenv('TRACE_CACHE_DIR', './cache/traces')
+TRACE_CACHE_MAX_ENTRIES = int(os.getenv('TRACE_CACHE_MAX_ENTRIES', '1000'))
+TRACE_STORE_TEXT = os.getenv('TRACE_STORE_TEXT', 'false').lower() == 'true'  # Write traces that type text to disk (in plaintext)
+TRACE_HASH_SIZE = int(os.getenv('TRACE_HASH_SIZE', '16'))  # Hash has size**2 bits
+TRACE_ELEMENT_TOLERANCE = int(os.getenv('TRACE_ELEMENT_TOLERANCE', '8'))  # Max Hamming distance around the element
+TRACE_SCREEN_TOLERANCE = int(os.getenv('TRACE_SCREEN_TOLERANCE', '24'))  # Max Hamming distance of the whole screen
+
+# Element Store Configuration
+ELEMENT_STORE_CELL_SIZE = int(os.getenv('ELEMENT_STORE_CELL_SIZE', '128'))  # Grid cell size in pixels
+
+# Element Library Configuration (local template matching before the vision model)
+ELEMENT_LIBRARY_ENABLED = os.getenv('ELEMENT_LIBRARY_ENABLED', 'true').lower() == 'true'
+ELEMENT_LIBRARY_DIR = os.getenv('ELEMENT_LIBRARY_DIR', './cache/elements')
+ELEMENT_LIBRARY_MAX_ENTRIES = int(os.getenv('ELEMENT_LIBRARY_MAX_ENTRIES', '500'))
+ELEMENT_LIBRARY_DOWNSAMPLE = int(os.getenv('ELEMENT_LIBRARY_DOWNSAMPLE', '4'))
+ELEMENT_LIBRARY_SCALES = tuple(float(v) for v in os.getenv('ELEMENT_LIBRARY_SCALES', '0.9,1.0,1.1').split(','))
+ELEMENT_LIBRARY_THRESHOLD = float(os.getenv('ELEMENT_LIBRARY_THRESHOLD', '0.9'))  # Min correlation for a match
+ELEMENT_LIBRARY_MIN_SIZE = int(os.getenv('ELEMENT_LIBRARY_MIN_SIZE', '8'))  # Pixels
+ELEMENT_LIBRARY_MIN_CONTRAST = float(os.getenv('ELEMENT_LIBRARY_MIN_CONTRAST', '8'))  # Std dev of gray levels
+ELEMENT_LIBRARY_FLUSH_INTERVAL = float(os.getenv('ELEMENT_LIBRARY_FLUSH_INTERVAL', '30'))  # Seconds between usage count writes
+
+# Vision Localization Configuration
+VISION_LOCALIZATION = os.getenv('VISION_LOCALIZATION', 'single')  # single, coarse_to_fine
+VISION_COARSE_DIMENSION = int(os.getenv('VISION_COARSE_DIMENSION', '768'))  # Longest side of the coarse pass
+VISION_FINE_MARGIN = float(os.getenv('VISION_FINE_MARGIN', '1.0'))  # Crop margin relative to the coarse box
+VISION_FINE_MIN_SIZE = int(os.getenv('VISION_FINE_MIN_SIZE', '256'))  # Minimum crop width/height in pixels
+
+# Frame Diff Configuration
+FRAME_DIFF_ENABLED = os.getenv('FRAME_DIFF_ENABLED', 'true').lower() == 'true'
+FRAME_DIFF_TILE_SIZE = int(os.getenv('FRAME_DIFF_TILE_SIZE', '32'))  # Tile size in screen pixels
+FRAME_DIFF_DOWNSAMPLE = int(os.getenv('FRAME_DIFF_DOWNSAMPLE', '4'))
+FRAME_DIFF_THRESHOLD = float(os.getenv('FRAME_DIFF_THRESHOLD', '4.0'))  # Mean gray-level change per tile
+FRAME_DIFF_MAX_DIRTY_FRACTION = float(os.getenv('FRAME_DIFF_MAX_DIRTY_FRACTION', '0.25'))  # Larger changes get a full analysis
+
+# Input Backend Configuration
+INPUT_BACKEND = os.getenv('INPUT_BACKEND', 'pyautogui')  # pyautogui, x11, null
+X11_DISPLAY = os.getenv('X11_DISPLAY')  # e.g. :99 for Xvfb; defaults to $DISPLAY
+NULL_BACKEND_SIZE = tuple(int(v) for v in os.getenv('NULL_BACKEND_SIZE', '1920x1080').split('x'))
+MOUSE_MOVE_DURATION = float(os.getenv('MOUSE_MOVE_DURATION', '0.5'))  # Seconds of animation per mouse_move
+
+# Executor Configuration
+EXECUTOR_DELAY_MODE = os.getenv('EXECUTOR_DELAY_MODE', 'fixed')  # fixed, stable
+EXECUTOR_DELAY = float(os.getenv('EXECUTOR_DELAY', '0.1'))  # Seconds after each input command in fixed mode
+EXECUTOR_SETTLE_MS = float(os.getenv('EXECUTOR_SETTLE_MS', '150'))  # Stable time after each input command in stable mode
+EXECUTOR_SETTLE_TIMEOUT = float(os.getenv('EXECUTOR_SETTLE_TIMEOUT', '2.0'))
+
+# Command Optimizer Configuration
+OPTIMIZER_ENABLED = os.getenv('OPTIMIZER_ENABLED', 'true').lower() == 'true'
+OPTIMIZER_WAIT_MODE = os.getenv('OPTIMIZER_WAIT_MODE', 'keep')  # keep, stable
+
+# Text Input Configuration
+TEXT_INPUT_MODE = os.getenv('TEXT_INPUT_MODE', 'auto')  # auto, type, paste
+TEXT_PASTE_THRESHOLD = int(os.getenv('TEXT_PASTE_THRESHOLD', '32'))  # Longer text is pasted in auto mode
+TEXT_PASTE_RESTORE_DELAY = float(os.getenv('TEXT_PASTE_RESTORE_DELAY', '0.05'))
+TEXT_TYPE_INTERVAL = float(os.getenv('TEXT_TYPE_INTERVAL', '0.0'))  # Seconds between typed keys
+
+# Screen Settle Configuration
+SETTLE_STABLE_MS = float(os.getenv('SETTLE_STABLE_MS', '300'))  # Default for wait_stable
+SETTLE_TIMEOUT = float(os.getenv('SETTLE_TIMEOUT', '5.0'))
+SETTLE_INTERVAL = float(os.getenv('SETTLE_INTERVAL', '0.03'))  # Seconds between samples
+SETTLE_DOWNSAMPLE = int(os.getenv('SETTLE_DOWNSAMPLE', '8'))
 
 # System Configuration
 SCREENSHOT_DIR = os.getenv('SCREENSHOT_DIR', './screenshots')
+SAVE_SCREENSHOTS = os.getenv('SAVE_SCREENSHOTS', 'false').lower() == 'true'  # Audit copies only
+SCREENSHOT_FORMAT = os.getenv('SCREENSHOT_FORMAT', 'auto')  # auto, png, jpeg, webp
+SCREENSHOT_MAX_BYTES = int(os.getenv('SCREENSHOT_MAX_BYTES', str(5 * 1024 * 1024)))
+SCREENSHOT_ENCODE_PREFERENCE = os.getenv('SCREENSHOT_ENCODE_PREFERENCE', 'balanced')  # speed, balanced, size
+VISION_MAX_DIMENSION = int(os.getenv('VISION_MAX_DIMENSION', '1920'))  # Longest side sent to the vision model, 0 disables
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -0,0 +1,230 @@
+import ast
+import functools
+import re
+from enum import IntEnum
+from executor.command_parser import CommandParser
+from executor.text_input import TEXT_INPUT_MODES
+from utils.error_handler import OperationError
+
+
+class Opcode(IntEnum):
+    """Operation codes of compiled commands."""
+    MOUSE_MOVE = 1
+    MOUSE_LEFT_CLICK = 2
+    MOUSE_RIGHT_CLICK = 3
+    MOUSE_DOUBLE_CLICK = 4
+    KEYBOARD_TYPE = 5
+    KEYBOARD_PRESS = 6
+    KEYBOARD_HOTKEY = 7
+    WAIT = 8
+    WAIT_STABLE = 9
+
+
+OPCODES = {
+    "mouse_move": Opcode.MOUSE_MOVE,
+    "mouse_left_click": Opcode.MOUSE_LEFT_CLICK,
+    "mouse_right_click": Opcode.MOUSE_RIGHT_CLICK,
+    "mouse_double_click": Opcode.MOUSE_DOUBLE_CLICK,
+    "keyboard_type": Opcode.KEYBOARD_TYPE,
+    "keyboard_press": Opcode.KEYBOARD_PRESS,
+    "keyboard_hotkey": Opcode.KEYBOARD_HOTKEY,
+    "wait": Opcode.WAIT,
+    "wait_stable": Opcode.WAIT_STABLE,
+}
+
+COMMAND_NAMES = {opcode: name for name, opcode in OPCODES.items()}
+
+# Opcodes that send input to the desktop (as opposed to waiting)
+INPUT_OPCODES = frozenset(OPCODES.values()) - {Opcode.WAIT, Opcode.WAIT_STABLE}
+
+CLICK_OPCODES = frozenset({Opcode.MOUSE_LEFT_CLICK, Opcode.MOUSE_RIGHT_CLICK, Opcode.MOUSE_DOUBLE_CLICK})
+
+
+class Instruction:
+    """A compiled command: an opcode with pre-converted arguments.
+
+    Instructions are shared between identical command strings, so treat
+    them as immutable and build new ones instead of editing them.
+    """
+    __slots__ = ("op", "args", "kwargs", "source")
+
+    def __init__(self, op, args=(), kwargs=None, source=None):
+        self.op = op
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.source = source
+
+    @property
+    def name(self):
+        return COMMAND_NAMES[self.op]
+
+    @property
+    def is_input(self):
+        return self.op in INPUT_OPCODES
+
+    def to_command(self):
+        """Render the instruction back into a standardized command string."""
+        parts = [repr(arg) for arg in self.args]
+        parts += [f"{key}={value!r}" for key, value in self.kwargs.items()]
+        return f"{self.name}({', '.join(parts)})"
+
+    def __eq__(self, other):
+        return (isinstance(other, Instruction) and self.op == other.op
+                and self.args == other.args and self.kwargs == other.kwargs)
+
+    def __hash__(self):
+        return hash((self.op, self.args))
+
+    def __repr__(self):
+        return self.source or self.to_command()
+
+
+_COMMAND_RE = re.compile(r'^\s*(\w+)\((.*)\)\s*$', re.DOTALL)
+_NUMERIC_ARGS_RE = re.compile(r'^\s*-?\d+(?:\.\d+)?(?:\s*,\s*-?\d+(?:\.\d+)?)*\s*$')
+
+
+def _literal(node):
+    """Convert an argument node to a Python value without evaluating code."""
+    if isinstance(node, ast.Name):
+        # Bare words are treated as strings, e.g. keyboard_press(enter)
+        return node.id
+    return ast.literal_eval(node)
+
+
+def _split_arguments(args_str):
+    """Split arguments on top-level commas, for input that is not valid Python."""
+    parts, current, quote = [], [], None
+    for char in args_str:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == ',':
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if current:
+        parts.append("".join(current).strip())
+    return parts
+
+
+def _parse_arguments(args_str):
+    """Parse an argument list into (args, kwargs)."""
+    if not args_str.strip():
+        return [], {}
+
+    # Fast path: plain numbers, e.g. coordinates and wait times
+    if _NUMERIC_ARGS_RE.match(args_str):
+        return [float(part) if '.' in part else int(part) for part in args_str.split(',')], {}
+
+    try:
+        call = ast.parse(f"f({args_str})", mode="eval").body
+        args = [_literal(node) for node in call.args]
+        kwargs = {}
+        for keyword in call.keywords:
+            if keyword.arg is None:
+                raise ValueError("'**' arguments are not supported")
+            kwargs[keyword.arg] = _literal(keyword.value)
+        return args, kwargs
+    except (SyntaxError, ValueError):
+        pass
+
+    # Lenient fallback: anything that is not a literal is kept as a raw string
+    args, kwargs = [], {}
+    for part in _split_arguments(args_str):
+        if not part:
+            continue
+        key, separator, value = part.partition('=')
+        if separator and part[0] not in "\"'" and re.match(r'^\w+$', key.strip()):
+            kwargs[key.strip()] = _lenient_literal(value.strip())
+        else:
+            args.append(_lenient_literal(part))
+    return args, kwargs
+
+
+def _lenient_literal(text):
+    """Evaluate a literal, falling back to the text itself (without quotes)."""
+    try:
+        return ast.literal_eval(text)
+    except (SyntaxError, ValueError):
+        if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+            return text[1:-1]
+        return text
+
+
+def _coordinates(name, args):
+    """Convert optional (x, y) arguments to integers."""
+    if not args:
+        return ()
+    if len(args) != 2:
+        raise OperationError(f"Command '{name}' takes either no arguments or x and y, got {len(args)}")
+    x, y = args
+    return (int(round(x)), int(round(y)))
+
+
+def _convert(opcode, name, args, kwargs):
+    """Pre-convert arguments to the types the executor expects."""
+    if opcode == Opcode.MOUSE_MOVE or opcode in CLICK_OPCODES:
+        return _coordinates(name, args), {}
+    if opcode == Opcode.KEYBOARD_TYPE:
+        mode = args[1] if len(args) > 1 else kwargs.get("mode")
+        if mode is None:
+            return (str(args[0]),), {}
+        if mode not in TEXT_INPUT_MODES:
+            raise OperationError(f"Command '{name}' got unknown mode '{mode}', expected one of {TEXT_INPUT_MODES}")
+        return (str(args[0]),), {"mode": mode}
+    if opcode == Opcode.KEYBOARD_PRESS:
+        return (str(args[0]),), {}
+    if opcode == Opcode.KEYBOARD_HOTKEY:
+        return tuple(str(key) for key in args), {}
+    if opcode == Opcode.WAIT:
+        seconds = float(args[0])
+        if seconds < 0:
+            raise OperationError(f"Command '{name}' needs a non-negative duration, got {seconds}")
+        return (seconds,), {}
+    if opcode == Opcode.WAIT_STABLE:
+        timeout = args[0] if len(args) > 0 else kwargs.get("timeout")
+        stable_ms = args[1] if len(args) > 1 else kwargs.get("stable_ms")
+        return (None if timeout is None else float(timeout),
+                None if stable_ms is None else float(stable_ms)), {}
+    return tuple(args), kwargs
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_command(command_str):
+    """
+    Compile a command string into a typed instruction.
+
+    Args:
+        command_str (str): The command string (e.g., "mouse_move(100, 200)")
+
+    Returns:
+        Instruction: The compiled instruction
+
+    Raises:
+        OperationError: If the command is malformed or fails validation
+    """
+    match = _COMMAND_RE.match(command_str)
+    if not match:
+        raise OperationError(f"Invalid command format: {command_str}")
+
+    name, args_str = match.groups()
+    opcode = OPCODES.get(name)
+    if opcode is None:
+        raise OperationError(f"Unknown command: {name}")
+
+    args, kwargs = _parse_arguments(args_str)
+    CommandParser.validate_command(name, args, kwargs)
+
+    try:
+        args, kwargs = _convert(opcode, name, args, kwargs)
+    except (TypeError, ValueError) as e:
+        raise OperationError(f"Invalid arguments for '{name}': {str(e)}", command_str)
+    return Instruction(opcode, args, kwargs, source=command_str.strip())
+
+
+def compile_commands(command_strs):
+    """Compile a list of command strings, failing before anything is executed."""
+    return [compile_command(command_str) for command_str in command_strs]
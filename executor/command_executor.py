@@ -1,117 +1,89 @@
-import re
+import asyncio
 import time
-import pyautogui
+from executor.command_compiler import Instruction, Opcode, compile_command
+from executor.text_input import enter_text
+from system.backend import get_backend
+from system.settle import wait_until_stable
+from system.vision_cache import VisionCache
 from utils.logger import get_logger
 from utils.error_handler import handle_error, OperationError
+import config
 
 logger = get_logger(__name__)
 
 class CommandExecutor:
     def __init__(self):
-        # Configure pyautogui
-        pyautogui.FAILSAFE = True  # Move mouse to corner to abort
+        self.backend = get_backend()
+        self.vision_cache = VisionCache()
         
-    @handle_error
-    def execute(self, command_str):
-        """Execute a standardized command using pyautogui."""
-        logger.info(f"Executing command: {command_str}")
-        
-        # Parse the command and arguments
-        match = re.match(r'(\w+)\((.*)\)', command_str)
-        if not match:
-            raise OperationError(f"Invalid command format: {command_str}")
-        
-        command, args_str = match.groups()
+        # Dispatch table from opcode to handler
+        self.handlers = {
+            Opcode.MOUSE_MOVE: self._mouse_move,
+            Opcode.MOUSE_LEFT_CLICK: self._mouse_left_click,
+            Opcode.MOUSE_RIGHT_CLICK: self._mouse_right_click,
+            Opcode.MOUSE_DOUBLE_CLICK: self._mouse_double_click,
+            Opcode.KEYBOARD_TYPE: self._keyboard_type,
+            Opcode.KEYBOARD_PRESS: self._keyboard_press,
+            Opcode.KEYBOARD_HOTKEY: self._keyboard_hotkey,
+            Opcode.WAIT: self._wait,
+            Opcode.WAIT_STABLE: self._wait_stable,
+        }
         
-        # Parse arguments
-        args = []
-        kwargs = {}
-        
-        if args_str:
-            # Handle string arguments with commas inside quotes
-            in_quotes = False
-            current_arg = ""
-            arg_list = []
-            
-            for char in args_str:
-                if char == '"' or char == "'":
-                    in_quotes = not in_quotes
-                    current_arg += char
-                elif char == ',' and not in_quotes:
-                    arg_list.append(current_arg.strip())
-                    current_arg = ""
-                else:
-                    current_arg += char
-            
-            if current_arg:
-                arg_list.append(current_arg.strip())
-            
-            # Evaluate each argument
-            for arg in arg_list:
-                try:
-                    # Handle keyword arguments
-                    if '=' in arg and not (arg.startswith('"') or arg.startswith("'")):
-                        key, val = arg.split('=', 1)
-                        kwargs[key.strip()] = eval(val.strip())
-                    else:
-                        # Handle positional arguments
-                        args.append(eval(arg))
-                except:
-                    # If eval fails, treat as string without quotes
-                    if arg.startswith('"') or arg.startswith("'"):
-                        args.append(eval(arg))
-                    else:
-                        args.append(arg)
+    @handle_error
+    def execute(self, command):
+        """Execute a standardized command (a command string or a compiled instruction) through the input backend."""
+        instruction = command if isinstance(command, Instruction) else compile_command(command)
+        logger.info(f"Executing command: {instruction}")
         
         # Execute the command
         try:
-            if command == "mouse_move":
-                x, y = args
-                pyautogui.moveTo(x, y, duration=0.5)
+            self.handlers[instruction.op](*instruction.args, **instruction.kwargs)
             
-            elif command == "mouse_left_click":
-                if args:
-                    x, y = args
-                    pyautogui.click(x, y)
+            if instruction.is_input:
+                # Input may have changed the screen, so cached vision results are stale
+                self.vision_cache.invalidate()
+                
+                # Give the UI time to react before the next command
+                if config.EXECUTOR_DELAY_MODE == "stable":
+                    wait_until_stable(
+                        stable_ms=config.EXECUTOR_SETTLE_MS,
+                        timeout=config.EXECUTOR_SETTLE_TIMEOUT
+                    )
                 else:
-                    pyautogui.click()
-            
-            elif command == "mouse_right_click":
-                if args:
-                    x, y = args
-                    pyautogui.rightClick(x, y)
-                else:
-                    pyautogui.rightClick()
-            
-            elif command == "mouse_double_click":
-                if args:
-                    x, y = args
-                    pyautogui.doubleClick(x, y)
-                else:
-                    pyautogui.doubleClick()
-            
-            elif command == "keyboard_type":
-                text = args[0]
-                pyautogui.typewrite(text)
-            
-            elif command == "keyboard_press":
-                key = args[0]
-                pyautogui.press(key)
-            
-            elif command == "keyboard_hotkey":
-                pyautogui.hotkey(*args)
-            
-            elif command == "wait":
-                seconds = args[0]
-                time.sleep(seconds)
-            
-            else:
-                raise OperationError(f"Unknown command: {command}")
-            
-            # Small delay between commands for stability
-            time.sleep(0.1)
+                    time.sleep(config.EXECUTOR_DELAY)
             
             return True
             
         except Exception as e:
-            raise OperationError(f"Failed to execute command '{command_str}': {str(e)}")
+            raise OperationError(f"Failed to execute command '{instruction}': {str(e)}")
+    
+    async def execute_async(self, command):
+        """Execute a command in a worker thread so the event loop keeps running."""
+        return await asyncio.to_thread(self.execute, command)
+    
+    def _mouse_move(self, x, y):
+        self.backend.move_to(x, y, duration=config.MOUSE_MOVE_DURATION)
+    
+    def _mouse_left_click(self, *position):
+        self.backend.click(*position)
+    
+    def _mouse_right_click(self, *position):
+        self.backend.click(*position, button="right")
+    
+    def _mouse_double_click(self, *position):
+        self.backend.click(*position, clicks=2)
+    
+    def _keyboard_type(self, text, mode=None):
+        enter_text(text, mode)
+    
+    def _keyboard_press(self, key):
+        self.backend.press(key)
+    
+    def _keyboard_hotkey(self, *keys):
+        self.backend.hotkey(*keys)
+    
+    def _wait(self, seconds):
+        time.sleep(seconds)
+    
+    def _wait_stable(self, timeout, stable_ms):
+        wait_until_stable(stable_ms=stable_ms, timeout=timeout)
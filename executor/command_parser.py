@@ -4,6 +4,19 @@ from utils.error_handler import handle_error, OperationError
 
 logger = get_logger(__name__)
 
+# Argument counts accepted by each standardized command
+COMMAND_SPECS = {
+    "mouse_move": {"required_args": 2, "optional_args": 0},
+    "mouse_left_click": {"required_args": 0, "optional_args": 2},
+    "mouse_right_click": {"required_args": 0, "optional_args": 2},
+    "mouse_double_click": {"required_args": 0, "optional_args": 2},
+    "keyboard_type": {"required_args": 1, "optional_args": 1},  # text, mode
+    "keyboard_press": {"required_args": 1, "optional_args": 0},
+    "keyboard_hotkey": {"required_args": 1, "optional_args": 10},  # Allow multiple keys
+    "wait": {"required_args": 1, "optional_args": 0},
+    "wait_stable": {"required_args": 0, "optional_args": 2},  # timeout, stable_ms
+}
+
 class CommandParser:
     """Parser for standardized automation commands."""
     
@@ -135,21 +148,10 @@ class CommandParser:
         Raises:
             OperationError: If the command is invalid
         """
-        valid_commands = {
-            "mouse_move": {"required_args": 2, "optional_args": 0},
-            "mouse_left_click": {"required_args": 0, "optional_args": 2},
-            "mouse_right_click": {"required_args": 0, "optional_args": 2},
-            "mouse_double_click": {"required_args": 0, "optional_args": 2},
-            "keyboard_type": {"required_args": 1, "optional_args": 0},
-            "keyboard_press": {"required_args": 1, "optional_args": 0},
-            "keyboard_hotkey": {"required_args": 1, "optional_args": 10},  # Allow multiple keys
-            "wait": {"required_args": 1, "optional_args": 0},
-        }
-        
-        if command_name not in valid_commands:
+        if command_name not in COMMAND_SPECS:
             raise OperationError(f"Unknown command: {command_name}")
         
-        cmd_spec = valid_commands[command_name]
+        cmd_spec = COMMAND_SPECS[command_name]
         min_args = cmd_spec["required_args"]
         max_args = min_args + cmd_spec["optional_args"]
         
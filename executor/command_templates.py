@@ -0,0 +1,59 @@
+import re
+from system.regions import box_center, first_box
+from utils.error_handler import OperationError
+
+# "@name" or "@name.attribute", e.g. mouse_left_click(@search_box.center)
+PLACEHOLDER_RE = re.compile(r'@([A-Za-z_]\w*)(?:\.(center|width|height|x1|y1|x2|y2|x|y)\b)?')
+
+# Quoted arguments are text to type and are never searched for placeholders
+_QUOTED_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'')
+
+
+def _attribute(element_data, attribute):
+    x1, y1, x2, y2 = first_box(element_data["coordinates"])
+    center_x, center_y = box_center((x1, y1, x2, y2))
+    values = {
+        "x": center_x, "y": center_y,
+        "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+        "width": x2 - x1, "height": y2 - y1
+    }
+    if attribute in (None, "center"):
+        return f"{center_x}, {center_y}"
+    return str(values[attribute])
+
+
+def fill_template(command, elements):
+    """
+    Fill the element placeholders of a command template.
+
+    Args:
+        command (str): A command such as "mouse_left_click(@search_box.center)"
+        elements (dict): Element data by element name
+
+    Returns:
+        str: The command with every placeholder replaced by coordinates
+
+    Raises:
+        OperationError: If a placeholder names an element that was not found
+    """
+    def replace(match):
+        name, attribute = match.groups()
+        element_data = elements.get(name)
+        if element_data is None:
+            raise OperationError(f"Unknown element '@{name}' in command", command)
+        return _attribute(element_data, attribute)
+
+    # Keep quoted text as it is and fill the code around it
+    parts = []
+    last = 0
+    for quoted in _QUOTED_RE.finditer(command):
+        parts.append(PLACEHOLDER_RE.sub(replace, command[last:quoted.start()]))
+        parts.append(quoted.group(0))
+        last = quoted.end()
+    parts.append(PLACEHOLDER_RE.sub(replace, command[last:]))
+    return "".join(parts)
+
+
+def fill_templates(commands, elements):
+    """Fill the element placeholders of a list of command templates."""
+    return [fill_template(command, elements) for command in commands]
@@ -0,0 +1,207 @@
+import re
+import unicodedata
+from system.regions import box_center, first_box
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Quoted text, in ASCII and CJK quotes. An ASCII single quote only opens or closes
+# a quote where it does not touch a Latin letter or digit, so apostrophes ("user's") are not taken for quotes.
+_QUOTED_RE = re.compile(
+    r'"([^"]*)"|(?<![A-Za-z0-9])\'([^\']*)\'(?![A-Za-z0-9])|“([^”]*)”|‘([^’]*)’|「([^」]*)」|『([^』]*)』'
+)
+
+# Quote characters left over once the quoted text is taken out
+_STRAY_QUOTE_RE = re.compile(r'["\'“”‘’「」『』]')
+
+# Clause separators: punctuation and "and"/"then" in English and Chinese
+_CLAUSE_SPLIT_RE = re.compile(
+    r'\s*(?:[,，;；。]|\band then\b|\bthen\b|\band\b|然后|接着|之后|并且|并|再)\s*', re.IGNORECASE
+)
+
+# Words that do not change what a clause asks for
+_FILLER_RE = re.compile(
+    r'^(?:please\s+|请|帮我|帮忙|麻烦)+|\s*(?:please|for me|一下)$', re.IGNORECASE
+)
+
+KEY_NAMES = {
+    "enter": "enter", "return": "enter", "回车": "enter", "回车键": "enter", "确认键": "enter",
+    "tab": "tab", "制表键": "tab",
+    "esc": "esc", "escape": "esc", "退出键": "esc",
+    "backspace": "backspace", "退格": "backspace", "退格键": "backspace",
+    "delete": "delete", "del": "delete", "删除键": "delete",
+    "space": "space", "spacebar": "space", "空格": "space", "空格键": "space",
+    "up": "up", "down": "down", "left": "left", "right": "right",
+    "home": "home", "end": "end", "pageup": "pageup", "pagedown": "pagedown",
+}
+
+MODIFIER_KEYS = {"ctrl", "control", "shift", "alt", "cmd", "command", "win"}
+
+_CLICK_PATTERNS = [
+    ("mouse_double_click", re.compile(r'^(?:double[\s-]?click|双击)\s*(?:on\s+)?(.*)$', re.IGNORECASE)),
+    ("mouse_right_click", re.compile(r'^(?:right[\s-]?click|右键(?:单击|点击)?|右击)\s*(?:on\s+)?(.*)$', re.IGNORECASE)),
+    ("mouse_left_click", re.compile(r'^(?:left[\s-]?click|click|单击|点击|点一下)\s*(?:on\s+)?(.*)$', re.IGNORECASE)),
+]
+
+# "type 'text'", "type 'text' into the box", "在输入框中输入'text'", "输入'text'"
+_TYPE_RE = re.compile(
+    r'^(?:type|enter|input|write|键入|输入|填写|填入)\s*(\x00\d+\x00)\s*(?:(?:into|in|in to|on)\s+(.+))?$',
+    re.IGNORECASE
+)
+_TYPE_ZH_TARGET_RE = re.compile(r'^在\s*(.+?)\s*(?:中|里|内|上)\s*(?:输入|键入|填写|填入)\s*(\x00\d+\x00)$')
+
+_PRESS_RE = re.compile(r'^(?:press|hit|tap|按下?|敲击?)\s*(?:the\s+)?(.+?)(?:\s*(?:key|键))?$', re.IGNORECASE)
+
+_WAIT_RE = re.compile(
+    r'^(?:wait|pause|sleep|等待?|停顿)\s*(?:for\s+)?(\d+(?:\.\d+)?)\s*(?:s|sec|secs|second|seconds|秒钟?)?$',
+    re.IGNORECASE
+)
+
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKC", text).strip().lower()
+    return re.sub(r'\s+', ' ', text)
+
+
+def _target_words(text):
+    """Reduce a target phrase to the words that identify an element."""
+    text = _normalize(text)
+    text = re.sub(r'^(?:on|at|in|into)\s+', '', text)
+    text = re.sub(r'\b(?:the|a|an|button|field|box)\b', ' ', text)
+    text = re.sub(r'[的个]', ' ', text)
+    return set(re.findall(r'[a-z0-9]+|[一-鿿]', text))
+
+
+class InstructionCompiler:
+    """Compiles formulaic operation instructions into commands without a model call.
+
+    Handles clicks, typing quoted text, key presses, hotkeys and waits, in
+    English and Chinese, joined by "and"/"then"/"然后" and the like. Click
+    targets resolve to element centers. Anything not understood with
+    confidence returns None, so the caller can fall back to the model.
+    """
+
+    def __init__(self, elements=None):
+        self.elements = elements or {}
+        self.quoted = []
+        # Quoted texts a command used, by index
+        self.used = set()
+
+    def compile(self, instruction):
+        """
+        Compile an instruction into a command list.
+
+        Args:
+            instruction (str): The operation instruction from the plan
+
+        Returns:
+            list: Command strings, or None when the instruction is not understood
+        """
+        # Protect quoted text from clause splitting
+        def protect(match):
+            self.quoted.append(next(group for group in match.groups() if group is not None))
+            return f"\x00{len(self.quoted) - 1}\x00"
+
+        text = _QUOTED_RE.sub(protect, unicodedata.normalize("NFKC", instruction).strip())
+        if _STRAY_QUOTE_RE.search(text):
+            # Unbalanced quotes or apostrophes: where the text to type ends is unclear
+            return None
+        commands = []
+        for clause in _CLAUSE_SPLIT_RE.split(text):
+            clause = _FILLER_RE.sub("", clause.strip().rstrip(".!?！？")).strip()
+            if not clause:
+                continue
+            clause_commands = self._compile_clause(clause)
+            if clause_commands is None:
+                return None
+            commands.extend(clause_commands)
+        if len(self.used) != len(self.quoted):
+            # Quoted text that is not typed or pressed would be silently lost
+            return None
+        return commands or None
+
+    def _compile_clause(self, clause):
+        match = _TYPE_RE.match(clause)
+        if match:
+            text = self._quoted_text(match.group(1))
+            target = match.group(2)
+            prefix = self._click("mouse_left_click", target) if target else []
+            return None if prefix is None else prefix + [f"keyboard_type({text!r})"]
+
+        match = _TYPE_ZH_TARGET_RE.match(clause)
+        if match:
+            prefix = self._click("mouse_left_click", match.group(1))
+            text = self._quoted_text(match.group(2))
+            return None if prefix is None else prefix + [f"keyboard_type({text!r})"]
+
+        match = _WAIT_RE.match(clause)
+        if match:
+            return [f"wait({match.group(1)})"]
+
+        match = _PRESS_RE.match(clause)
+        if match:
+            return self._press(match.group(1))
+
+        for command, pattern in _CLICK_PATTERNS:
+            match = pattern.match(clause)
+            if match:
+                return self._click(command, match.group(1))
+
+        return None
+
+    def _quoted_text(self, placeholder):
+        index = int(placeholder.strip("\x00"))
+        self.used.add(index)
+        return self.quoted[index]
+
+    def _press(self, keys_text):
+        keys_text = _normalize(keys_text)
+        if "\x00" in keys_text:
+            if not re.fullmatch(r'\x00\d+\x00', keys_text):
+                return None
+            keys_text = self._quoted_text(keys_text).lower()
+        keys = [key.strip() for key in re.split(r'\s*\+\s*', keys_text) if key.strip()]
+        if len(keys) > 1:
+            if not all(key in MODIFIER_KEYS for key in keys[:-1]):
+                return None
+            last = KEY_NAMES.get(keys[-1], keys[-1])
+            if len(last) != 1 and last not in KEY_NAMES.values():
+                return None
+            args = ", ".join(repr(key) for key in keys[:-1] + [last])
+            return [f"keyboard_hotkey({args})"]
+        key = KEY_NAMES.get(keys[0]) if keys else None
+        return [f"keyboard_press({key!r})"] if key else None
+
+    def _click(self, command, target):
+        """Click the center of the element a target phrase names, or None if it is unclear."""
+        if not target or "\x00" in target:
+            return None
+        element_data = self._resolve(target)
+        if element_data is None:
+            return None
+        x, y = box_center(first_box(element_data["coordinates"]))
+        return [f"{command}({x}, {y})"]
+
+    def _resolve(self, target):
+        """Find the element a target phrase refers to, or None unless its name matches the target."""
+        words = _target_words(target)
+        if not words or not self.elements:
+            # Without element names there is nothing to check the target against
+            return None
+        # The element whose name shares the most words with the target, if it is unambiguous
+        scored = sorted(
+            ((len(words & _target_words(name)) / len(words), name) for name in self.elements),
+            reverse=True
+        )
+        best_score, best_name = scored[0]
+        if best_score < 0.5 or (len(scored) > 1 and scored[1][0] == best_score):
+            return None
+        return self.elements[best_name]
+
+
+def compile_instruction(instruction, elements=None):
+    """Compile a formulaic instruction into commands, or return None to use the model."""
+    commands = InstructionCompiler(elements).compile(instruction)
+    if commands is not None:
+        logger.info(f"Compiled instruction without the model: {instruction} -> {commands}")
+    return commands
@@ -0,0 +1,140 @@
+from executor.command_compiler import CLICK_OPCODES, Instruction, Opcode
+from utils.logger import get_logger
+import config
+
+logger = get_logger(__name__)
+
+# Instructions that may still merge with the one that follows them
+_MERGEABLE_OPCODES = frozenset({Opcode.MOUSE_MOVE, Opcode.KEYBOARD_TYPE, Opcode.WAIT, Opcode.WAIT_STABLE})
+
+
+class PeepholeOptimizer:
+    """Rewrites a compiled command sequence into an equivalent, cheaper one.
+
+    Only adjacent instructions are combined, so a wait between a move and a
+    click (e.g. to open a hover menu) is always kept. Instructions can be fed
+    one at a time, which lets streamed commands be optimized as they arrive.
+    """
+
+    def __init__(self, wait_mode=None, cursor=None):
+        self.wait_mode = wait_mode or config.OPTIMIZER_WAIT_MODE
+        # Cursor position after the last instruction fed, when known
+        self.cursor = tuple(cursor) if cursor else None
+        self.removed = []
+        # Instructions fed in and handed back, for the summary logged on flush
+        self.fed = 0
+        self.released = 0
+        self._pending = None
+
+    def feed(self, instruction):
+        """Add an instruction and return the instructions that are ready to execute."""
+        self.fed += 1
+        if instruction.op == Opcode.MOUSE_MOVE and instruction.args == self.cursor:
+            self._note(f"dropped {instruction}: cursor is already there")
+            return []
+
+        ready = []
+        if self._pending is not None:
+            merged = self._merge(self._pending, instruction)
+            if merged is not None:
+                self._pending = merged
+                self._track_cursor(instruction)
+                return []
+            ready.append(self._finish(self._pending))
+            self._pending = None
+
+        if instruction.op in _MERGEABLE_OPCODES:
+            self._pending = instruction
+        else:
+            ready.append(instruction)
+        self._track_cursor(instruction)
+        self.released += len(ready)
+        return ready
+
+    def flush(self):
+        """Return the instruction still held back for merging, if any, and log what was optimized."""
+        ready = []
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            ready.append(self._finish(pending))
+        self.released += len(ready)
+        if self.removed:
+            logger.info(f"Optimized {self.fed} commands into {self.released}: {'; '.join(self.removed)}")
+        return ready
+
+    def _merge(self, first, second):
+        """Combine two adjacent instructions, or return None to keep both."""
+        if first.op == Opcode.MOUSE_MOVE:
+            if second.op == Opcode.MOUSE_MOVE:
+                self._note(f"dropped {first}: superseded by {second}")
+                return second
+            if second.op in CLICK_OPCODES:
+                # A positioned click moves the cursor itself, without the animation
+                fused = second if second.args else Instruction(second.op, first.args)
+                self._note(f"fused {first} and {second} into {fused}")
+                return fused
+
+        elif first.op == Opcode.KEYBOARD_TYPE and second.op == Opcode.KEYBOARD_TYPE:
+            if first.kwargs == second.kwargs:
+                merged = Instruction(Opcode.KEYBOARD_TYPE, (first.args[0] + second.args[0],), first.kwargs)
+                self._note(f"merged {first} and {second}")
+                return merged
+
+        elif first.op == Opcode.WAIT and second.op == Opcode.WAIT:
+            merged = Instruction(Opcode.WAIT, (first.args[0] + second.args[0],))
+            self._note(f"collapsed {first} and {second} into {merged}")
+            return merged
+
+        elif first.op == Opcode.WAIT_STABLE and second.op == Opcode.WAIT_STABLE:
+            # Once the screen has settled, a second settle wait returns at once
+            timeout = max(_or_default(first.args[0], config.SETTLE_TIMEOUT),
+                          _or_default(second.args[0], config.SETTLE_TIMEOUT))
+            stable_ms = max(_or_default(first.args[1], config.SETTLE_STABLE_MS),
+                            _or_default(second.args[1], config.SETTLE_STABLE_MS))
+            merged = Instruction(Opcode.WAIT_STABLE, (timeout, stable_ms))
+            self._note(f"collapsed {first} and {second} into {merged}")
+            return merged
+
+        return None
+
+    def _finish(self, instruction):
+        """Apply rewrites that only depend on the instruction itself."""
+        if self.wait_mode == "stable" and instruction.op == Opcode.WAIT and instruction.args[0] > 0:
+            # Wait only as long as the screen is still changing, up to the same time
+            settle = Instruction(Opcode.WAIT_STABLE, (instruction.args[0], None))
+            self._note(f"replaced {instruction} with {settle}")
+            return settle
+        return instruction
+
+    def _track_cursor(self, instruction):
+        if instruction.op == Opcode.MOUSE_MOVE or (instruction.op in CLICK_OPCODES and instruction.args):
+            self.cursor = instruction.args
+
+    def _note(self, message):
+        logger.debug(f"Optimizer {message}")
+        self.removed.append(message)
+
+
+def _or_default(value, default):
+    return default if value is None else value
+
+
+def optimize(instructions, wait_mode=None, cursor=None):
+    """
+    Optimize a compiled command sequence.
+
+    Args:
+        instructions (list): Compiled instructions, in execution order
+        wait_mode (str): 'keep' leaves waits as fixed sleeps, 'stable' turns them
+            into screen-settle waits with the same upper bound
+        cursor (tuple): Current (x, y) cursor position, if known
+
+    Returns:
+        list: The optimized instructions
+    """
+    optimizer = PeepholeOptimizer(wait_mode, cursor)
+    optimized = []
+    for instruction in instructions:
+        optimized.extend(optimizer.feed(instruction))
+    optimized.extend(optimizer.flush())
+    return optimized
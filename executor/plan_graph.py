@@ -0,0 +1,105 @@
+import asyncio
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# What each node of a step does; an operation step is generated and executed separately
+CAPTURE = "capture"
+LOCATE = "locate"
+GENERATE = "generate"
+EXECUTE = "execute"
+
+
+class PlanGraph:
+    """Dependencies between the steps of a plan, so independent work can overlap.
+
+    Every step becomes one node, except operation steps, which become a
+    generate node (the model call) and an execute node (the input). The
+    nodes that touch the desktop, screenshots and input, keep the plan's
+    order; vision lookups and command generation only wait for the results
+    they use:
+
+    - a vision step waits for the screenshot it looks at, and for the vision
+      steps before it, which share its element store
+    - generating an operation waits for the vision steps before it
+    - executing an operation waits for its commands and the previous desktop node
+    - a screenshot waits for the previous desktop node
+
+    Vision steps therefore never run concurrently with each other. That costs
+    nothing on one frame: the first of its vision steps sends every prompt
+    of the frame in one request, and the later ones read the element store.
+    What the graph overlaps is command generation, screenshots and input
+    with each other and with the vision requests, not vision requests.
+
+    Nodes are (step_idx, kind) tuples, in an order where dependencies come first.
+    """
+
+    def __init__(self, plan, start=0):
+        self.plan = plan
+        self.deps = {}
+        # Screenshot step each step sees the screen through, None to use the last frame
+        self.frame_steps = {}
+        # Vision step whose element an operation step works on
+        self.element_steps = {}
+
+        last_desktop = last_vision = frame_step = None
+        for step_idx in range(start, len(plan)):
+            step_type = plan[step_idx]["type"]
+            if step_type == "screenshot":
+                self._add((step_idx, CAPTURE), last_desktop)
+                last_desktop = frame_step = (step_idx, CAPTURE)
+            elif step_type == "vision_analysis":
+                self._add((step_idx, LOCATE), frame_step, last_vision,
+                          # Without a screenshot step the vision step may take one itself
+                          last_desktop if frame_step is None else None)
+                if frame_step is None:
+                    last_desktop = (step_idx, LOCATE)
+                last_vision = (step_idx, LOCATE)
+            elif step_type == "operation":
+                self._add((step_idx, GENERATE), last_vision)
+                self._add((step_idx, EXECUTE), (step_idx, GENERATE), last_desktop)
+                last_desktop = (step_idx, EXECUTE)
+                self.element_steps[step_idx] = last_vision[0] if last_vision else None
+            self.frame_steps[step_idx] = frame_step[0] if frame_step else None
+
+    def _add(self, node, *deps):
+        self.deps[node] = {dep for dep in deps if dep is not None}
+
+    def next_operation(self, step_idx):
+        """Get the index of the first operation step after step_idx, or None."""
+        for next_idx in range(step_idx + 1, len(self.plan)):
+            if self.plan[next_idx]["type"] == "operation":
+                return next_idx
+        return None
+
+    async def run(self, handler):
+        """
+        Run every node as soon as its dependencies are done.
+
+        Args:
+            handler: Coroutine function called with each node
+
+        Returns:
+            dict: The handler's result per node
+
+        Raises:
+            Exception: The first failure; nodes still running or waiting are cancelled
+        """
+        tasks = {}
+
+        async def run_node(node):
+            if self.deps[node]:
+                await asyncio.gather(*(tasks[dep] for dep in self.deps[node]))
+            return await handler(node)
+
+        for node in self.deps:
+            tasks[node] = asyncio.ensure_future(run_node(node))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {node: task.result() for node, task in tasks.items()}
@@ -0,0 +1,60 @@
+from executor.command_compiler import CLICK_OPCODES, Instruction, Opcode
+from system.regions import first_box
+
+# Stand-in boxes, laid out on a grid, for elements that have not been located yet
+SYMBOLIC_BOX_SIZE = (160, 48)
+_SYMBOLIC_ORIGIN = (317, 211)
+_SYMBOLIC_STRIDE = (260, 150)
+_SYMBOLIC_COLUMNS = 6
+
+POSITIONED_OPCODES = CLICK_OPCODES | {Opcode.MOUSE_MOVE}
+
+
+def symbolic_elements(names):
+    """Get element data with a distinct stand-in box for each expected element."""
+    width, height = SYMBOLIC_BOX_SIZE
+    elements = {}
+    for idx, name in enumerate(names):
+        x1 = _SYMBOLIC_ORIGIN[0] + _SYMBOLIC_STRIDE[0] * (idx % _SYMBOLIC_COLUMNS)
+        y1 = _SYMBOLIC_ORIGIN[1] + _SYMBOLIC_STRIDE[1] * (idx // _SYMBOLIC_COLUMNS)
+        elements[name] = {
+            "element_type": "ui_element",
+            "coordinates": [[x1, y1, x1 + width, y1 + height]]
+        }
+    return elements
+
+
+def _rebase_point(x, y, boxes):
+    for symbolic, actual in boxes:
+        sx1, sy1, sx2, sy2 = symbolic
+        if sx1 <= x <= sx2 and sy1 <= y <= sy2:
+            ax1, ay1, ax2, ay2 = actual
+            return (round(ax1 + (x - sx1) * (ax2 - ax1) / (sx2 - sx1)),
+                    round(ay1 + (y - sy1) * (ay2 - ay1) / (sy2 - sy1)))
+    return None
+
+
+def rebase(program, symbolic, elements):
+    """
+    Move the positions of commands generated against stand-in boxes onto the real elements.
+
+    Args:
+        program (list): Instructions generated for the symbolic elements
+        symbolic (dict): Stand-in element data by name, from symbolic_elements
+        elements (dict): Element data by name, as located on the screen
+
+    Returns:
+        list: Rebased instructions, or None when a position is not inside the
+            stand-in box of an element that was located, so cannot be mapped onto the screen
+    """
+    boxes = [(first_box(data["coordinates"]), first_box(elements[name]["coordinates"]))
+             for name, data in symbolic.items() if name in elements]
+    rebased = []
+    for instruction in program:
+        if instruction.op in POSITIONED_OPCODES and instruction.args:
+            point = _rebase_point(*instruction.args[:2], boxes)
+            if point is None:
+                return None
+            instruction = Instruction(instruction.op, point + instruction.args[2:], instruction.kwargs)
+        rebased.append(instruction)
+    return rebased
@@ -0,0 +1,79 @@
+import sys
+import time
+import config
+from system.backend import ClipboardError, get_backend
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Strategies accepted by keyboard_type(text, mode=...)
+TEXT_INPUT_MODES = ("auto", "type", "paste")
+
+PASTE_HOTKEY = ("command", "v") if sys.platform == "darwin" else ("ctrl", "v")
+
+
+def clipboard_available():
+    """Check whether the input backend has a clipboard to paste through."""
+    return get_backend().clipboard_available()
+
+
+def choose_mode(text, mode=None):
+    """
+    Choose how to enter a piece of text.
+
+    Args:
+        text (str): The text to enter
+        mode (str): 'auto', 'type' or 'paste'; defaults to TEXT_INPUT_MODE
+
+    Returns:
+        str: 'type' or 'paste'
+    """
+    mode = mode or config.TEXT_INPUT_MODE
+    if mode != "auto":
+        return mode
+    # Key events cannot produce non-ASCII text, and long text is slow to type
+    if (not text.isascii() or len(text) > config.TEXT_PASTE_THRESHOLD) and clipboard_available():
+        return "paste"
+    return "type"
+
+
+def type_keys(text):
+    """Type text one key event at a time."""
+    get_backend().type_text(text, interval=config.TEXT_TYPE_INTERVAL)
+
+
+def paste_text(text):
+    """Enter text by pasting it through the clipboard, then restore the clipboard.
+
+    Returns:
+        bool: False when the clipboard is not usable
+    """
+    backend = get_backend()
+    try:
+        previous = backend.get_clipboard()
+        backend.set_clipboard(text)
+    except ClipboardError as e:
+        logger.warning(f"Clipboard is not available: {str(e)}")
+        return False
+
+    try:
+        backend.hotkey(*PASTE_HOTKEY)
+        # Give the target application time to read the clipboard before restoring it
+        time.sleep(config.TEXT_PASTE_RESTORE_DELAY)
+    finally:
+        try:
+            backend.set_clipboard(previous)
+        except ClipboardError as e:
+            logger.warning(f"Failed to restore clipboard: {str(e)}")
+    return True
+
+
+def enter_text(text, mode=None):
+    """Enter text with the fastest strategy that can produce it."""
+    if choose_mode(text, mode) == "paste":
+        if paste_text(text):
+            logger.debug(f"Pasted {len(text)} characters")
+            return
+        if not text.isascii():
+            logger.warning("Typing non-ASCII text key by key, some characters may be lost")
+    type_keys(text)
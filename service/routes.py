@@ -3,8 +3,15 @@ from pydantic import BaseModel
 from typing import Optional
 import uuid
 
-from agents.main_agent import MainAgent
+from agents.main_agent import MainAgent, PLANNING_MODES
+from system.element_library import ElementLibrary
+from system.plan_cache import PlanCache
 from system.state_manager import StateManager
+from system.trace_cache import TraceCache
+from system.vision_cache import VisionCache
+from utils.rate_limiter import limiter_stats
+from utils.request_policy import latency_stats
+from utils.single_flight import SingleFlight
 
 router = APIRouter()
 state_manager = StateManager()
@@ -12,6 +19,8 @@ state_manager = StateManager()
 class IntentRequest(BaseModel):
     intent: str
     session_id: Optional[str] = None
+    stream: Optional[bool] = None
+    planning_mode: Optional[str] = None
 
 class AutomationResponse(BaseModel):
     task_id: str
@@ -20,6 +29,9 @@ class AutomationResponse(BaseModel):
 
 @router.post("/automate", response_model=AutomationResponse)
 async def automate(request: IntentRequest, background_tasks: BackgroundTasks):
+    if request.planning_mode is not None and request.planning_mode not in PLANNING_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown planning mode: {request.planning_mode}")
+    
     # Generate a unique task ID
     task_id = str(uuid.uuid4())
     
@@ -37,7 +49,9 @@ async def automate(request: IntentRequest, background_tasks: BackgroundTasks):
         main_agent.process_intent,
         intent=request.intent,
         task_id=task_id,
-        session_id=session_id
+        session_id=session_id,
+        stream=request.stream,
+        planning_mode=request.planning_mode
     )
     
     # await main_agent.process_intent(intent=request.intent, task_id=task_id, session_id=session_id)
@@ -59,3 +73,15 @@ async def get_status(task_id: str):
         status=status["status"],
         message=status["message"]
     )
+
+@router.get("/metrics")
+async def get_metrics():
+    return {
+        "plan_cache": PlanCache().stats(),
+        "vision_cache": VisionCache().stats(),
+        "trace_cache": TraceCache().stats(),
+        "element_library": ElementLibrary().stats(),
+        "llm_latency": latency_stats(),
+        "model_limits": limiter_stats(),
+        "single_flight": SingleFlight().stats()
+    }
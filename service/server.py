@@ -1,5 +1,7 @@
 from fastapi import FastAPI
 from service.routes import router
+from system.element_library import ElementLibrary
+from utils.http_client import open_client, close_client
 
 def create_app():
     app = FastAPI(
@@ -13,12 +15,14 @@ def create_app():
     
     @app.on_event("startup")
     async def startup_event():
-        # Initialize any resources needed
-        pass
+        # Open the shared pooled HTTP client used by all agents
+        open_client()
     
     @app.on_event("shutdown")
     async def shutdown_event():
-        # Clean up resources
-        pass
+        # Close the shared HTTP client
+        await close_client()
+        # Keep the element usage counts gathered since the last write
+        ElementLibrary().flush()
     
     return app
@@ -0,0 +1,393 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from PIL import Image, ImageDraw
+import config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_backend = None
+_lock = threading.Lock()
+# One desktop lock per event loop, since asyncio locks cannot be shared between loops
+_desktop_locks = weakref.WeakKeyDictionary()
+
+
+class ClipboardError(RuntimeError):
+    """The clipboard of the desktop cannot be read or written."""
+
+
+class Backend(ABC):
+    """Input injection, screen capture and clipboard for the desktop being automated.
+
+    Coordinates are screen pixels. Methods that take an optional position act
+    at the current cursor position when it is omitted.
+    """
+    name = "base"
+
+    @abstractmethod
+    def screenshot(self, region=None):
+        """Capture the screen, or a (left, top, width, height) region of it, as a PIL image."""
+        pass
+
+    @abstractmethod
+    def size(self):
+        """Get the (width, height) of the screen."""
+        pass
+
+    @abstractmethod
+    def position(self):
+        """Get the (x, y) position of the cursor."""
+        pass
+
+    @abstractmethod
+    def move_to(self, x, y, duration=0.0):
+        pass
+
+    @abstractmethod
+    def click(self, x=None, y=None, button="left", clicks=1):
+        pass
+
+    @abstractmethod
+    def type_text(self, text, interval=0.0):
+        """Type text with one key event per character."""
+        pass
+
+    @abstractmethod
+    def press(self, key):
+        pass
+
+    @abstractmethod
+    def hotkey(self, *keys):
+        pass
+
+    def clipboard_available(self):
+        """Check whether get_clipboard and set_clipboard can work at all."""
+        return True
+
+    @abstractmethod
+    def get_clipboard(self):
+        """Get the text on the clipboard; raises ClipboardError when it is not usable."""
+        pass
+
+    @abstractmethod
+    def set_clipboard(self, text):
+        """Put text on the clipboard; raises ClipboardError when it is not usable."""
+        pass
+
+
+class PyAutoGUIBackend(Backend):
+    """Backend using pyautogui, which works on Windows, macOS and X11 desktops."""
+    name = "pyautogui"
+
+    def __init__(self):
+        # Imported here because pyautogui needs a display as soon as it is imported
+        import pyautogui
+        self.pyautogui = pyautogui
+        pyautogui.FAILSAFE = True  # Move mouse to corner to abort
+
+    def screenshot(self, region=None):
+        return self.pyautogui.screenshot(region=region)
+
+    def size(self):
+        return tuple(self.pyautogui.size())
+
+    def position(self):
+        return tuple(self.pyautogui.position())
+
+    def move_to(self, x, y, duration=0.0):
+        self.pyautogui.moveTo(x, y, duration=duration)
+
+    def click(self, x=None, y=None, button="left", clicks=1):
+        self.pyautogui.click(x, y, clicks=clicks, button=button)
+
+    def type_text(self, text, interval=0.0):
+        self.pyautogui.typewrite(text, interval=interval)
+
+    def press(self, key):
+        self.pyautogui.press(key)
+
+    def hotkey(self, *keys):
+        self.pyautogui.hotkey(*keys)
+
+    def clipboard_available(self):
+        try:
+            import pyperclip  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def _pyperclip(self):
+        try:
+            import pyperclip
+        except ImportError:
+            raise ClipboardError("the 'pyperclip' package is not installed")
+        return pyperclip
+
+    def get_clipboard(self):
+        pyperclip = self._pyperclip()
+        try:
+            return pyperclip.paste()
+        except pyperclip.PyperclipException as e:
+            raise ClipboardError(str(e))
+
+    def set_clipboard(self, text):
+        pyperclip = self._pyperclip()
+        try:
+            pyperclip.copy(text)
+        except pyperclip.PyperclipException as e:
+            raise ClipboardError(str(e))
+
+
+# pyautogui key names that differ from X11 keysyms
+X11_KEYS = {
+    "enter": "Return", "return": "Return", "esc": "Escape", "escape": "Escape",
+    "backspace": "BackSpace", "tab": "Tab", "space": "space", "delete": "Delete", "del": "Delete",
+    "up": "Up", "down": "Down", "left": "Left", "right": "Right",
+    "home": "Home", "end": "End", "pageup": "Prior", "pagedown": "Next", "insert": "Insert",
+    "ctrl": "ctrl", "control": "ctrl", "shift": "shift", "alt": "alt",
+    "win": "super", "command": "super", "capslock": "Caps_Lock",
+}
+
+X11_BUTTONS = {"left": 1, "middle": 2, "right": 3}
+
+
+class X11Backend(Backend):
+    """Backend for X11 servers (including Xvfb) using xdotool for input and mss for capture.
+
+    xdotool injects events through XTest without pyautogui's per-call pauses,
+    and mss captures through MIT-SHM when the server supports it. The
+    clipboard is accessed with xclip or xsel, on the same display.
+    """
+    name = "x11"
+
+    def __init__(self, display=None):
+        self.display = display or config.X11_DISPLAY
+        self.xdotool = shutil.which("xdotool")
+        if not self.xdotool:
+            raise RuntimeError("The x11 backend needs the 'xdotool' command")
+        self.xclip = shutil.which("xclip")
+        self.xsel = None if self.xclip else shutil.which("xsel")
+        # mss handles are not thread-safe, so each thread gets its own
+        self._local = threading.local()
+
+    def _env(self):
+        return dict(os.environ, DISPLAY=self.display) if self.display else None
+
+    def _run(self, *args):
+        command = [self.xdotool, *[str(arg) for arg in args]]
+        result = subprocess.run(command, capture_output=True, text=True, env=self._env(), check=False)
+        if result.returncode != 0:
+            raise RuntimeError(f"xdotool {args[0]} failed: {result.stderr.strip()}")
+        return result.stdout
+
+    def _grabber(self):
+        grabber = getattr(self._local, "grabber", None)
+        if grabber is None:
+            try:
+                import mss
+                grabber = mss.mss(display=self.display) if self.display else mss.mss()
+            except ImportError:
+                grabber = False
+                logger.warning("The 'mss' package is not installed, capturing with PIL.ImageGrab")
+            self._local.grabber = grabber
+        return grabber
+
+    def screenshot(self, region=None):
+        grabber = self._grabber()
+        if grabber:
+            if region:
+                left, top, width, height = region
+                monitor = {"left": left, "top": top, "width": width, "height": height}
+            else:
+                monitor = grabber.monitors[0]
+            shot = grabber.grab(monitor)
+            return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+        from PIL import ImageGrab
+        bbox = None
+        if region:
+            left, top, width, height = region
+            bbox = (left, top, left + width, top + height)
+        return ImageGrab.grab(bbox=bbox, xdisplay=self.display)
+
+    def size(self):
+        width, height = self._run("getdisplaygeometry").split()
+        return int(width), int(height)
+
+    def position(self):
+        values = dict(line.split("=", 1) for line in self._run("getmouselocation", "--shell").split())
+        return int(values["X"]), int(values["Y"])
+
+    def move_to(self, x, y, duration=0.0):
+        # xdotool moves instantly; the animation only matters to a human watching
+        self._run("mousemove", x, y)
+
+    def click(self, x=None, y=None, button="left", clicks=1):
+        # Chain the move and the click into a single xdotool invocation
+        args = ["mousemove", x, y] if x is not None and y is not None else []
+        self._run(*args, "click", "--repeat", clicks, X11_BUTTONS[button])
+
+    def type_text(self, text, interval=0.0):
+        self._run("type", "--delay", int(interval * 1000), "--", text)
+
+    def press(self, key):
+        self._run("key", "--", X11_KEYS.get(key.lower(), key))
+
+    def hotkey(self, *keys):
+        self._run("key", "--", "+".join(X11_KEYS.get(key.lower(), key) for key in keys))
+
+    def clipboard_available(self):
+        return bool(self.xclip or self.xsel)
+
+    def get_clipboard(self):
+        if self.xclip:
+            command = [self.xclip, "-selection", "clipboard", "-o"]
+        elif self.xsel:
+            command = [self.xsel, "--clipboard", "--output"]
+        else:
+            raise ClipboardError("the x11 backend needs 'xclip' or 'xsel' for the clipboard")
+        result = subprocess.run(command, capture_output=True, text=True, env=self._env(), check=False)
+        # xclip fails when the clipboard is empty, which is not worth failing for
+        return result.stdout if result.returncode == 0 else ""
+
+    def set_clipboard(self, text):
+        if self.xclip:
+            command = [self.xclip, "-selection", "clipboard", "-i"]
+        elif self.xsel:
+            command = [self.xsel, "--clipboard", "--input"]
+        else:
+            raise ClipboardError("the x11 backend needs 'xclip' or 'xsel' for the clipboard")
+        # Both fork to keep serving the clipboard, so their output must not be captured
+        result = subprocess.run(command, input=text, text=True, env=self._env(), check=False,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if result.returncode != 0:
+            raise ClipboardError(f"{os.path.basename(command[0])} failed with status {result.returncode}")
+
+
+class NullBackend(Backend):
+    """In-memory backend that records input events and serves synthetic frames.
+
+    Frames are a plain desktop with the cursor drawn on it, so screen-change
+    detection sees every move. Used for benchmarks and headless test runs.
+    """
+    name = "null"
+
+    def __init__(self, screen_size=None):
+        self.screen_size = tuple(screen_size or config.NULL_BACKEND_SIZE)
+        self.cursor = (self.screen_size[0] // 2, self.screen_size[1] // 2)
+        self.events = []
+        self.clipboard = ""
+        self._lock = threading.Lock()
+        self._desktop = self._draw_desktop()
+
+    def _draw_desktop(self):
+        width, height = self.screen_size
+        image = Image.new("RGB", self.screen_size, (236, 239, 244))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([0, height - 40, width, height], fill=(46, 52, 64))  # Task bar
+        draw.rectangle([width // 4, height // 4, width * 3 // 4, height * 3 // 4],
+                       fill=(255, 255, 255), outline=(76, 86, 106))  # Window
+        return image
+
+    def _record(self, event, *args):
+        with self._lock:
+            self.events.append((time.monotonic(), event, args))
+
+    def screenshot(self, region=None):
+        image = self._desktop.copy()
+        x, y = self.cursor
+        ImageDraw.Draw(image).rectangle([x, y, x + 10, y + 16], fill=(0, 0, 0))
+        if region:
+            left, top, width, height = region
+            image = image.crop((left, top, left + width, top + height))
+        return image
+
+    def size(self):
+        return self.screen_size
+
+    def position(self):
+        return self.cursor
+
+    def move_to(self, x, y, duration=0.0):
+        self.cursor = (x, y)
+        self._record("move_to", x, y)
+
+    def click(self, x=None, y=None, button="left", clicks=1):
+        if x is not None and y is not None:
+            self.cursor = (x, y)
+        self._record("click", *self.cursor, button, clicks)
+
+    def type_text(self, text, interval=0.0):
+        self._record("type_text", text)
+
+    def press(self, key):
+        self._record("press", key)
+
+    def hotkey(self, *keys):
+        self._record("hotkey", *keys)
+
+    def get_clipboard(self):
+        return self.clipboard
+
+    def set_clipboard(self, text):
+        self.clipboard = text
+
+    def clear(self):
+        """Forget the recorded events."""
+        with self._lock:
+            self.events.clear()
+
+
+BACKENDS = {
+    "pyautogui": PyAutoGUIBackend,
+    "x11": X11Backend,
+    "null": NullBackend,
+}
+
+
+def create_backend(name=None):
+    """Create a backend by name ('pyautogui', 'x11' or 'null')."""
+    name = (name or config.INPUT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown input backend: {name}")
+    logger.info(f"Using {name} input backend")
+    return BACKENDS[name]()
+
+
+def set_backend(backend):
+    """Replace the process-wide backend, e.g. with a NullBackend for benchmarks."""
+    global _backend
+    with _lock:
+        _backend = backend
+
+
+def get_backend():
+    """Get the process-wide backend, creating it on first use."""
+    global _backend
+    backend = _backend
+    if backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = create_backend()
+            backend = _backend
+    return backend
+
+
+def desktop_lock():
+    """Get the lock a task holds while it takes a screenshot or sends input.
+
+    There is a single desktop, so concurrent tasks must not capture it while
+    another one's input is half done, nor interleave their input.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        lock = _desktop_locks.get(loop)
+        if lock is None:
+            lock = _desktop_locks[loop] = asyncio.Lock()
+        return lock
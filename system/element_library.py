@@ -0,0 +1,363 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+from PIL import Image
+import config
+from system.regions import box_area, clamp_box, first_box
+from utils.logger import get_logger
+from utils.text import normalize_key
+
+logger = get_logger(__name__)
+
+
+def _fast_length(n):
+    """Smallest 2**a * 3**b * 5**c >= n, a size the FFT handles quickly."""
+    best = 2 * n
+    power2 = 1
+    while power2 < best:
+        power3 = power2
+        while power3 < best:
+            size = power3
+            while size < n:
+                size *= 5
+            best = min(best, size)
+            power3 *= 3
+        power2 *= 2
+    return best
+
+
+def _integral(array):
+    integral = np.zeros((array.shape[0] + 1, array.shape[1] + 1), dtype=np.float64)
+    integral[1:, 1:] = array.cumsum(axis=0).cumsum(axis=1)
+    return integral
+
+
+def _window_sums(integral, height, width):
+    """Sum of every height x width window, from an integral image."""
+    return (integral[height:, width:] - integral[:-height, width:]
+            - integral[height:, :-width] + integral[:-height, :-width])
+
+
+class TemplateMatcher:
+    """Normalized cross-correlation of templates against one image.
+
+    The correlation is computed with FFTs and the per-window normalization
+    with integral images, so the cost does not grow with the template size.
+    The image spectrum and integrals are computed once and shared by every
+    template (e.g. each scale of a multi-scale search).
+    """
+
+    def __init__(self, image, max_template_shape):
+        self.image = np.asarray(image, dtype=np.float64)
+        height, width = self.image.shape
+        self.shape = (_fast_length(height + max_template_shape[0] - 1),
+                      _fast_length(width + max_template_shape[1] - 1))
+        self.spectrum = np.fft.rfft2(self.image, self.shape)
+        self.integral = _integral(self.image)
+        self.integral_sq = _integral(self.image ** 2)
+
+    def scores(self, template):
+        """Score a template at every position of the image.
+
+        Returns:
+            numpy.ndarray: Scores in [-1, 1] for each top-left position, shape
+                (image_h - template_h + 1, image_w - template_w + 1)
+        """
+        height, width = template.shape
+        count = height * width
+        template = template - template.mean()
+        template_norm = np.sqrt((template ** 2).sum())
+
+        correlation = np.fft.irfft2(
+            self.spectrum * np.fft.rfft2(template[::-1, ::-1], self.shape), self.shape
+        )
+        numerator = correlation[height - 1:self.image.shape[0], width - 1:self.image.shape[1]]
+
+        sums = _window_sums(self.integral, height, width)
+        variance = _window_sums(self.integral_sq, height, width) - sums ** 2 / count
+        denominator = np.sqrt(np.maximum(variance, 0)) * template_norm
+
+        scores = np.zeros_like(numerator)
+        valid = denominator > 1e-6 * count
+        scores[valid] = numerator[valid] / denominator[valid]
+        return scores
+
+    def best(self, template):
+        """Get (score, x, y) of the best position of a template."""
+        scores = self.scores(template)
+        y, x = np.unravel_index(np.argmax(scores), scores.shape)
+        return float(scores[y, x]), int(x), int(y)
+
+
+def _resize(array, width, height):
+    if array.shape == (height, width):
+        return array
+    return np.asarray(Image.fromarray(array).resize((width, height), Image.BILINEAR), dtype=np.float32)
+
+
+class ElementLibrary:
+    """Library of element crops located by the vision model, keyed by prompt.
+
+    Later requests for the same prompt are matched locally with multi-scale
+    normalized cross-correlation on a downsampled frame. Crops are kept on
+    disk with an index, and the least recently used are evicted.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(ElementLibrary, cls).__new__(cls)
+                cls._instance._initialize()
+            return cls._instance
+
+    def _initialize(self):
+        self.enabled = config.ELEMENT_LIBRARY_ENABLED
+        self.library_dir = config.ELEMENT_LIBRARY_DIR
+        self.max_entries = config.ELEMENT_LIBRARY_MAX_ENTRIES
+        self.downsample = config.ELEMENT_LIBRARY_DOWNSAMPLE
+        self.scales = config.ELEMENT_LIBRARY_SCALES
+        self.threshold = config.ELEMENT_LIBRARY_THRESHOLD
+        # Grayscale templates, loaded lazily from disk
+        self.templates = {}
+        self.stats_counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self.index = {}
+        self.flush_interval = config.ELEMENT_LIBRARY_FLUSH_INTERVAL
+        # Index changes not written to disk yet; usage counts are only flushed now and then
+        self._index_dirty = False
+        self._flushed_at = time.monotonic()
+        # Keeps index writes in the order their snapshots were taken
+        self._write_lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(self.library_dir, exist_ok=True)
+            self.index = self._read_index()
+
+    @staticmethod
+    def make_key(prompt):
+        return hashlib.sha256(normalize_key(prompt).encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self.library_dir, f"{key}.png")
+
+    def _index_path(self):
+        return os.path.join(self.library_dir, "index.json")
+
+    def locate(self, frame, prompt):
+        """Find a known element on a frame.
+
+        Returns:
+            dict: Element data like VisionAgent.analyze_screenshot's, or None when the
+                element is unknown or no match is confident enough
+        """
+        if not self.enabled:
+            return None
+
+        key = self.make_key(prompt)
+        template = self._template(key)
+        if template is None:
+            with self._lock:
+                self.stats_counters["misses"] += 1
+            return None
+
+        start = time.perf_counter()
+        d = self.downsample
+        ox, oy = frame.origin
+        
+        # Coarse pass: every scale on the downsampled frame
+        image = self._reduce(frame.image)
+        sizes = []
+        for scale in self.scales:
+            width = round(template.shape[1] * scale)
+            height = round(template.shape[0] * scale)
+            if min(width, height) // d >= 4 and width // d <= image.shape[1] and height // d <= image.shape[0]:
+                sizes.append((width, height))
+        best = None
+        if sizes:
+            matcher = TemplateMatcher(image, (max(h for _, h in sizes) // d, max(w for w, _ in sizes) // d))
+            for width, height in sizes:
+                score, x, y = matcher.best(_resize(template, width // d, height // d))
+                if best is None or score > best[0]:
+                    best = (score, x * d, y * d, width, height)
+        
+        if best is not None:
+            # Fine pass: the best scale at full resolution, around the coarse position
+            _, x, y, width, height = best
+            margin = 2 * d
+            region = clamp_box([x - margin, y - margin, x + width + margin, y + height + margin],
+                               (0, 0) + frame.image.size)
+            if region[2] - region[0] >= width and region[3] - region[1] >= height:
+                crop = np.asarray(frame.image.crop(tuple(region)).convert("L"), dtype=np.float32)
+                scaled = _resize(template, width, height)
+                score, fx, fy = TemplateMatcher(crop, scaled.shape).best(scaled)
+                best = (score, region[0] + fx, region[1] + fy, width, height)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if best is None or best[0] < self.threshold:
+            logger.info(f"No confident local match for '{prompt}' "
+                        f"(score={best[0] if best else 0:.3f}, {elapsed_ms:.0f}ms)")
+            with self._lock:
+                self.stats_counters["misses"] += 1
+            return None
+
+        score, x, y, width, height = best
+        box = [ox + x, oy + y, ox + x + width, oy + y + height]
+        logger.info(f"Matched '{prompt}' locally at {box} (score={score:.3f}, {elapsed_ms:.0f}ms)")
+
+        with self._lock:
+            self.stats_counters["hits"] += 1
+            entry = self.index.get(key)
+            if entry is not None:
+                entry["last_used"] = time.time()
+                entry["hits"] = entry.get("hits", 0) + 1
+                self._index_dirty = True
+        self._flush_index()
+        return {
+            "element_type": "ui_element",
+            "coordinates": [box],
+            "region": list(frame.bounds),
+            "raw_response": f"template match score={score:.3f}"
+        }
+
+    def learn(self, frame, prompt, element_data):
+        """Save the pixels of an element the vision model located on a frame."""
+        if not self.enabled:
+            return
+
+        ox, oy = frame.origin
+        box = clamp_box(first_box(element_data["coordinates"]), frame.bounds)
+        min_size = config.ELEMENT_LIBRARY_MIN_SIZE
+        if box[2] - box[0] < min_size or box[3] - box[1] < min_size:
+            return
+        if box_area(box) > box_area(frame.bounds) * 0.25:
+            # Large areas are too unspecific to be worth matching
+            return
+
+        crop = frame.image.crop((box[0] - ox, box[1] - oy, box[2] - ox, box[3] - oy)).convert("L")
+        template = np.asarray(crop, dtype=np.float32)
+        if template.std() < config.ELEMENT_LIBRARY_MIN_CONTRAST:
+            # A flat crop would match any empty area of the same brightness
+            logger.debug(f"Not learning '{prompt}': crop has too little contrast")
+            return
+
+        key = self.make_key(prompt)
+        try:
+            crop.save(self._path(key), format="PNG")
+        except OSError as e:
+            logger.warning(f"Failed to save element crop for '{prompt}': {str(e)}")
+            return
+
+        with self._lock:
+            self.templates[key] = template
+            self.index[key] = {
+                "prompt": prompt,
+                "size": [box[2] - box[0], box[3] - box[1]],
+                "created_at": time.time(),
+                "last_used": time.time(),
+                "hits": 0
+            }
+            self._evict()
+            self._index_dirty = True
+            self.stats_counters["stores"] += 1
+        self._flush_index(force=True)
+        logger.info(f"Learned element '{prompt}' ({box[2] - box[0]}x{box[3] - box[1]})")
+
+    def forget(self, prompt):
+        """Remove an element, e.g. after a local match led to a failure."""
+        self._forget(self.make_key(prompt))
+
+    def flush(self):
+        """Write usage counts that are only kept in memory so far, e.g. on shutdown."""
+        self._flush_index(force=True)
+
+    def stats(self):
+        """Get library counters and sizes."""
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats["entries"] = len(self.index)
+            return stats
+
+    def _reduce(self, image):
+        image = image.convert("L")
+        if self.downsample > 1:
+            image = image.reduce(self.downsample)
+        return np.asarray(image, dtype=np.float32)
+
+    def _template(self, key):
+        with self._lock:
+            template = self.templates.get(key)
+            if template is not None or key not in self.index:
+                return template
+        try:
+            with Image.open(self._path(key)) as crop:
+                template = np.asarray(crop.convert("L"), dtype=np.float32)
+        except OSError as e:
+            logger.warning(f"Dropping unreadable element crop {key}: {str(e)}")
+            self._forget(key)
+            return None
+        with self._lock:
+            self.templates[key] = template
+        return template
+
+    def _forget(self, key):
+        with self._lock:
+            self._remove(key)
+            self._index_dirty = True
+        self._flush_index(force=True)
+
+    def _remove(self, key):
+        self.templates.pop(key, None)
+        self.index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Evict the least recently used elements above the size limit."""
+        excess = len(self.index) - self.max_entries
+        if excess <= 0:
+            return
+        for key in sorted(self.index, key=lambda k: self.index[k]["last_used"])[:excess]:
+            self._remove(key)
+            self.stats_counters["evictions"] += 1
+
+    def _read_index(self):
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable element library index: {str(e)}")
+            return {}
+
+    def _flush_index(self, force=False):
+        """Write the index if it changed, at most once per flush interval unless forced.
+
+        The index is serialized under the lock but written outside it, so
+        lookups are not held up by disk writes.
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._index_dirty:
+                    return
+                if not force and time.monotonic() - self._flushed_at < self.flush_interval:
+                    return
+                data = json.dumps(self.index, ensure_ascii=False)
+                self._index_dirty = False
+                self._flushed_at = time.monotonic()
+            self._write_index(data)
+
+    def _write_index(self, data):
+        path = self._index_path()
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write element library index: {str(e)}")
@@ -0,0 +1,158 @@
+import math
+import config
+from system.regions import box_area, box_center, boxes_intersect, first_box
+
+
+class Element:
+    """A detected UI element: its box in screen pixels, the prompt that found it and its frame."""
+    __slots__ = ("name", "box", "frame_id", "data")
+
+    def __init__(self, name, box, frame_id, data):
+        self.name = name
+        self.box = tuple(box)
+        self.frame_id = frame_id
+        self.data = data
+
+    @property
+    def center(self):
+        return box_center(self.box)
+
+    def contains(self, x, y):
+        x1, y1, x2, y2 = self.box
+        return x1 <= x < x2 and y1 <= y < y2
+
+    def distance(self, x, y):
+        """Distance from a point to the nearest edge of the box (0 inside it)."""
+        x1, y1, x2, y2 = self.box
+        return math.hypot(max(x1 - x, 0, x - x2), max(y1 - y, 0, y - y2))
+
+    def __repr__(self):
+        return f"Element({self.name!r}, box={list(self.box)}, frame={self.frame_id})"
+
+
+class ElementStore:
+    """Elements detected on a screen, indexed by a uniform grid for spatial queries.
+
+    Each element is registered in every grid cell its box touches, so point
+    and region queries only look at the elements of the cells involved.
+    """
+
+    def __init__(self, frame=None, cell_size=None):
+        # The frame the store currently describes
+        self.frame = frame
+        self.cell_size = cell_size or config.ELEMENT_STORE_CELL_SIZE
+        self.elements = {}
+        self._grid = {}
+
+    @property
+    def frame_id(self):
+        return self.frame.frame_id if self.frame is not None else None
+
+    def _cells(self, box):
+        x1, y1, x2, y2 = box
+        size = self.cell_size
+        for cx in range(int(x1 // size), int((max(x2, x1 + 1) - 1) // size) + 1):
+            for cy in range(int(y1 // size), int((max(y2, y1 + 1) - 1) // size) + 1):
+                yield cx, cy
+
+    def add(self, name, element_data, frame_id=None):
+        """Add the element found for a prompt, replacing an earlier one with the same name."""
+        self.remove(name)
+        element = Element(name, first_box(element_data["coordinates"]),
+                          frame_id if frame_id is not None else self.frame_id, element_data)
+        self.elements[name] = element
+        for cell in self._cells(element.box):
+            self._grid.setdefault(cell, set()).add(name)
+        return element
+
+    def remove(self, name):
+        """Remove an element by name; returns it, or None if it was not stored."""
+        element = self.elements.pop(name, None)
+        if element is not None:
+            for cell in self._cells(element.box):
+                names = self._grid.get(cell)
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self._grid[cell]
+        return element
+
+    def get(self, name):
+        return self.elements.get(name)
+
+    def _candidates(self, box):
+        names = set()
+        for cell in self._cells(box):
+            names.update(self._grid.get(cell, ()))
+        return [self.elements[name] for name in names]
+
+    def at(self, x, y):
+        """Get the elements containing a point, smallest (most specific) first."""
+        hits = [element for element in self._candidates((x, y, x + 1, y + 1)) if element.contains(x, y)]
+        return sorted(hits, key=lambda element: box_area(element.box))
+
+    def nearest(self, x, y, max_distance=None):
+        """Get the element closest to a point, or None when none is within max_distance."""
+        if not self.elements:
+            return None
+
+        size = self.cell_size
+        px, py = int(x // size), int(y // size)
+        # Rings beyond the farthest occupied cell cannot hold anything
+        max_ring = max(max(abs(cx - px), abs(cy - py)) for cx, cy in self._grid)
+        if max_distance is not None:
+            max_ring = min(max_ring, int(max_distance // size) + 1)
+
+        best, best_distance = None, None
+        for ring in range(max_ring + 1):
+            for cx in range(px - ring, px + ring + 1):
+                for cy in range(py - ring, py + ring + 1):
+                    if max(abs(cx - px), abs(cy - py)) != ring:
+                        continue
+                    for name in self._grid.get((cx, cy), ()):
+                        distance = self.elements[name].distance(x, y)
+                        if best_distance is None or distance < best_distance:
+                            best, best_distance = self.elements[name], distance
+            # Anything in the next ring is at least this far from the point
+            if best_distance is not None and best_distance <= ring * size:
+                break
+
+        if best is None or (max_distance is not None and best_distance > max_distance):
+            return None
+        return best
+
+    def within(self, region):
+        """Get the elements entirely inside an (x1, y1, x2, y2) region."""
+        x1, y1, x2, y2 = region
+        return [element for element in self._candidates(region)
+                if element.box[0] >= x1 and element.box[1] >= y1
+                and element.box[2] <= x2 and element.box[3] <= y2]
+
+    def overlapping(self, rects):
+        """Get the elements that overlap any of the given rectangles (e.g. dirty rects)."""
+        hits = {}
+        for rect in rects:
+            for element in self._candidates(rect):
+                if boxes_intersect(element.box, rect):
+                    hits[element.name] = element
+        return list(hits.values())
+
+    def invalidate(self, rects):
+        """Remove the elements touched by a screen change; returns the removed elements."""
+        removed = self.overlapping(rects)
+        for element in removed:
+            self.remove(element.name)
+        return removed
+
+    def to_dict(self):
+        """Get the element data by name, for prompts and task results."""
+        return {name: element.data for name, element in self.elements.items()}
+
+    def __contains__(self, name):
+        return name in self.elements
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __iter__(self):
+        return iter(self.elements.values())
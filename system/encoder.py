@@ -0,0 +1,158 @@
+import io
+import threading
+from PIL import Image, features
+import config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Encoder settings per speed/size preference
+PREFERENCES = {
+    "speed": {"png_compress_level": 1, "optimize": False, "webp_method": 0,
+              "resample": Image.BILINEAR, "lossy_format": "JPEG"},
+    "balanced": {"png_compress_level": 6, "optimize": False, "webp_method": 4,
+                 "resample": Image.BILINEAR, "lossy_format": "JPEG"},
+    "size": {"png_compress_level": 9, "optimize": True, "webp_method": 6,
+             "resample": Image.LANCZOS, "lossy_format": "WEBP"},
+}
+
+MIN_QUALITY = 10
+MAX_QUALITY = 95
+
+# Last quality that met the budget per lossy format, image size and budget;
+# consecutive screens of the same desktop compress alike, so this is usually
+# right the first time. Full screens and small crops are predicted separately.
+_last_quality = {}
+_last_quality_lock = threading.Lock()
+
+
+def webp_available():
+    """Check whether Pillow was built with WebP support."""
+    return features.check("webp")
+
+
+def _save(image, image_format, settings, quality=None):
+    """Encode an image in memory and return the bytes."""
+    buffer = io.BytesIO()
+    if image_format == "PNG":
+        image.save(buffer, format="PNG", compress_level=settings["png_compress_level"],
+                   optimize=settings["optimize"])
+    elif image_format == "JPEG":
+        image.save(buffer, format="JPEG", quality=quality, optimize=settings["optimize"])
+    elif image_format == "WEBP":
+        image.save(buffer, format="WEBP", quality=quality, method=settings["webp_method"])
+    else:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    return buffer.getvalue()
+
+
+def _quality_key(image, image_format, max_bytes):
+    """Key of the quality prediction: sizes within a factor of two of each other share one."""
+    width, height = image.size
+    return image_format, (width * height).bit_length(), max_bytes
+
+
+def _encode_lossy(image, image_format, settings, max_bytes):
+    """Encode at the highest predicted quality that fits the byte budget.
+
+    The first attempt uses the quality that fit the previous frame of a
+    similar size. If it does not fit, a binary search over the remaining
+    range finds the best quality that does, so the worst case is about
+    log2(85) encodes.
+    """
+    key = _quality_key(image, image_format, max_bytes)
+    with _last_quality_lock:
+        predicted = _last_quality.get(key, MAX_QUALITY)
+
+    encodes = 1
+    data = _save(image, image_format, settings, predicted)
+    if len(data) <= max_bytes:
+        best_quality, best_data = predicted, data
+        low, high = predicted + 1, MAX_QUALITY
+    else:
+        best_quality, best_data = None, None
+        low, high = MIN_QUALITY, predicted - 1
+
+    # Only search upwards when the prediction left most of the budget unused
+    if best_data is not None and len(best_data) > max_bytes * 0.7:
+        low = high + 1
+
+    while low <= high:
+        quality = (low + high) // 2
+        data = _save(image, image_format, settings, quality)
+        encodes += 1
+        if len(data) <= max_bytes:
+            best_quality, best_data = quality, data
+            low = quality + 1
+        else:
+            high = quality - 1
+
+    if best_data is None:
+        return None, None
+
+    with _last_quality_lock:
+        _last_quality[key] = best_quality
+    logger.debug(f"Encoded {image_format} at quality {best_quality} in {encodes} passes ({len(best_data)} bytes)")
+    return best_data, best_quality
+
+
+def resize_for_vision(image, max_dimension, resample=Image.BILINEAR):
+    """Downscale an image so its longest side is at most max_dimension.
+
+    Returns:
+        tuple: (image, (scale_x, scale_y)) where the scales map resized pixels back
+            to original pixels; rounding the size makes them differ slightly
+    """
+    width, height = image.size
+    longest = max(width, height)
+    if not max_dimension or longest <= max_dimension:
+        return image, (1.0, 1.0)
+
+    scale = longest / max_dimension
+    size = (max(1, round(width / scale)), max(1, round(height / scale)))
+    return image.resize(size, resample), (width / size[0], height / size[1])
+
+
+def encode_image(image, max_bytes=None, image_format=None, max_dimension=None, preference=None):
+    """Encode an image for a vision request within a byte budget.
+
+    Args:
+        image (PIL.Image.Image): The image to encode
+        max_bytes (int): Byte budget for the encoded image
+        image_format (str): 'auto', 'png', 'jpeg' or 'webp'; 'auto' tries lossless
+            PNG first and falls back to JPEG (WebP when preferring size)
+        max_dimension (int): Downscale so the longest side is at most this (0 disables)
+        preference (str): 'speed', 'balanced' or 'size'
+
+    Returns:
+        tuple: (data, image_format, scale) where scale, an (x, y) pair, maps encoded
+            pixels back to the original image's pixels
+    """
+    max_bytes = max_bytes or config.SCREENSHOT_MAX_BYTES
+    image_format = (image_format or config.SCREENSHOT_FORMAT).upper()
+    if max_dimension is None:
+        max_dimension = config.VISION_MAX_DIMENSION
+    settings = PREFERENCES.get(preference or config.SCREENSHOT_ENCODE_PREFERENCE)
+    if settings is None:
+        raise ValueError(f"Unknown encode preference: {preference or config.SCREENSHOT_ENCODE_PREFERENCE}")
+
+    image, scale = resize_for_vision(image, max_dimension, settings["resample"])
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    if image_format in ("AUTO", "PNG"):
+        data = _save(image, "PNG", settings)
+        if len(data) <= max_bytes or image_format == "PNG":
+            if len(data) > max_bytes:
+                logger.warning(f"PNG screenshot is {len(data)} bytes, over the {max_bytes} byte budget")
+            return data, "PNG", scale
+        image_format = settings["lossy_format"]
+    if image_format == "WEBP" and not webp_available():
+        logger.warning("WebP is not available in this Pillow build, using JPEG")
+        image_format = "JPEG"
+
+    data, quality = _encode_lossy(image, image_format, settings, max_bytes)
+    if data is None:
+        logger.warning(f"Fail to compress screen shot under {max_bytes} bytes")
+        data = _save(image, image_format, settings, MIN_QUALITY)
+    return data, image_format, scale
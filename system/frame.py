@@ -0,0 +1,108 @@
+import base64
+import io
+import itertools
+import time
+from PIL import Image
+from system.encoder import encode_image
+from system.regions import map_box
+
+_frame_ids = itertools.count(1)
+
+
+class Frame:
+    """An in-memory screen capture: the decoded image plus its encoded bytes.
+
+    Frames are handed from capture to the vision request without touching
+    disk; ``path`` is only set when an audit copy was written. The encoded
+    bytes may be downscaled and the frame may be a crop of the screen:
+    ``scale``, an (x, y) pair, and ``origin`` map encoded pixels back to
+    screen pixels.
+    """
+    __slots__ = ("frame_id", "image", "data", "format", "scale", "origin", "captured_at", "path", "_data_url")
+
+    def __init__(self, image, data, image_format, scale=(1.0, 1.0), origin=(0, 0), captured_at=None, path=None):
+        self.frame_id = next(_frame_ids)
+        self.image = image
+        self.data = data
+        self.format = image_format.upper()
+        self.scale = tuple(scale)
+        self.origin = tuple(origin)
+        self.captured_at = captured_at if captured_at is not None else time.time()
+        self.path = path
+        self._data_url = None
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a frame from an image file on disk."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        return cls(image, data, image.format or "PNG", path=path)
+
+    @property
+    def buffer(self):
+        """Zero-copy view of the encoded bytes."""
+        return memoryview(self.data)
+
+    @property
+    def mime_type(self):
+        return f"image/{self.format.lower()}"
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def bounds(self):
+        """The (x1, y1, x2, y2) screen region covered by this frame."""
+        ox, oy = self.origin
+        width, height = self.size
+        return (ox, oy, ox + width, oy + height)
+
+    @property
+    def extension(self):
+        return ".jpg" if self.format == "JPEG" else f".{self.format.lower()}"
+
+    def to_screen(self, coords):
+        """Map a box, or a list of boxes, from encoded-image pixels to screen pixels."""
+        return map_box(coords, self.scale, self.origin)
+
+    def crop(self, box=None, max_dimension=None):
+        """Build a new frame of a screen region, re-encoded for a vision request.
+
+        Args:
+            box (list): [x1, y1, x2, y2] region in screen pixels, or None for the whole frame
+            max_dimension (int): Longest side of the encoded image (defaults to the encoder's)
+
+        Returns:
+            Frame: The region frame, whose to_screen maps back to screen pixels
+        """
+        ox, oy = self.origin
+        if box is None:
+            image, origin = self.image, self.origin
+        else:
+            x1, y1, x2, y2 = box
+            image = self.image.crop((x1 - ox, y1 - oy, x2 - ox, y2 - oy))
+            origin = (x1, y1)
+
+        data, image_format, scale = encode_image(image, max_dimension=max_dimension)
+        return Frame(image, data, image_format, scale=scale, origin=origin, captured_at=self.captured_at)
+
+    def data_url(self):
+        """Encode the frame as a base64 data URL for a vision request (once per frame)."""
+        if self._data_url is None:
+            encoded = base64.b64encode(self.buffer).decode('ascii')
+            self._data_url = f"data:{self.mime_type};base64,{encoded}"
+        return self._data_url
+
+    def save(self, path):
+        """Write the encoded bytes to disk."""
+        with open(path, 'wb') as f:
+            f.write(self.buffer)
+        self.path = path
+        return path
+
+    def __repr__(self):
+        width, height = self.size
+        return f"Frame(id={self.frame_id}, {width}x{height}, {self.format}, {len(self.data)} bytes)"
@@ -0,0 +1,115 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class FrameDiffer:
+    """Tile-based change detector between screen frames.
+
+    Frames are reduced to small grayscale thumbnails, compared per tile,
+    and changed tiles are merged into dirty rectangles in screen pixels.
+    """
+
+    def __init__(self, tile_size=None, downsample=None, threshold=None):
+        self.tile_size = tile_size or config.FRAME_DIFF_TILE_SIZE
+        self.downsample = downsample or config.FRAME_DIFF_DOWNSAMPLE
+        self.threshold = threshold if threshold is not None else config.FRAME_DIFF_THRESHOLD
+        # Thumbnails of recently seen frames, keyed by frame id
+        self._thumbnails = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reduce(self, image):
+        """Reduce an image to the downsampled grayscale array used for comparison."""
+        image = image.convert("L")
+        if self.downsample > 1:
+            image = image.reduce(self.downsample)
+        return np.asarray(image, dtype=np.int16)
+
+    def thumbnail(self, frame):
+        """Get the downsampled grayscale array of a frame (memoized per frame)."""
+        with self._lock:
+            cached = self._thumbnails.get(frame.frame_id)
+            if cached is not None:
+                self._thumbnails.move_to_end(frame.frame_id)
+                return cached
+
+        array = self.reduce(frame.image)
+
+        with self._lock:
+            self._thumbnails[frame.frame_id] = array
+            while len(self._thumbnails) > 8:
+                self._thumbnails.popitem(last=False)
+        return array
+
+    def tile_mask(self, before, after):
+        """Get a boolean grid of changed tiles between two reduced arrays.
+
+        Returns:
+            numpy.ndarray: The grid, or None when the arrays differ in shape
+        """
+        if before.shape != after.shape:
+            return None
+
+        tile = max(1, self.tile_size // self.downsample)
+        height, width = after.shape
+        rows, cols = -(-height // tile), -(-width // tile)
+
+        # Pad to whole tiles and average the absolute difference per tile
+        diff = np.abs(after - before).astype(np.float32)
+        padded = np.zeros((rows * tile, cols * tile), dtype=np.float32)
+        padded[:height, :width] = diff
+        means = padded.reshape(rows, tile, cols, tile).mean(axis=(1, 3))
+        return means > self.threshold
+
+    def dirty_tiles(self, previous, current):
+        """Get a boolean grid of tiles that changed between two frames."""
+        return self.tile_mask(self.thumbnail(previous), self.thumbnail(current))
+
+    def diff(self, previous, current):
+        """Get the dirty rectangles between two frames of the same screen area.
+
+        Returns:
+            list: [x1, y1, x2, y2] rectangles in screen pixels; empty when nothing changed
+        """
+        if previous is current or previous.frame_id == current.frame_id:
+            return []
+
+        mask = self.dirty_tiles(previous, current)
+        if mask is None:
+            return [list(current.bounds)]
+        if not mask.any():
+            return []
+
+        # Merge 8-connected dirty tiles into bounding rectangles
+        rows, cols = mask.shape
+        seen = np.zeros_like(mask)
+        tile_px = max(1, self.tile_size // self.downsample) * self.downsample
+        ox, oy, right, bottom = current.bounds
+        rects = []
+        for row, col in zip(*np.nonzero(mask)):
+            if seen[row, col]:
+                continue
+            seen[row, col] = True
+            stack = [(row, col)]
+            r1, c1, r2, c2 = row, col, row, col
+            while stack:
+                r, c = stack.pop()
+                r1, c1, r2, c2 = min(r1, r), min(c1, c), max(r2, r), max(c2, c)
+                for nr in range(max(0, r - 1), min(rows, r + 2)):
+                    for nc in range(max(0, c - 1), min(cols, c + 2)):
+                        if mask[nr, nc] and not seen[nr, nc]:
+                            seen[nr, nc] = True
+                            stack.append((nr, nc))
+            rects.append([
+                ox + int(c1) * tile_px,
+                oy + int(r1) * tile_px,
+                min(right, ox + (int(c2) + 1) * tile_px),
+                min(bottom, oy + (int(r2) + 1) * tile_px)
+            ])
+
+        logger.debug(f"Frame {previous.frame_id} -> {current.frame_id}: {len(rects)} dirty rects")
+        return rects
@@ -0,0 +1,33 @@
+from PIL import Image
+
+
+def dhash(image, hash_size=16, region=None):
+    """Compute a difference hash (perceptual hash) of an image or a region of it.
+
+    Args:
+        image (PIL.Image.Image): The image to hash
+        hash_size (int): Width/height of the hash grid; the hash has hash_size**2 bits
+        region (tuple): Optional (x1, y1, x2, y2) box to hash instead of the whole image
+
+    Returns:
+        int: The hash as an integer bit field
+    """
+    if region is not None:
+        image = image.crop(tuple(region))
+
+    # Compare each pixel with its right neighbour on a tiny grayscale thumbnail
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = small.tobytes()
+    width = hash_size + 1
+
+    bits = 0
+    for row in range(hash_size):
+        offset = row * width
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def hamming_distance(hash_a, hash_b):
+    """Count the bits that differ between two hashes."""
+    return bin(hash_a ^ hash_b).count("1")
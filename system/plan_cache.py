@@ -0,0 +1,202 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import config
+from utils.logger import get_logger
+from utils.text import normalize_key
+
+logger = get_logger(__name__)
+
+
+class PlanCache:
+    """Two-tier (memory LRU + on-disk) cache of validated plans."""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(PlanCache, cls).__new__(cls)
+                cls._instance._initialize()
+            return cls._instance
+
+    def _initialize(self):
+        self.enabled = config.PLAN_CACHE_ENABLED
+        self.cache_dir = config.PLAN_CACHE_DIR
+        self.ttl = config.PLAN_CACHE_TTL
+        self.memory_max_entries = config.PLAN_CACHE_MEMORY_MAX_ENTRIES
+        self.disk_max_entries = config.PLAN_CACHE_DISK_MAX_ENTRIES
+        self.memory = OrderedDict()
+        # Number of entries on disk, counted on first use and kept up to date after that
+        self.disk_count = None
+        self.stats_counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(intent, model_name, prompt_version):
+        """Build the cache key for an intent, model and prompt version."""
+        raw = f"{prompt_version}\0{model_name}\0{normalize_key(intent)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _expired(self, created_at):
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def get(self, intent, model_name, prompt_version):
+        """Get a cached plan, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        key = self.make_key(intent, model_name, prompt_version)
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if self._expired(entry["created_at"]):
+                    self._remove(key)
+                    self.stats_counters["expirations"] += 1
+                else:
+                    self.memory.move_to_end(key)
+                    self.stats_counters["memory_hits"] += 1
+                    return copy.deepcopy(entry["plan"])
+
+            entry = self._read_disk(key)
+            if entry is None:
+                self.stats_counters["misses"] += 1
+                return None
+
+            # Promote to the memory tier and mark as recently used on disk
+            self._put_memory(key, entry)
+            try:
+                os.utime(self._path(key))
+            except OSError:
+                pass
+            self.stats_counters["disk_hits"] += 1
+            return copy.deepcopy(entry["plan"])
+
+    def put(self, intent, model_name, prompt_version, plan):
+        """Store a plan that was validated and led to a completed task."""
+        if not self.enabled:
+            return
+
+        key = self.make_key(intent, model_name, prompt_version)
+        entry = {
+            "intent": intent,
+            "model": model_name,
+            "prompt_version": prompt_version,
+            "created_at": time.time(),
+            "plan": copy.deepcopy(plan)
+        }
+        with self._lock:
+            self._put_memory(key, entry)
+            self._write_disk(key, entry)
+            self.stats_counters["stores"] += 1
+        logger.info(f"Cached plan for intent: {intent}")
+
+    def invalidate(self, intent, model_name, prompt_version):
+        """Remove the cached plan for an intent."""
+        key = self.make_key(intent, model_name, prompt_version)
+        with self._lock:
+            self._remove(key)
+
+    def stats(self):
+        """Get cache counters and sizes."""
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats["memory_entries"] = len(self.memory)
+            stats["disk_entries"] = self._disk_entries() if self.enabled else 0
+            return stats
+
+    def _put_memory(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_max_entries:
+            self.memory.popitem(last=False)
+            self.stats_counters["evictions"] += 1
+
+    def _remove(self, key):
+        self.memory.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            return
+        if self.disk_count is not None:
+            self.disk_count -= 1
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable plan cache entry {path}: {str(e)}")
+            self._remove(key)
+            return None
+
+        if self._expired(entry.get("created_at", 0)):
+            self._remove(key)
+            self.stats_counters["expirations"] += 1
+            return None
+        return entry
+
+    def _write_disk(self, key, entry):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        count = self._disk_entries()
+        is_new = not os.path.exists(path)
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write plan cache entry {path}: {str(e)}")
+            return
+        if is_new:
+            self.disk_count = count + 1
+            if self.disk_count > self.disk_max_entries:
+                self._evict_disk()
+
+    def _disk_files(self):
+        try:
+            return [name for name in os.listdir(self.cache_dir) if name.endswith(".json")]
+        except OSError:
+            return []
+
+    def _disk_entries(self):
+        if self.disk_count is None:
+            self.disk_count = len(self._disk_files())
+        return self.disk_count
+
+    def _evict_disk(self):
+        """Evict the least recently used disk entries above the size limit.
+
+        Evicts a tenth of the limit more than needed, so the directory is only
+        scanned once every that many new entries rather than on every store.
+        """
+        names = self._disk_files()
+        self.disk_count = len(names)
+        excess = len(names) - (self.disk_max_entries - self.disk_max_entries // 10)
+        if excess <= 0:
+            return
+
+        paths = [os.path.join(self.cache_dir, name) for name in names]
+        paths.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+        for path in paths[:excess]:
+            key = os.path.splitext(os.path.basename(path))[0]
+            self._remove(key)
+            self.stats_counters["evictions"] += 1
@@ -0,0 +1,101 @@
+def first_box(coords):
+    """Get the first [x1, y1, x2, y2] box from a box or a list of boxes."""
+    if coords and isinstance(coords[0], (list, tuple)):
+        return list(coords[0])
+    return list(coords)
+
+
+def box_center(box):
+    """Get the integer center point of a box."""
+    x1, y1, x2, y2 = box
+    return (x1 + x2) // 2, (y1 + y2) // 2
+
+
+def box_area(box):
+    """Get the area of a box."""
+    x1, y1, x2, y2 = box
+    return max(0, x2 - x1) * max(0, y2 - y1)
+
+
+def boxes_intersect(box_a, box_b):
+    """Check whether two boxes overlap."""
+    return (box_a[0] < box_b[2] and box_b[0] < box_a[2]
+            and box_a[1] < box_b[3] and box_b[1] < box_a[3])
+
+
+def box_contains(outer, inner):
+    """Check whether a box lies entirely inside another."""
+    return (outer[0] <= inner[0] and outer[1] <= inner[1]
+            and inner[2] <= outer[2] and inner[3] <= outer[3])
+
+
+def union_box(boxes):
+    """Get the smallest box that contains all the given boxes."""
+    return [min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes)]
+
+
+def map_box(coords, scale=1.0, origin=(0, 0)):
+    """Map a box, or a list of boxes, from a scaled/cropped image to screen pixels.
+
+    Args:
+        coords (list): [x1, y1, x2, y2] or a list of such boxes
+        scale (float or tuple): Screen pixels per image pixel, or an (x, y) pair of them
+        origin (tuple): Screen position of the image's top-left corner
+
+    Returns:
+        list: The box (or boxes) in screen pixels
+    """
+    if coords and isinstance(coords[0], (list, tuple)):
+        return [map_box(box, scale, origin) for box in coords]
+    sx, sy = scale if isinstance(scale, (list, tuple)) else (scale, scale)
+    ox, oy = origin
+    x1, y1, x2, y2 = coords
+    return [round(ox + x1 * sx), round(oy + y1 * sy),
+            round(ox + x2 * sx), round(oy + y2 * sy)]
+
+
+def clamp_box(box, bounds):
+    """Clamp a box to the (x1, y1, x2, y2) bounds."""
+    bx1, by1, bx2, by2 = bounds
+    x1, y1, x2, y2 = box
+    return [max(bx1, min(x1, bx2)), max(by1, min(y1, by2)),
+            max(bx1, min(x2, bx2)), max(by1, min(y2, by2))]
+
+
+def expand_box(box, margin_ratio=1.0, min_size=0, bounds=None):
+    """Grow a box around its center to give a crop some surrounding context.
+
+    Args:
+        box (list): [x1, y1, x2, y2]
+        margin_ratio (float): Extra size on each side, relative to the box size
+        min_size (int): Minimum width and height of the result
+        bounds (tuple): Optional (x1, y1, x2, y2) to clamp the result to
+
+    Returns:
+        list: The expanded box
+    """
+    x1, y1, x2, y2 = box
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    half_w = max((x2 - x1) * (0.5 + margin_ratio), min_size / 2)
+    half_h = max((y2 - y1) * (0.5 + margin_ratio), min_size / 2)
+    expanded = [int(cx - half_w), int(cy - half_h), int(cx + half_w + 0.5), int(cy + half_h + 0.5)]
+
+    if bounds is None:
+        return expanded
+
+    # Shift rather than shrink the box when it runs off an edge
+    bx1, by1, bx2, by2 = bounds
+    if expanded[0] < bx1:
+        expanded[2] += bx1 - expanded[0]
+        expanded[0] = bx1
+    if expanded[1] < by1:
+        expanded[3] += by1 - expanded[1]
+        expanded[1] = by1
+    if expanded[2] > bx2:
+        expanded[0] -= expanded[2] - bx2
+        expanded[2] = bx2
+    if expanded[3] > by2:
+        expanded[1] -= expanded[3] - by2
+        expanded[3] = by2
+    return clamp_box(expanded, bounds)
@@ -1,39 +1,64 @@
+import asyncio
 import os
 import time
-import pyautogui
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import config
+from system.backend import get_backend
+from system.encoder import encode_image
+from system.frame import Frame
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-def take_screenshot():
-    """Take a screenshot and save it to the screenshots directory."""
+# Audit copies are written by a single background worker, off the capture path
+_audit_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot-audit")
+
+def _save_audit_copy(frame):
+    """Write a frame to the screenshots directory in the background."""
+    def save(path):
+        try:
+            frame.save(path)
+            logger.debug(f"Saved audit screenshot: {path}")
+        except OSError as e:
+            logger.warning(f"Failed to save audit screenshot {path}: {str(e)}")
+    
     # Create screenshots directory if it doesn't exist
     os.makedirs(config.SCREENSHOT_DIR, exist_ok=True)
     
     # Generate a filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    png_filename = f"screenshot_{timestamp}.png"
-    png_path = os.path.join(config.SCREENSHOT_DIR, png_filename)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    path = os.path.join(config.SCREENSHOT_DIR, f"screenshot_{timestamp}{frame.extension}")
+    frame.path = path
+    _audit_executor.submit(save, path)
+
+def capture_image(region=None):
+    """Capture the screen, or a (left, top, width, height) region of it, as a PIL image."""
+    return get_backend().screenshot(region=region)
+
+def take_screenshot(save=None):
+    """Take a screenshot and return it as an in-memory frame.
     
+    Args:
+        save (bool): Write an audit copy to SCREENSHOT_DIR in the background.
+            Defaults to config.SAVE_SCREENSHOTS.
+    """
     # Take the screenshot
-    screenshot = pyautogui.screenshot()
-    screenshot.save(png_path, compress_level=9, optimize=True)
+    screenshot = capture_image()
+    captured_at = time.time()
     
-    if os.path.getsize(png_path) <= 5 * 1024 * 1024:
-        return png_path
+    data, image_format, scale = encode_image(screenshot)
     
-    jpg_filename = f"screenshot_{timestamp}.jpg"
-    jpg_path = os.path.join(config.SCREENSHOT_DIR, jpg_filename)
-    quality = 95
-    while quality >= 10:
-        screenshot.save(jpg_path, format='JPEG', quality=quality, optimize=True)
-        if os.path.getsize(jpg_path) <= 5 * 1024 * 1024:
-            os.remove(png_path)
-            return jpg_path
-        os.remove(jpg_path)
-        quality -= 5
+    frame = Frame(screenshot, data, image_format, scale=scale, captured_at=captured_at)
+    
+    if save is None:
+        save = config.SAVE_SCREENSHOTS
+    if save:
+        _save_audit_copy(frame)
+    
+    return frame
+
 
-    logger.warning("Fail to compress screen shot under 5MB")
-    return png_path
+async def take_screenshot_async(save=None):
+    """Take a screenshot in a worker thread so the event loop keeps running."""
+    return await asyncio.to_thread(take_screenshot, save)
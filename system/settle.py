@@ -0,0 +1,53 @@
+import time
+import config
+from system.frame_diff import FrameDiffer
+from system.screenshot import capture_image
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def wait_until_stable(region=None, stable_ms=None, timeout=None, interval=None):
+    """Block until the screen (or a region of it) stops changing.
+
+    Low-resolution samples are taken every ``interval`` seconds and compared
+    tile by tile; the wait ends once no tile has changed for ``stable_ms``.
+
+    Args:
+        region (tuple): Optional (left, top, width, height) area to watch
+        stable_ms (float): How long the screen must stay unchanged, in milliseconds
+        timeout (float): Maximum time to wait, in seconds
+        interval (float): Time between samples, in seconds
+
+    Returns:
+        bool: True if the screen settled, False if the timeout was reached
+    """
+    stable_s = (stable_ms if stable_ms is not None else config.SETTLE_STABLE_MS) / 1000
+    timeout = timeout if timeout is not None else config.SETTLE_TIMEOUT
+    interval = interval if interval is not None else config.SETTLE_INTERVAL
+    differ = FrameDiffer(
+        tile_size=config.SETTLE_DOWNSAMPLE * 4,
+        downsample=config.SETTLE_DOWNSAMPLE,
+        threshold=config.FRAME_DIFF_THRESHOLD
+    )
+
+    start = time.monotonic()
+    deadline = start + timeout
+    previous = differ.reduce(capture_image(region))
+    stable_since = time.monotonic()
+
+    while True:
+        now = time.monotonic()
+        if now - stable_since >= stable_s:
+            logger.debug(f"Screen settled after {(now - start) * 1000:.0f}ms")
+            return True
+        if now >= deadline:
+            logger.info(f"Screen did not settle within {timeout}s")
+            return False
+
+        time.sleep(max(0.0, min(interval, deadline - now)))
+        current = differ.reduce(capture_image(region))
+        mask = differ.tile_mask(previous, current)
+        if mask is None or mask.any():
+            stable_since = time.monotonic()
+        previous = current
@@ -0,0 +1,236 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import config
+from system.image_hash import dhash, hamming_distance
+from system.regions import clamp_box, expand_box, first_box
+from utils.logger import get_logger
+from utils.text import normalize_key
+
+logger = get_logger(__name__)
+
+
+def fingerprint(frame, coordinates):
+    """Fingerprint a frame for a vision step: the whole screen and the area around the element.
+
+    Returns:
+        dict: Hex hashes of the screen and of the element area, plus that area in screen pixels
+    """
+    box = expand_box(first_box(coordinates), margin_ratio=0.5, min_size=64, bounds=frame.bounds)
+    return {
+        "screen": format(dhash(frame.image, config.TRACE_HASH_SIZE), "x"),
+        "element": format(dhash(frame.image, config.TRACE_HASH_SIZE, _image_box(frame, box)), "x"),
+        "box": box
+    }
+
+
+def match_fingerprint(frame, recorded):
+    """Check whether a frame still looks like the one a vision step was recorded on."""
+    box = clamp_box(recorded["box"], frame.bounds)
+    if box[2] <= box[0] or box[3] <= box[1]:
+        return False
+
+    element_distance = hamming_distance(
+        dhash(frame.image, config.TRACE_HASH_SIZE, _image_box(frame, box)), int(recorded["element"], 16)
+    )
+    screen_distance = hamming_distance(
+        dhash(frame.image, config.TRACE_HASH_SIZE), int(recorded["screen"], 16)
+    )
+    logger.debug(f"Trace fingerprint distances: element={element_distance}, screen={screen_distance}")
+    return (element_distance <= config.TRACE_ELEMENT_TOLERANCE
+            and screen_distance <= config.TRACE_SCREEN_TOLERANCE)
+
+
+def _types_text(records):
+    """Check whether a trace holds typed text, which is only written to disk if TRACE_STORE_TEXT is set."""
+    return any(command.startswith("keyboard_type(")
+               for record in records for command in record.get("commands", ()))
+
+
+def _image_box(frame, box):
+    """Convert a box from screen pixels to the frame image's pixels."""
+    ox, oy = frame.origin
+    return (box[0] - ox, box[1] - oy, box[2] - ox, box[3] - oy)
+
+
+class TraceCache:
+    """Cache of execution traces of completed tasks, keyed by intent.
+
+    A trace holds the plan plus one record per step: the element found and
+    the screen fingerprints for vision steps, and the executed commands for
+    operation steps.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(TraceCache, cls).__new__(cls)
+                cls._instance._initialize()
+            return cls._instance
+
+    def _initialize(self):
+        self.enabled = config.TRACE_CACHE_ENABLED
+        self.cache_dir = config.TRACE_CACHE_DIR
+        self.max_entries = config.TRACE_CACHE_MAX_ENTRIES
+        self.memory = OrderedDict()
+        # Number of traces on disk, counted on first use and kept up to date after that
+        self.disk_count = None
+        self.stats_counters = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "invalidations": 0,
+            "replayed_steps": 0,
+            "fallbacks": 0
+        }
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(intent):
+        # Replay sends recorded input without a model, so intents differing in case or
+        # spacing (possibly in the text to type) must not share a trace
+        return hashlib.sha256(normalize_key(intent).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, intent):
+        """Get the trace recorded for an intent, or None."""
+        if not self.enabled:
+            return None
+
+        key = self.make_key(intent)
+        with self._lock:
+            trace = self.memory.get(key)
+            if trace is None:
+                trace = self._read_disk(key)
+                if trace is not None:
+                    self._put_memory(key, trace)
+            if trace is None:
+                self.stats_counters["misses"] += 1
+                return None
+            self.memory.move_to_end(key)
+            self.stats_counters["hits"] += 1
+            return copy.deepcopy(trace)
+
+    def put(self, intent, plan, records):
+        """Store the trace of a completed task."""
+        if not self.enabled:
+            return
+
+        key = self.make_key(intent)
+        trace = {
+            "intent": intent,
+            "created_at": time.time(),
+            "plan": copy.deepcopy(plan),
+            "records": copy.deepcopy(records)
+        }
+        with self._lock:
+            self._put_memory(key, trace)
+            if config.TRACE_STORE_TEXT or not _types_text(records):
+                self._write_disk(key, trace)
+            else:
+                # An older trace for the intent must not outlive this one on disk
+                self._remove_disk(key)
+            self.stats_counters["stores"] += 1
+        logger.info(f"Recorded trace for intent: {intent}")
+
+    def invalidate(self, intent):
+        """Remove the trace for an intent, e.g. after its replay failed."""
+        key = self.make_key(intent)
+        with self._lock:
+            self.memory.pop(key, None)
+            self._remove_disk(key)
+            self.stats_counters["invalidations"] += 1
+
+    def record_replay(self, replayed_steps, fell_back):
+        """Count the outcome of a replay."""
+        with self._lock:
+            self.stats_counters["replayed_steps"] += replayed_steps
+            if fell_back:
+                self.stats_counters["fallbacks"] += 1
+
+    def stats(self):
+        """Get cache counters and sizes."""
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats["memory_entries"] = len(self.memory)
+            return stats
+
+    def _put_memory(self, key, trace):
+        self.memory[key] = trace
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable trace {path}: {str(e)}")
+            self._remove_disk(key)
+            return None
+
+    def _remove_disk(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            return
+        if self.disk_count is not None:
+            self.disk_count -= 1
+
+    def _write_disk(self, key, trace):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        count = self._disk_entries()
+        is_new = not os.path.exists(path)
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(trace, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write trace {path}: {str(e)}")
+            return
+        if is_new:
+            self.disk_count = count + 1
+            if self.disk_count > self.max_entries:
+                self._evict_disk()
+
+    def _disk_files(self):
+        try:
+            return [name for name in os.listdir(self.cache_dir) if name.endswith(".json")]
+        except OSError:
+            return []
+
+    def _disk_entries(self):
+        if self.disk_count is None:
+            self.disk_count = len(self._disk_files())
+        return self.disk_count
+
+    def _evict_disk(self):
+        """Evict the oldest traces on disk above the size limit.
+
+        Evicts a tenth of the limit more than needed, so the directory is only
+        scanned once every that many new traces rather than on every store.
+        """
+        names = self._disk_files()
+        self.disk_count = len(names)
+        excess = len(names) - (self.max_entries - self.max_entries // 10)
+        if excess <= 0:
+            return
+
+        paths = [os.path.join(self.cache_dir, name) for name in names]
+        paths.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+        for path in paths[:excess]:
+            self._remove_disk(os.path.splitext(os.path.basename(path))[0])
@@ -0,0 +1,126 @@
+import copy
+import json
+import threading
+from collections import OrderedDict
+import config
+from system.image_hash import hamming_distance
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class VisionCache:
+    """LRU cache from (perceptual image hash, prompt, model) to parsed element data."""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(VisionCache, cls).__new__(cls)
+                cls._instance._initialize()
+            return cls._instance
+
+    def _initialize(self):
+        self.enabled = config.VISION_CACHE_ENABLED
+        self.tolerance = config.VISION_CACHE_TOLERANCE
+        self.max_bytes = config.VISION_CACHE_MAX_BYTES
+        # (prompt, model, region) -> OrderedDict of entry id -> entry
+        self.buckets = {}
+        # Global recency order across buckets: entry id -> bucket key
+        self.lru = OrderedDict()
+        self.total_bytes = 0
+        self.next_id = 0
+        self.stats_counters = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    @staticmethod
+    def _bucket_key(prompt, model_name, region):
+        return (prompt, model_name, tuple(region) if region is not None else None)
+
+    @staticmethod
+    def _estimate_size(element_data):
+        """Rough size of an entry in bytes, used for the memory cap.
+
+        Counts the serialized data, so the raw model response and every
+        coordinate are included rather than just the top-level references.
+        """
+        return len(json.dumps(element_data, ensure_ascii=False, default=str).encode("utf-8"))
+
+    def get(self, image_hash, prompt, model_name, region=None):
+        """Get cached element data for a similar image, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        bucket_key = self._bucket_key(prompt, model_name, region)
+        with self._lock:
+            bucket = self.buckets.get(bucket_key)
+            if bucket:
+                # Pick the closest hash within tolerance
+                best_id, best_distance = None, None
+                for entry_id, entry in bucket.items():
+                    distance = hamming_distance(image_hash, entry["hash"])
+                    if distance <= self.tolerance and (best_distance is None or distance < best_distance):
+                        best_id, best_distance = entry_id, distance
+                if best_id is not None:
+                    self.lru.move_to_end(best_id)
+                    self.stats_counters["hits"] += 1
+                    logger.info(f"Vision cache hit for prompt '{prompt}' (distance={best_distance})")
+                    return copy.deepcopy(bucket[best_id]["element_data"])
+
+            self.stats_counters["misses"] += 1
+            return None
+
+    def put(self, image_hash, prompt, model_name, element_data, region=None):
+        """Store element data for an image hash."""
+        if not self.enabled:
+            return
+
+        bucket_key = self._bucket_key(prompt, model_name, region)
+        size = self._estimate_size(element_data)
+        with self._lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.buckets.setdefault(bucket_key, OrderedDict())[entry_id] = {
+                "hash": image_hash,
+                "element_data": copy.deepcopy(element_data),
+                "size": size
+            }
+            self.lru[entry_id] = bucket_key
+            self.total_bytes += size
+            self.stats_counters["stores"] += 1
+
+            while self.total_bytes > self.max_bytes and self.lru:
+                self._evict_oldest()
+
+    def invalidate(self):
+        """Drop every entry, e.g. after input was sent and the screen may have changed."""
+        with self._lock:
+            if not self.lru:
+                return
+            self.buckets.clear()
+            self.lru.clear()
+            self.total_bytes = 0
+            self.stats_counters["invalidations"] += 1
+
+    def stats(self):
+        """Get cache counters and sizes."""
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats["entries"] = len(self.lru)
+            stats["bytes"] = self.total_bytes
+            return stats
+
+    def _evict_oldest(self):
+        entry_id, bucket_key = self.lru.popitem(last=False)
+        bucket = self.buckets[bucket_key]
+        entry = bucket.pop(entry_id)
+        if not bucket:
+            del self.buckets[bucket_key]
+        self.total_bytes -= entry["size"]
+        self.stats_counters["evictions"] += 1
@@ -13,6 +13,9 @@ import os
 # Default server URL
 SERVER_URL = "http://localhost:8000"
 
+# Maximum acceptable /status latency (p95) while a task is running
+STATUS_LATENCY_THRESHOLD_MS = float(os.getenv("STATUS_LATENCY_THRESHOLD_MS", "5.0"))
+
 def test_automation(intent):
     """Test the automation system with the given intent."""
     print(f"Testing automation with intent: '{intent}'")
@@ -57,6 +60,53 @@ def test_automation(intent):
         print(f"Error: {str(e)}")
         return False
 
+def test_status_latency(intent, samples=200, threshold_ms=STATUS_LATENCY_THRESHOLD_MS):
+    """Check that /status stays responsive while an automation task is running."""
+    print(f"Testing /status latency while running intent: '{intent}'")
+    
+    session = requests.Session()
+    try:
+        response = session.post(f"{SERVER_URL}/automate", json={"intent": intent})
+        response.raise_for_status()
+        task_id = response.json()["task_id"]
+        
+        # Warm up the keep-alive connection so only server time is measured
+        session.get(f"{SERVER_URL}/status/{task_id}").raise_for_status()
+        
+        latencies = []
+        status = None
+        while len(latencies) < samples:
+            start = time.perf_counter()
+            status_response = session.get(f"{SERVER_URL}/status/{task_id}")
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            status_response.raise_for_status()
+            
+            status = status_response.json()["status"]
+            if status in ["completed", "failed"]:
+                break
+            latencies.append(elapsed_ms)
+            time.sleep(0.01)
+        
+        if not latencies:
+            print(f"Task finished ({status}) before any latency sample was taken; use a longer-running intent.")
+            return False
+        
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"/status latency over {len(latencies)} samples: p50={p50:.2f}ms p95={p95:.2f}ms max={latencies[-1]:.2f}ms")
+        
+        if p95 > threshold_ms:
+            print(f"\n/status p95 latency exceeded {threshold_ms}ms while the task was running.")
+            return False
+        
+        print("\n/status stayed responsive while the task was running.")
+        return True
+        
+    except requests.exceptions.RequestException as e:
+        print(f"Error: {str(e)}")
+        return False
+
 def main():
     """Main function."""
     # Check if the server is running
@@ -68,10 +118,14 @@ def main():
         sys.exit(1)
     
     # Use the provided intent or a default one
-    intent = sys.argv[1] if len(sys.argv) > 1 else "帮我在输入框中输入'你好'."
+    args = [arg for arg in sys.argv[1:] if arg != "--latency"]
+    intent = args[0] if args else "帮我在输入框中输入'你好'."
     
     # Run the test
-    success = test_automation(intent)
+    if "--latency" in sys.argv[1:]:
+        success = test_status_latency(intent)
+    else:
+        success = test_automation(intent)
     
     # Exit with appropriate status code
     sys.exit(0 if success else 1)
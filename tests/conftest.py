@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture
+def fresh():
+    """Build a new instance of a singleton class, bypassing the shared one."""
+    def build(cls):
+        instance = object.__new__(cls)
+        instance._initialize()
+        return instance
+    return build
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import httpx
+import pytest
+import config
+import agents.base_agent as base_agent
+import utils.rate_limiter as rate_limiter
+import utils.request_policy as request_policy
+from agents.base_agent import BaseAgent
+from utils.error_handler import APIError
+
+
+class Agent(BaseAgent):
+    call_type = "operation"
+
+    def process(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def policy(monkeypatch):
+    monkeypatch.setattr(request_policy, "_stats", {})
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setattr(request_policy, "_retry_delay", lambda attempt, error: 0)
+    monkeypatch.setattr(config, "RETRY_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(config, "HEDGE_ENABLED", False)
+    monkeypatch.setattr(config, "SINGLE_FLIGHT_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_DEADLINES", {"operation": 5, "default": 5})
+
+
+def _serve(monkeypatch, responses):
+    """Answer requests with the given responses in turn; returns the list of requests seen."""
+    seen = []
+
+    async def handler(request):
+        seen.append(request)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(base_agent, "get_client", lambda: client)
+    return seen
+
+
+def _sse(*contents):
+    lines = [f"data: {json.dumps({'choices': [{'delta': {'content': content}}]})}" for content in contents]
+    return httpx.Response(200, text="\n\n".join(lines + ["data: [DONE]"]) + "\n\n")
+
+
+def _stream(agent):
+    async def collect():
+        return [delta async for delta in agent.stream_api([{"role": "user", "content": "hi"}])]
+    return asyncio.run(collect())
+
+
+def test_truncated_body_is_retried(monkeypatch):
+    seen = _serve(monkeypatch, [httpx.Response(200, text='{"choices": [{"mess'),
+                                httpx.Response(200, json={"choices": []})])
+    result = asyncio.run(Agent("m").call_api([{"role": "user", "content": "hi"}]))
+    assert result == {"choices": []}
+    assert len(seen) == 2
+
+
+def test_malformed_body_becomes_api_error(monkeypatch):
+    _serve(monkeypatch, [httpx.Response(200, text="not json") for _ in range(3)])
+    with pytest.raises(APIError):
+        asyncio.run(Agent("m").call_api([{"role": "user", "content": "hi"}]))
+
+
+def test_stream_is_retried_before_first_delta(monkeypatch):
+    seen = _serve(monkeypatch, [httpx.Response(503), httpx.ConnectError("reset"), _sse("a", "b", "c")])
+    assert _stream(Agent("m")) == ["a", "b", "c"]
+    assert len(seen) == 3
+    stats = request_policy.latency_stats()["operation_stream"]
+    assert stats["retries"] == 2
+    assert stats["samples"] == 1
+    assert rate_limiter._limiters["m"].in_flight == 0
+
+
+def test_stream_client_error_is_not_retried(monkeypatch):
+    seen = _serve(monkeypatch, [httpx.Response(400)])
+    with pytest.raises(APIError):
+        _stream(Agent("m"))
+    assert len(seen) == 1
+
+
+def test_stream_first_delta_has_deadline(monkeypatch):
+    monkeypatch.setattr(config, "LLM_DEADLINES", {"operation": 0.1, "default": 5})
+
+    async def handler(request):
+        await asyncio.sleep(1)
+        return _sse("late")
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(base_agent, "get_client", lambda: client)
+    with pytest.raises(APIError):
+        _stream(Agent("m"))
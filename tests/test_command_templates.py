@@ -0,0 +1,37 @@
+import pytest
+from executor.command_templates import fill_template, fill_templates
+from utils.error_handler import OperationError
+
+ELEMENTS = {
+    "search_box": {"element_type": "input", "coordinates": [[100, 200, 300, 240]]},
+    "submit": {"element_type": "button", "coordinates": [410, 200, 471, 231]},
+}
+
+
+def test_center_and_bare_name_fill_the_center():
+    assert fill_template("mouse_left_click(@search_box.center)", ELEMENTS) == "mouse_left_click(200, 220)"
+    assert fill_template("mouse_left_click(@search_box)", ELEMENTS) == "mouse_left_click(200, 220)"
+    # Boxes given without the surrounding list work the same
+    assert fill_template("mouse_double_click(@submit.center)", ELEMENTS) == "mouse_double_click(440, 215)"
+
+
+def test_attributes():
+    assert fill_template("mouse_move(@search_box.x1, @search_box.y2)", ELEMENTS) == "mouse_move(100, 240)"
+    assert fill_template("wait(@submit.width)", ELEMENTS) == "wait(61)"
+
+
+def test_quoted_text_is_not_filled():
+    assert (fill_template("keyboard_type('mail @search_box.center')", ELEMENTS)
+            == "keyboard_type('mail @search_box.center')")
+    assert (fill_templates(["mouse_left_click(@submit)", 'keyboard_type("@submit")'], ELEMENTS)
+            == ["mouse_left_click(440, 215)", 'keyboard_type("@submit")'])
+
+
+def test_unknown_name_raises():
+    with pytest.raises(OperationError) as raised:
+        fill_template("mouse_left_click(@missing.center)", ELEMENTS)
+    assert "@missing" in raised.value.message
+
+
+def test_commands_without_placeholders_are_unchanged():
+    assert fill_templates(["keyboard_press('enter')", "wait(1)"], {}) == ["keyboard_press('enter')", "wait(1)"]
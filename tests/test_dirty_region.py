@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from PIL import Image
+import config
+from agents.main_agent import MainAgent
+from system.frame import Frame
+
+
+class FixedDiffer:
+    def __init__(self, dirty_rects):
+        self.dirty_rects = dirty_rects
+
+    def diff(self, previous, current):
+        return self.dirty_rects
+
+
+class CropVision:
+    """Answers every crop with a box given in screen pixels."""
+
+    def __init__(self, box):
+        self.box = box
+        self.calls = 0
+
+    async def analyze_screenshot(self, frame, prompt):
+        self.calls += 1
+        return {"element_type": "ui_element", "coordinates": [self.box]}
+
+
+def _frame():
+    return Frame(Image.new("RGB", (1000, 800), (240, 240, 240)), b"", "PNG")
+
+
+def _analyze(monkeypatch, previous_box, dirty_rects, found_box):
+    monkeypatch.setattr(config, "FRAME_DIFF_ENABLED", True)
+    monkeypatch.setattr(config, "FRAME_DIFF_MAX_DIRTY_FRACTION", 0.5)
+    monkeypatch.setattr(config, "VISION_FINE_MIN_SIZE", 0)
+    agent = MainAgent.__new__(MainAgent)
+    agent.frame_differ = FixedDiffer(dirty_rects)
+    agent.vision_agent = CropVision(found_box)
+    agent.element_library = type("NoLibrary", (), {"enabled": False})()
+    previous = (_frame(), {"coordinates": [previous_box]})
+    result = asyncio.run(agent._analyze_locally(_frame(), "the button", previous))
+    return result, agent.vision_agent.calls
+
+
+def test_unchanged_element_reuses_previous_detection(monkeypatch):
+    (data, source), calls = _analyze(monkeypatch, [100, 100, 200, 140], [[500, 500, 600, 600]], None)
+    assert source == "previous"
+    assert calls == 0
+
+
+def test_changed_element_inside_dirty_region_is_found_in_crop(monkeypatch):
+    (data, source), calls = _analyze(monkeypatch, [100, 100, 200, 140], [[90, 90, 260, 160]],
+                                     [150, 110, 250, 150])
+    assert source == "model"
+    assert data["coordinates"] == [[150, 110, 250, 150]]
+
+
+def test_element_reaching_outside_dirty_region_needs_full_frame(monkeypatch):
+    # Only the left edge of the element changed, so a crop would not show all of it
+    (data, source), calls = _analyze(monkeypatch, [100, 100, 400, 140], [[100, 100, 120, 140]],
+                                     [100, 100, 400, 140])
+    assert (data, source) == (None, None)
+    assert calls == 0
+
+
+def test_crop_match_away_from_changes_needs_full_frame(monkeypatch):
+    (data, source), calls = _analyze(monkeypatch, [300, 300, 340, 320],
+                                     [[300, 300, 340, 320], [100, 100, 120, 120]], [180, 200, 220, 220])
+    assert calls == 1
+    assert (data, source) == (None, None)
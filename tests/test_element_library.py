@@ -0,0 +1,105 @@
+import json
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+import config
+from system.element_library import ElementLibrary, TemplateMatcher
+from system.frame import Frame
+
+
+def _element(width=64, height=40):
+    image = Image.new("L", (width, height), 200)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([2, 2, width - 3, height - 3], outline=40, width=2)
+    draw.ellipse([8, 8, 8 + height - 16, height - 8], fill=70)
+    draw.rectangle([height, height // 3, width - 10, height // 3 + 4], fill=90)
+    draw.rectangle([height, height // 2 + 2, width - 18, height // 2 + 6], fill=120)
+    return image
+
+
+def _screen(element=None, position=(0, 0), size=(320, 240)):
+    image = Image.new("L", size, 235)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, size[1] - 20, size[0], size[1]], fill=60)
+    if element is not None:
+        image.paste(element, position)
+    return Frame(image.convert("RGB"), b"", "PNG")
+
+
+@pytest.fixture
+def library(fresh, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "ELEMENT_LIBRARY_ENABLED", True)
+    monkeypatch.setattr(config, "ELEMENT_LIBRARY_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "ELEMENT_LIBRARY_DOWNSAMPLE", 2)
+    monkeypatch.setattr(config, "ELEMENT_LIBRARY_SCALES", (0.8, 1.0, 1.25))
+    monkeypatch.setattr(config, "ELEMENT_LIBRARY_THRESHOLD", 0.9)
+    monkeypatch.setattr(config, "ELEMENT_LIBRARY_FLUSH_INTERVAL", 3600)
+    return fresh(ElementLibrary)
+
+
+def test_matcher_finds_template_at_offset():
+    rng = np.random.default_rng(0)
+    image = rng.uniform(0, 255, (120, 160))
+    template = image[37:37 + 24, 81:81 + 30]
+    score, x, y = TemplateMatcher(image, template.shape).best(template)
+    assert (x, y) == (81, 37)
+    assert score == pytest.approx(1.0, abs=1e-6)
+
+
+def test_matcher_scores_flat_windows_zero():
+    image = np.full((40, 40), 128.0)
+    image[10:20, 10:20] = np.arange(100).reshape(10, 10)
+    template = image[10:20, 10:20].copy()
+    scores = TemplateMatcher(image, template.shape).scores(template)
+    assert scores[25, 25] == 0
+    assert scores[10, 10] == pytest.approx(1.0, abs=1e-6)
+
+
+def test_library_matches_learned_element_at_new_position(library):
+    element = _element()
+    library.learn(_screen(element, (40, 30)), "the button", {"coordinates": [[40, 30, 104, 70]]})
+
+    data = library.locate(_screen(element, (180, 120)), "the button")
+    assert data["coordinates"] == [[180, 120, 244, 160]]
+
+
+def test_library_matches_across_scales(library):
+    library.learn(_screen(_element(), (40, 30)), "the button", {"coordinates": [[40, 30, 104, 70]]})
+
+    larger = _element().resize((80, 50), Image.BILINEAR)
+    data = library.locate(_screen(larger, (150, 100)), "the button")
+    x1, y1, x2, y2 = data["coordinates"][0]
+    assert abs(x1 - 150) <= 2 and abs(y1 - 100) <= 2
+    assert abs(x2 - 230) <= 2 and abs(y2 - 150) <= 2
+
+
+def test_library_rejects_matches_below_threshold(library):
+    library.learn(_screen(_element(), (40, 30)), "the button", {"coordinates": [[40, 30, 104, 70]]})
+
+    other = Image.new("L", (64, 40), 200)
+    ImageDraw.Draw(other).ellipse([4, 4, 60, 36], outline=30, width=3)
+    assert library.locate(_screen(other, (180, 120)), "the button") is None
+    assert library.stats()["misses"] == 1
+
+
+def test_forgotten_element_is_not_matched(library):
+    element = _element()
+    library.learn(_screen(element, (40, 30)), "the button", {"coordinates": [[40, 30, 104, 70]]})
+    library.forget("the button")
+    assert library.locate(_screen(element, (40, 30)), "the button") is None
+    assert library.stats()["entries"] == 0
+
+
+def test_usage_counts_are_flushed_later(library, tmp_path):
+    element = _element()
+    library.learn(_screen(element, (40, 30)), "the button", {"coordinates": [[40, 30, 104, 70]]})
+    index_path = tmp_path / "index.json"
+    written = index_path.stat().st_mtime_ns
+
+    assert library.locate(_screen(element, (40, 30)), "the button") is not None
+    # A hit only updates the index in memory
+    assert index_path.stat().st_mtime_ns == written
+    assert next(iter(library.index.values()))["hits"] == 1
+
+    library.flush()
+    assert next(iter(json.loads(index_path.read_text()).values()))["hits"] == 1
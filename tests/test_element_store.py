@@ -0,0 +1,84 @@
+import random
+import pytest
+from system.element_store import ElementStore
+
+
+def _random_store(rng, count=300, cell_size=64):
+    store = ElementStore(cell_size=cell_size)
+    for idx in range(count):
+        x1, y1 = rng.randrange(0, 1900), rng.randrange(0, 1060)
+        # Mostly small widgets, a few large panels spanning many cells
+        width, height = (rng.randrange(200, 900), rng.randrange(100, 600)) if idx % 25 == 0 \
+            else (rng.randrange(1, 120), rng.randrange(1, 60))
+        store.add(f"e{idx}", {"coordinates": [[x1, y1, x1 + width, y1 + height]]}, frame_id=1)
+    return store
+
+
+def _points(rng, count=2000):
+    return [(rng.uniform(-100, 2020), rng.uniform(-100, 1180)) for _ in range(count)]
+
+
+@pytest.fixture
+def rng():
+    return random.Random(7)
+
+
+def test_at_matches_brute_force(rng):
+    store = _random_store(rng)
+    for x, y in _points(rng):
+        expected = {element.name for element in store if element.contains(x, y)}
+        found = store.at(x, y)
+        assert {element.name for element in found} == expected
+        assert [element.box for element in found] == sorted(
+            (element.box for element in found), key=lambda box: (box[2] - box[0]) * (box[3] - box[1]))
+
+
+@pytest.mark.parametrize("max_distance", [None, 40])
+def test_nearest_matches_brute_force(rng, max_distance):
+    store = _random_store(rng)
+    for x, y in _points(rng):
+        best = min(element.distance(x, y) for element in store)
+        found = store.nearest(x, y, max_distance)
+        if max_distance is not None and best > max_distance:
+            assert found is None
+        else:
+            assert found.distance(x, y) == pytest.approx(best)
+
+
+def test_within_and_overlapping_match_brute_force(rng):
+    store = _random_store(rng)
+    for _ in range(300):
+        x1, y1 = rng.randrange(-50, 1900), rng.randrange(-50, 1060)
+        region = (x1, y1, x1 + rng.randrange(1, 600), y1 + rng.randrange(1, 400))
+        inside = {element.name for element in store
+                  if element.box[0] >= region[0] and element.box[1] >= region[1]
+                  and element.box[2] <= region[2] and element.box[3] <= region[3]}
+        overlapping = {element.name for element in store
+                       if element.box[0] < region[2] and region[0] < element.box[2]
+                       and element.box[1] < region[3] and region[1] < element.box[3]}
+        assert {element.name for element in store.within(region)} == inside
+        assert {element.name for element in store.overlapping([region])} == overlapping
+
+
+def test_remove_and_replace_update_the_grid(rng):
+    store = _random_store(rng, count=50)
+    removed = store.invalidate([(0, 0, 960, 540)])
+    assert removed
+    assert all(element.name not in store for element in removed)
+    assert store.overlapping([(0, 0, 960, 540)]) == []
+
+    # Empty cells are dropped, so nearest does not search rings that cannot hold anything
+    assert all(store._grid.values())
+
+    store = ElementStore(cell_size=64)
+    store.add("moved", {"coordinates": [[10, 10, 20, 20]]})
+    store.add("moved", {"coordinates": [[1500, 900, 1510, 910]]})
+    assert store.at(15, 15) == []
+    assert [element.name for element in store.at(1505, 905)] == ["moved"]
+    assert len(store._grid) == 1
+
+
+def test_empty_store():
+    store = ElementStore(cell_size=64)
+    assert store.nearest(10, 10) is None
+    assert store.at(10, 10) == []
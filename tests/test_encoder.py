@@ -0,0 +1,72 @@
+import random
+import pytest
+from PIL import Image
+import system.encoder as encoder
+from system.encoder import MAX_QUALITY, PREFERENCES, _encode_lossy, _save, resize_for_vision
+
+SETTINGS = PREFERENCES["speed"]
+
+
+@pytest.fixture(autouse=True)
+def no_predictions(monkeypatch):
+    monkeypatch.setattr(encoder, "_last_quality", {})
+
+
+def _noise(width, height, seed=0):
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height))
+    image.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256))
+                   for _ in range(width * height)])
+    return image
+
+
+def _size(image, quality):
+    return len(_save(image, "JPEG", SETTINGS, quality))
+
+
+def test_search_finds_the_highest_quality_within_budget():
+    image = _noise(200, 150)
+    budget = _size(image, 40) + 1
+    data, quality = _encode_lossy(image, "JPEG", SETTINGS, budget)
+    assert len(data) <= budget
+    assert _size(image, quality + 1) > budget
+
+
+def test_search_gives_up_below_the_minimum_quality():
+    assert _encode_lossy(_noise(200, 150), "JPEG", SETTINGS, 100) == (None, None)
+
+
+def test_prediction_is_reused_for_a_similar_frame(monkeypatch):
+    budget = _size(_noise(200, 150), 40) + 1
+    _, first = _encode_lossy(_noise(200, 150), "JPEG", SETTINGS, budget)
+
+    qualities = []
+    real_save = encoder._save
+    monkeypatch.setattr(encoder, "_save", lambda *args: qualities.append(args[3]) or real_save(*args))
+    _encode_lossy(_noise(200, 150, seed=1), "JPEG", SETTINGS, budget)
+    assert qualities[0] == first
+
+
+def test_predictions_are_kept_per_size_and_budget(monkeypatch):
+    screen = _noise(400, 300)
+    budget = _size(screen, 30) + 1
+    _encode_lossy(screen, "JPEG", SETTINGS, budget)
+
+    qualities = []
+    real_save = encoder._save
+    monkeypatch.setattr(encoder, "_save", lambda *args: qualities.append(args[3]) or real_save(*args))
+    # A small crop and a different budget each start from the top, not from the screen's quality
+    _encode_lossy(_noise(50, 40), "JPEG", SETTINGS, budget)
+    _encode_lossy(screen, "JPEG", SETTINGS, budget * 2)
+    assert qualities.count(MAX_QUALITY) == 2
+    assert len(encoder._last_quality) == 3
+
+
+def test_resize_reports_the_scale_of_each_axis():
+    image, scale = resize_for_vision(Image.new("RGB", (1001, 333)), 500)
+    assert image.size == (500, 166)
+    assert scale == (1001 / 500, 333 / 166)
+
+    image, scale = resize_for_vision(Image.new("RGB", (400, 300)), 500)
+    assert image.size == (400, 300)
+    assert scale == (1.0, 1.0)
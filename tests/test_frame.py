@@ -0,0 +1,49 @@
+import io
+import pytest
+from PIL import Image, ImageDraw
+from system.frame import Frame
+from system.regions import first_box
+
+
+def _screen():
+    image = Image.new("RGB", (1600, 900), (240, 240, 240))
+    ImageDraw.Draw(image).rectangle([1000, 500, 1099, 539], fill=(20, 20, 20))
+    return Frame(image, b"", "PNG")
+
+
+def _dark_box(image):
+    """Bounding box of the dark pixels, in the image's own pixels."""
+    return list(image.convert("L").point(lambda value: 255 if value < 128 else 0).getbbox())
+
+
+def test_full_frame_maps_to_itself():
+    frame = _screen()
+    assert frame.to_screen([10, 20, 30, 40]) == [10, 20, 30, 40]
+    assert frame.to_screen([[10, 20, 30, 40], [0, 0, 5, 5]]) == [[10, 20, 30, 40], [0, 0, 5, 5]]
+
+
+def test_crop_maps_back_to_screen_pixels():
+    crop = _screen().crop([900, 450, 1300, 650])
+    assert crop.origin == (900, 450)
+    assert crop.bounds == (900, 450, 1300, 650)
+    assert crop.to_screen(_dark_box(crop.image)) == [1000, 500, 1100, 540]
+
+
+@pytest.mark.parametrize("box, max_dimension", [
+    (None, 800),
+    ([900, 450, 1300, 650], 100),
+    ([901, 451, 1234, 677], 97),
+])
+def test_downscaled_crop_round_trips(box, max_dimension):
+    crop = _screen().crop(box, max_dimension=max_dimension)
+    encoded = Image.open(io.BytesIO(crop.data))
+    assert max(encoded.size) == max_dimension
+
+    # A box in the uploaded image's pixels lands on the same spot of the screen
+    found = crop.to_screen(_dark_box(encoded))
+    for actual, expected in zip(found, [1000, 500, 1100, 540]):
+        assert abs(actual - expected) <= max(crop.scale) + 1
+
+    # Each axis keeps its own scale, so the far corner maps onto the crop's corner
+    width, height = encoded.size
+    assert crop.to_screen([0, 0, width, height]) == list(crop.bounds)
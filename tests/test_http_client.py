@@ -0,0 +1,22 @@
+import asyncio
+from utils.http_client import close_client, get_client, open_client
+
+
+def test_client_is_shared_within_a_loop():
+    async def run():
+        client = open_client()
+        assert get_client() is client
+        await close_client()
+        assert client.is_closed
+
+    asyncio.run(run())
+
+
+def test_each_loop_gets_its_own_client():
+    async def current():
+        return get_client()
+
+    first = asyncio.run(current())
+    second = asyncio.run(current())
+    assert first is not second
+    assert not second.is_closed
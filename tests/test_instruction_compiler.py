@@ -0,0 +1,65 @@
+from executor.instruction_compiler import compile_instruction
+
+INPUT_BOX = {"coordinates": [[10, 10, 20, 20]]}
+SEND_BUTTON = {"coordinates": [[100, 50, 140, 70]]}
+
+
+def test_click_and_type():
+    commands = compile_instruction("click on the input box and type 'abc'", elements={"the input box": INPUT_BOX})
+    assert commands == ["mouse_left_click(15, 15)", "keyboard_type('abc')"]
+
+
+def test_chinese_type_into_target():
+    commands = compile_instruction("帮我在输入框中输入'你好'.", elements={"输入框": INPUT_BOX})
+    assert commands == ["mouse_left_click(15, 15)", "keyboard_type('你好')"]
+
+
+def test_apostrophe_is_left_to_the_model():
+    elements = {"the user's profile": INPUT_BOX}
+    assert compile_instruction("click on the user's profile and type 'abc'", elements=elements) is None
+
+
+def test_unbalanced_quote_is_left_to_the_model():
+    assert compile_instruction("type 'abc", elements={"the input box": INPUT_BOX}) is None
+    assert compile_instruction('type "abc', elements={"the input box": INPUT_BOX}) is None
+
+
+def test_quoted_text_outside_type_or_press_is_left_to_the_model():
+    elements = {"the input box": INPUT_BOX}
+    assert compile_instruction("click 'OK'", elements=elements) is None
+    assert compile_instruction("press 'ctrl+c' 'x'", elements=elements) is None
+
+
+def test_quoted_hotkey():
+    assert compile_instruction("press 'ctrl+c'") == ["keyboard_hotkey('ctrl', 'c')"]
+
+
+def test_click_target_must_match_the_only_element():
+    assert compile_instruction("click the submit button", elements={"input box": INPUT_BOX}) is None
+
+
+def test_bare_click_is_left_to_the_model():
+    assert compile_instruction("click", elements={"input box": INPUT_BOX}) is None
+
+
+def test_click_without_element_names_is_left_to_the_model():
+    assert compile_instruction("click the input box") is None
+
+
+def test_click_picks_the_matching_element():
+    elements = {"the input box": INPUT_BOX, "the send button": SEND_BUTTON}
+    assert compile_instruction("click the send button", elements=elements) == ["mouse_left_click(120, 60)"]
+
+
+def test_ambiguous_target_is_left_to_the_model():
+    elements = {"left input box": INPUT_BOX, "right input box": SEND_BUTTON}
+    assert compile_instruction("click the input box", elements=elements) is None
+
+
+def test_press_wait_and_hotkey():
+    assert compile_instruction("press enter then wait 2 seconds") == ["keyboard_press('enter')", "wait(2)"]
+    assert compile_instruction("按回车键") == ["keyboard_press('enter')"]
+
+
+def test_unknown_instruction_is_left_to_the_model():
+    assert compile_instruction("scroll down to the footer") is None
@@ -0,0 +1,108 @@
+import logging
+import pytest
+import config
+from executor.command_compiler import compile_commands
+from executor.optimizer import PeepholeOptimizer, optimize
+
+
+@pytest.fixture(autouse=True)
+def settle_defaults(monkeypatch):
+    monkeypatch.setattr(config, "OPTIMIZER_WAIT_MODE", "keep")
+    monkeypatch.setattr(config, "SETTLE_TIMEOUT", 5.0)
+    monkeypatch.setattr(config, "SETTLE_STABLE_MS", 200.0)
+
+
+def _optimized(commands, **kwargs):
+    return optimize(compile_commands(commands), **kwargs)
+
+
+@pytest.mark.parametrize("commands, expected", [
+    # Consecutive moves: only the last one matters
+    (["mouse_move(1, 2)", "mouse_move(3, 4)"], ["mouse_move(3, 4)"]),
+    # A move followed by a click without a position becomes a positioned click
+    (["mouse_move(10, 20)", "mouse_left_click()"], ["mouse_left_click(10, 20)"]),
+    (["mouse_move(10, 20)", "mouse_double_click()"], ["mouse_double_click(10, 20)"]),
+    # A positioned click moves the cursor itself
+    (["mouse_move(10, 20)", "mouse_right_click(30, 40)"], ["mouse_right_click(30, 40)"]),
+    # Adjacent typing with the same mode is one call
+    (["keyboard_type('ab')", "keyboard_type('cd')"], ["keyboard_type('abcd')"]),
+    (["keyboard_type('ab', mode='paste')", "keyboard_type('cd', mode='paste')"],
+     ["keyboard_type('abcd', mode='paste')"]),
+    (["wait(0.5)", "wait(1)"], ["wait(1.5)"]),
+    (["wait_stable(timeout=2)", "wait_stable(stable_ms=500)"], ["wait_stable(5.0, 500)"]),
+])
+def test_rewrite_rules(commands, expected):
+    assert _optimized(commands) == compile_commands(expected)
+
+
+@pytest.mark.parametrize("commands", [
+    # A wait between a move and a click, e.g. for a hover menu, stays
+    ["mouse_move(10, 20)", "wait(0.5)", "mouse_left_click()"],
+    ["keyboard_type('ab')", "keyboard_type('cd', mode='paste')"],
+    ["keyboard_type('ab')", "keyboard_press('enter')", "keyboard_type('cd')"],
+    ["mouse_left_click(10, 20)", "mouse_left_click(10, 20)"],
+])
+def test_sequences_that_must_not_change(commands):
+    assert _optimized(commands) == compile_commands(commands)
+
+
+def test_move_to_current_cursor_is_dropped():
+    assert _optimized(["mouse_move(5, 5)", "keyboard_press('enter')"], cursor=(5, 5)) == \
+        compile_commands(["keyboard_press('enter')"])
+    # The cursor is tracked through clicks too
+    assert _optimized(["mouse_left_click(7, 8)", "mouse_move(7, 8)"]) == \
+        compile_commands(["mouse_left_click(7, 8)"])
+
+
+def test_stable_wait_mode_turns_waits_into_settle_waits():
+    assert _optimized(["mouse_left_click(1, 1)", "wait(1)", "wait(0.5)"], wait_mode="stable") == \
+        compile_commands(["mouse_left_click(1, 1)", "wait_stable(1.5)"])
+    assert _optimized(["wait(0)"], wait_mode="stable") == compile_commands(["wait(0)"])
+
+
+def test_wait_mode_defaults_to_config(monkeypatch):
+    monkeypatch.setattr(config, "OPTIMIZER_WAIT_MODE", "stable")
+    assert _optimized(["wait(2)"]) == compile_commands(["wait_stable(2)"])
+
+
+SEQUENCES = [
+    ["mouse_move(10, 20)", "mouse_move(30, 40)", "mouse_left_click()", "keyboard_type('he')",
+     "keyboard_type('llo')", "keyboard_press('enter')", "wait(0.5)", "wait(0.5)"],
+    ["mouse_move(1, 1)", "wait(0.2)", "mouse_left_click()", "wait_stable()", "wait_stable(timeout=3)",
+     "keyboard_hotkey('ctrl', 'a')", "keyboard_type('x')"],
+]
+
+
+@pytest.mark.parametrize("commands", SEQUENCES)
+@pytest.mark.parametrize("wait_mode", ["keep", "stable"])
+def test_streamed_matches_batch(commands, wait_mode):
+    instructions = compile_commands(commands)
+    optimizer = PeepholeOptimizer(wait_mode)
+    streamed = []
+    for instruction in instructions:
+        streamed.extend(optimizer.feed(instruction))
+    streamed.extend(optimizer.flush())
+    assert streamed == optimize(instructions, wait_mode=wait_mode)
+
+
+def test_streamed_instructions_are_released_as_soon_as_they_cannot_merge():
+    optimizer = PeepholeOptimizer("keep")
+    move, click, press = compile_commands(["mouse_move(1, 2)", "mouse_left_click()", "keyboard_press('a')"])
+    assert optimizer.feed(move) == []
+    # The fused click is only known once the next instruction cannot merge with it
+    assert optimizer.feed(click) == []
+    assert optimizer.feed(press) == compile_commands(["mouse_left_click(1, 2)", "keyboard_press('a')"])
+    assert optimizer.flush() == []
+
+
+def test_streamed_and_batch_log_the_same_summary(caplog):
+    instructions = compile_commands(["mouse_move(1, 2)", "mouse_left_click()", "wait(0.1)", "wait(0.2)"])
+    with caplog.at_level(logging.INFO, logger="executor.optimizer"):
+        optimize(instructions, wait_mode="keep")
+        optimizer = PeepholeOptimizer("keep")
+        for instruction in instructions:
+            optimizer.feed(instruction)
+        optimizer.flush()
+    batch, streamed = [record for record in caplog.records if record.levelno == logging.INFO]
+    assert batch.getMessage() == streamed.getMessage()
+    assert batch.getMessage().startswith("Optimized 4 commands into 2:")
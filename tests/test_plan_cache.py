@@ -0,0 +1,59 @@
+import asyncio
+import os
+import pytest
+import config
+from agents.main_agent import MainAgent
+from system.plan_cache import PlanCache
+from system.state_manager import StateManager
+
+PLAN = [{"type": "screenshot", "description": "shot"}]
+
+
+@pytest.fixture
+def plan_cache(fresh, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PLAN_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "PLAN_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "PLAN_CACHE_MEMORY_MAX_ENTRIES", 1000)
+    monkeypatch.setattr(config, "PLAN_CACHE_DISK_MAX_ENTRIES", 10)
+    return fresh(PlanCache)
+
+
+def test_key_keeps_case_spacing_and_punctuation():
+    key = PlanCache.make_key
+    assert key("type 'ABC'", "m", "1") != key("type 'abc'", "m", "1")
+    assert key("type 'a  b'", "m", "1") != key("type 'a b'", "m", "1")
+    assert key("type 'hi!'", "m", "1") != key("type 'hi'", "m", "1")
+    assert key(" type 'abc'\n", "m", "1") == key("type 'abc'", "m", "1")
+
+
+def test_disk_is_trimmed_below_limit_in_batches(plan_cache, tmp_path):
+    for idx in range(10):
+        plan_cache.put(f"intent {idx}", "m", "1", PLAN)
+    assert len(os.listdir(tmp_path)) == 10
+
+    # Going over the limit evicts a tenth of it more, so the next store does not scan again
+    plan_cache.put("intent 10", "m", "1", PLAN)
+    assert len(os.listdir(tmp_path)) == 9
+    assert plan_cache.stats()["disk_entries"] == 9
+    plan_cache.put("intent 11", "m", "1", PLAN)
+    assert plan_cache.stats()["disk_entries"] == 10
+
+
+def test_failed_cached_plan_is_invalidated(plan_cache, monkeypatch):
+    monkeypatch.setattr(config, "TRACE_CACHE_ENABLED", False)
+    agent = MainAgent.__new__(MainAgent)
+    agent.model_name = "m"
+    agent.planning_mode = "standard"
+    agent.plan_cache = plan_cache
+    agent.state_manager = StateManager()
+    agent.trace_cache = type("NoTraces", (), {"get": lambda self, intent: None})()
+    agent.state_manager.register_task("plan-cache-test", "session")
+    plan_cache.put("open the menu", "m", agent._plan_version(), PLAN)
+
+    async def fail(task_id, plan, start=0):
+        raise RuntimeError("step failed")
+
+    agent._run_plan = fail
+    asyncio.run(agent.process_intent("open the menu", "plan-cache-test", "session", stream=False))
+    assert agent.plan_source == "cache"
+    assert plan_cache.get("open the menu", "m", agent._plan_version()) is None
@@ -0,0 +1,148 @@
+import asyncio
+import pytest
+from PIL import Image
+from agents.main_agent import MainAgent
+from executor.plan_graph import CAPTURE, EXECUTE, GENERATE, LOCATE, PlanGraph
+from system.frame import Frame
+
+SCREENSHOT = {"type": "screenshot", "description": "shot"}
+VISION = {"type": "vision_analysis", "description": "find", "prompt": "the button"}
+OPERATION = {"type": "operation", "description": "click", "instruction": "click the button"}
+
+
+def test_dependencies_of_a_two_round_plan():
+    graph = PlanGraph([SCREENSHOT, VISION, OPERATION, SCREENSHOT, VISION, OPERATION])
+    assert graph.deps == {
+        (0, CAPTURE): set(),
+        (1, LOCATE): {(0, CAPTURE)},
+        (2, GENERATE): {(1, LOCATE)},
+        (2, EXECUTE): {(2, GENERATE), (0, CAPTURE)},
+        (3, CAPTURE): {(2, EXECUTE)},
+        (4, LOCATE): {(3, CAPTURE), (1, LOCATE)},
+        (5, GENERATE): {(4, LOCATE)},
+        (5, EXECUTE): {(5, GENERATE), (3, CAPTURE)},
+    }
+    assert graph.frame_steps == {0: 0, 1: 0, 2: 0, 3: 3, 4: 3, 5: 3}
+    assert graph.element_steps == {2: 1, 5: 4}
+
+
+def test_generation_does_not_wait_for_earlier_input():
+    graph = PlanGraph([SCREENSHOT, VISION, OPERATION, OPERATION])
+    # The second operation's commands can be generated while the first one's input runs
+    assert graph.deps[(3, GENERATE)] == {(1, LOCATE)}
+    assert graph.deps[(3, EXECUTE)] == {(3, GENERATE), (2, EXECUTE)}
+
+
+def test_vision_step_without_screenshot_keeps_desktop_order():
+    graph = PlanGraph([OPERATION, VISION, OPERATION])
+    assert graph.deps[(1, LOCATE)] == {(0, EXECUTE)}
+    assert graph.deps[(2, EXECUTE)] == {(2, GENERATE), (1, LOCATE)}
+    assert graph.frame_steps == {0: None, 1: None, 2: None}
+    assert graph.element_steps == {0: None, 2: 1}
+
+
+def test_start_skips_earlier_steps():
+    graph = PlanGraph([SCREENSHOT, VISION, OPERATION, SCREENSHOT, VISION], start=3)
+    assert set(graph.deps) == {(3, CAPTURE), (4, LOCATE)}
+    assert graph.deps[(4, LOCATE)] == {(3, CAPTURE)}
+
+
+def test_next_operation():
+    graph = PlanGraph([SCREENSHOT, OPERATION, VISION, OPERATION])
+    assert graph.next_operation(1) == 3
+    assert graph.next_operation(3) is None
+
+
+def test_run_waits_for_dependencies():
+    graph = PlanGraph([SCREENSHOT, VISION, OPERATION])
+    finished = []
+
+    async def handler(node):
+        # Later nodes finish faster, so only the dependencies keep them in order
+        await asyncio.sleep(0.01 * (3 - node[0]))
+        finished.append(node)
+        return node[1]
+
+    results = asyncio.run(graph.run(handler))
+    assert finished == [(0, CAPTURE), (1, LOCATE), (2, GENERATE), (2, EXECUTE)]
+    assert results[(2, EXECUTE)] == EXECUTE
+
+
+def test_run_cancels_remaining_nodes_on_failure():
+    graph = PlanGraph([SCREENSHOT, VISION, OPERATION])
+    started = []
+
+    async def handler(node):
+        started.append(node)
+        if node == (1, LOCATE):
+            raise RuntimeError("not found")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(graph.run(handler))
+    assert started == [(0, CAPTURE), (1, LOCATE)]
+
+
+class SlowExecutor:
+    def __init__(self, log):
+        self.log = log
+
+    async def execute_async(self, instruction):
+        self.log.append(instruction)
+        await asyncio.sleep(0.01)
+
+
+def test_concurrent_tasks_do_not_interleave_input():
+    log = []
+    agents = []
+    for _ in range(2):
+        agent = MainAgent.__new__(MainAgent)
+        agent.command_executor = SlowExecutor(log)
+        agents.append(agent)
+
+    async def run():
+        await asyncio.gather(agents[0]._perform(["a1", "a2", "a3"]), agents[1]._perform(["b1", "b2"]))
+
+    asyncio.run(run())
+    assert log == ["a1", "a2", "a3", "b1", "b2"]
+
+
+class TaskData:
+    def __init__(self):
+        self.data = {}
+
+    def get_task_data(self, task_id, key):
+        return self.data.get(key)
+
+    def set_task_data(self, task_id, key, value):
+        self.data[key] = value
+
+
+class BatchVision:
+    def __init__(self):
+        self.requests = []
+
+    async def analyze_elements(self, frame, prompts):
+        self.requests.append(list(prompts))
+        return {prompt: {"element_type": "ui_element", "coordinates": [[i * 10, 0, i * 10 + 5, 5]]}
+                for i, prompt in enumerate(prompts)}
+
+
+def test_vision_steps_on_one_frame_share_one_request():
+    plan = [SCREENSHOT, VISION, dict(VISION, prompt="the field"), OPERATION]
+    graph = PlanGraph(plan)
+    # The second vision step waits for the first, which looks for both elements
+    assert (1, LOCATE) in graph.deps[(2, LOCATE)]
+
+    agent = MainAgent.__new__(MainAgent)
+    agent.state_manager = TaskData()
+    agent.vision_agent = BatchVision()
+    agent.element_library = type("NoLibrary", (), {"enabled": False})()
+    agent.trace_cache = type("NoTraces", (), {"enabled": False})()
+    frame = Frame(Image.new("RGB", (100, 100)), b"", "PNG")
+
+    async def run():
+        for step_idx in (1, 2):
+            await agent._locate("t", plan[step_idx], frame, MainAgent._frame_prompts(plan, step_idx))
+
+    asyncio.run(run())
+    assert agent.vision_agent.requests == [["the button", "the field"]]
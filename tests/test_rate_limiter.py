@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+import utils.rate_limiter as rate_limiter
+from utils.rate_limiter import ModelLimiter, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_wait_times(clock):
+    bucket = TokenBucket(60)  # One per second
+    assert bucket.wait_time(60) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1)
+    assert bucket.wait_time(10) == pytest.approx(10)
+    clock.now += 4
+    assert bucket.wait_time(10) == pytest.approx(6)
+    # Requests larger than the bucket only wait until it is full
+    assert bucket.wait_time(1000) == pytest.approx(56)
+    clock.now += 1000
+    assert bucket.wait_time(60) == 0
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket(0)
+    bucket.take(10 ** 9)
+    assert bucket.wait_time(10 ** 9) == 0
+
+
+async def _hold(limiter, order, name, priority, release):
+    rate_limiter.set_task_priority(priority)
+    async with limiter.slot():
+        order.append(name)
+        await release.wait()
+
+
+def test_waiters_are_admitted_by_priority():
+    async def run():
+        limiter = ModelLimiter("m", 1, 0, 0)
+        order = []
+        release = asyncio.Event()
+        first = asyncio.ensure_future(_hold(limiter, order, "first", 0, release))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(_hold(limiter, order, name, priority, release))
+                   for name, priority in [("late", 3), ("early", 1), ("middle", 2)]]
+        await asyncio.sleep(0)
+        assert limiter.stats()["queue_depth"] == 3
+        release.set()
+        await asyncio.gather(first, *waiters)
+        return order
+
+    assert asyncio.run(run()) == ["first", "early", "middle", "late"]
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def run():
+        limiter = ModelLimiter("m", 1, 0, 0)
+        order = []
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(_hold(limiter, order, "holder", 0, release))
+        await asyncio.sleep(0)
+        waiting = asyncio.ensure_future(_hold(limiter, order, "waiting", 1, release))
+        cancelled = asyncio.ensure_future(_hold(limiter, order, "cancelled", 2, release))
+        await asyncio.sleep(0)
+        assert limiter.stats()["queue_depth"] == 2
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        # The cancelled entry stays in the heap behind the live one, but is not counted
+        assert len(limiter.queue) == 2
+        assert limiter.stats()["queue_depth"] == 1
+        assert limiter.saturated
+
+        waiting.cancel()
+        await asyncio.sleep(0)
+        assert not limiter.saturated
+        assert limiter.stats()["cancelled"] == 2
+
+        release.set()
+        await holder
+        return limiter, order
+
+    limiter, order = asyncio.run(run())
+    assert order == ["holder"]
+    assert limiter.in_flight == 0
+    assert limiter.queue == []
+
+
+def test_request_budget_paces_admissions():
+    async def run():
+        limiter = ModelLimiter("m", 0, 600, 0)  # Ten per second, burst of 600
+        limiter.requests.level = 0
+        loop = asyncio.get_running_loop()
+        admitted = []
+
+        async def request():
+            async with limiter.slot():
+                admitted.append(loop.time())
+
+        start = loop.time()
+        await asyncio.gather(*(request() for _ in range(3)))
+        return [round(at - start, 2) for at in admitted]
+
+    waits = asyncio.run(run())
+    assert waits[0] == pytest.approx(0.1, abs=0.05)
+    assert waits[2] == pytest.approx(0.3, abs=0.05)
+
+
+def test_token_budget_holds_back_large_requests():
+    async def run():
+        limiter = ModelLimiter("m", 0, 0, 6000)  # 100 tokens per second
+        limiter.tokens.level = 0
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        async with limiter.slot(tokens=20):
+            return loop.time() - start
+
+    assert asyncio.run(run()) == pytest.approx(0.2, abs=0.05)
+
+
+def test_only_cancelled_entries_do_not_saturate():
+    limiter = ModelLimiter("m", 1, 0, 0)
+    limiter.queue = [[0, 0, 0, None], [1, 1, 0, None]]
+    assert not limiter.saturated
+    assert limiter.stats()["queue_depth"] == 0
@@ -0,0 +1,116 @@
+import asyncio
+import httpx
+import pytest
+import config
+import utils.request_policy as request_policy
+from utils.request_policy import LatencyHistogram, _retry_delay, call_with_policy
+
+
+@pytest.fixture(autouse=True)
+def policy(monkeypatch):
+    monkeypatch.setattr(request_policy, "_stats", {})
+    monkeypatch.setattr(config, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(config, "HEDGE_PERCENTILE", 95)
+    monkeypatch.setattr(config, "HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(config, "HEDGE_MAX_REQUESTS", 2)
+    monkeypatch.setattr(config, "RETRY_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(config, "RETRY_BACKOFF_BASE", 0.5)
+    monkeypatch.setattr(config, "RETRY_BACKOFF_MAX", 8)
+    monkeypatch.setattr(config, "LLM_DEADLINES", {"default": 5})
+
+
+def _seed(call_type, seconds, count=5):
+    histogram = request_policy._get_stats(call_type).histogram
+    for _ in range(count):
+        histogram.observe(seconds)
+    return histogram
+
+
+def test_histogram_percentile_is_bucket_upper_bound():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None
+    for seconds in [0.01] * 90 + [1.0] * 10:
+        histogram.observe(seconds)
+    assert histogram.percentile(50) == LatencyHistogram.BOUNDS[0]
+    p99 = histogram.percentile(99)
+    assert 1.0 <= p99 < 1.25
+
+
+def test_histogram_clamps_samples_beyond_last_bucket():
+    histogram = LatencyHistogram()
+    histogram.observe(1000)
+    assert histogram.percentile(50) == LatencyHistogram.BOUNDS[-1]
+
+
+def _status_error(status, headers=None):
+    request = httpx.Request("POST", "http://model")
+    return httpx.HTTPStatusError("error", request=request,
+                                 response=httpx.Response(status, headers=headers, request=request))
+
+
+def test_retry_delay_backs_off_exponentially_up_to_max(monkeypatch):
+    monkeypatch.setattr(request_policy.random, "uniform", lambda low, high: high)
+    error = httpx.ConnectError("down")
+    assert [_retry_delay(attempt, error) for attempt in range(6)] == [0.5, 1, 2, 4, 8, 8]
+
+
+def test_retry_delay_honours_retry_after_within_max(monkeypatch):
+    monkeypatch.setattr(request_policy.random, "uniform", lambda low, high: low)
+    assert _retry_delay(0, _status_error(429, {"retry-after": "3"})) == 3
+    assert _retry_delay(0, _status_error(429, {"retry-after": "60"})) == 8
+    assert _retry_delay(0, _status_error(429, {"retry-after": "soon"})) == 0.25
+
+
+def test_retries_server_errors_then_succeeds(monkeypatch):
+    monkeypatch.setattr(request_policy, "_retry_delay", lambda attempt, error: 0)
+    responses = [_status_error(503), _status_error(502), "ok"]
+
+    async def send():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert asyncio.run(call_with_policy("default", send)) == "ok"
+    assert request_policy.latency_stats()["default"]["retries"] == 2
+
+
+def test_client_errors_are_not_retried():
+    async def send():
+        raise _status_error(400)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(call_with_policy("default", send))
+    assert request_policy.latency_stats()["default"]["retries"] == 0
+
+
+def test_slow_primary_is_hedged_and_hedge_wins():
+    _seed("default", 0.01)
+    delays = [1.0, 0.0]
+
+    async def send():
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return delay
+
+    assert asyncio.run(call_with_policy("default", send)) == 0.0
+    stats = request_policy.latency_stats()["default"]
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+
+
+def test_cancelled_hedge_does_not_lower_threshold():
+    histogram = _seed("default", 0.01)
+    delays = [0.2, 1.0]
+
+    async def send():
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return delay
+
+    assert asyncio.run(call_with_policy("default", send)) == 0.2
+    stats = request_policy.latency_stats()["default"]
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 0
+    # The primary's sample is recorded, the hedge cancelled after a few milliseconds is not
+    assert histogram.count == 6
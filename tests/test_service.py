@@ -0,0 +1,99 @@
+import asyncio
+import json
+import re
+import time
+import httpx
+import pytest
+import config
+import agents.base_agent as base_agent
+import service.routes as routes
+import system.backend as backend_module
+import utils.rate_limiter as rate_limiter
+import utils.request_policy as request_policy
+from service.server import create_app
+from system.backend import NullBackend
+from system.element_library import ElementLibrary
+from system.plan_cache import PlanCache
+from system.trace_cache import TraceCache
+from system.vision_cache import VisionCache
+
+# Model calls take this long, so the task runs long enough to sample /status
+MODEL_DELAY = 0.15
+# /status must answer this fast while the task runs; a blocked event loop takes far longer
+STATUS_P95_MS = 25
+
+PLAN = [
+    {"type": "screenshot", "description": "shot"},
+    {"type": "vision_analysis", "description": "find", "prompt": "the input box"},
+    {"type": "operation", "description": "type", "instruction": "fill the input box with a greeting"},
+    {"type": "screenshot", "description": "shot"},
+    {"type": "vision_analysis", "description": "find", "prompt": "the send button"},
+    {"type": "operation", "description": "send", "instruction": "press 'enter'"},
+]
+
+
+def _content(payload):
+    messages = payload["messages"]
+    if payload["model"] == config.VISION_AGENT_MODEL:
+        prompts = re.findall(r"<\|ref\|>(.*?)<\|/ref\|>", messages[0]["content"][0]["text"])
+        return "".join(f"<|ref|>{prompt}<|/ref|><|det|>[[100, 200, 300, 240]]<|/det|>" for prompt in prompts)
+    if "planner" in messages[0]["content"]:
+        return json.dumps(PLAN)
+    return json.dumps(["mouse_left_click(200, 220)", "keyboard_type('hello')"])
+
+
+@pytest.fixture
+def service(fresh, monkeypatch, tmp_path):
+    """The app with a null desktop, a slow fake model and caches kept out of the tree."""
+    backend = NullBackend(screen_size=(800, 600))
+    monkeypatch.setattr(backend_module, "_backend", backend)
+    for name in ("PLAN_CACHE", "TRACE_CACHE", "ELEMENT_LIBRARY"):
+        monkeypatch.setattr(config, f"{name}_ENABLED", False)
+        monkeypatch.setattr(config, f"{name}_DIR", str(tmp_path / name.lower()))
+    for cls in (PlanCache, TraceCache, ElementLibrary, VisionCache):
+        monkeypatch.setattr(cls, "_instance", fresh(cls))
+    monkeypatch.setattr(config, "EXECUTOR_DELAY_MODE", "fixed")
+    monkeypatch.setattr(config, "EXECUTOR_DELAY", 0.01)
+    monkeypatch.setattr(config, "STREAM_RESPONSES", False)
+    monkeypatch.setattr(config, "HEDGE_ENABLED", False)
+    monkeypatch.setattr(request_policy, "_stats", {})
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+
+    async def model(request):
+        await asyncio.sleep(MODEL_DELAY)
+        return httpx.Response(200, json={"choices": [{"message": {"content": _content(json.loads(request.content))}}]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(model))
+    monkeypatch.setattr(base_agent, "get_client", lambda: client)
+    return backend
+
+
+def test_status_stays_fast_while_a_task_runs(service):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app()),
+                                     base_url="http://service") as client:
+            known = set(routes.state_manager.tasks)
+            # The in-process transport only returns once the background task is done
+            automate = asyncio.ensure_future(client.post("/automate", json={"intent": "send a greeting"}))
+            while not set(routes.state_manager.tasks) - known:
+                await asyncio.sleep(0.001)
+            task_id = (set(routes.state_manager.tasks) - known).pop()
+
+            latencies = []
+            while not automate.done():
+                start = time.perf_counter()
+                response = await client.get(f"/status/{task_id}")
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200
+                await asyncio.sleep(0.01)
+            await automate
+            return latencies, (await client.get(f"/status/{task_id}")).json()["status"]
+
+    latencies, status = asyncio.run(run())
+    assert status == "completed"
+    assert len(latencies) >= 20
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    assert p95 < STATUS_P95_MS, f"/status p95 was {p95:.1f}ms"
+    # The fake desktop received the task's input
+    assert any(event[1] == "type_text" for event in service.events)
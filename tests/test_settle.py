@@ -0,0 +1,51 @@
+import time
+import system.backend as backend_module
+from system.backend import NullBackend
+from system.settle import wait_until_stable
+
+
+class MovingBackend(NullBackend):
+    """Moves the cursor on every capture, for the first `moves` captures (forever if None)."""
+
+    def __init__(self, moves=None):
+        super().__init__(screen_size=(320, 240))
+        self.moves = moves
+        self.captures = 0
+
+    def screenshot(self, region=None):
+        self.captures += 1
+        if self.moves is None or self.captures <= self.moves:
+            x, y = self.cursor
+            self.cursor = ((x + 40) % 280, y)
+        return super().screenshot(region)
+
+
+def _use(monkeypatch, backend):
+    monkeypatch.setattr(backend_module, "_backend", backend)
+    return backend
+
+
+def test_still_screen_settles_after_the_stable_time(monkeypatch):
+    _use(monkeypatch, NullBackend(screen_size=(320, 240)))
+    start = time.monotonic()
+    assert wait_until_stable(stable_ms=50, timeout=2, interval=0.01)
+    assert 0.05 <= time.monotonic() - start < 1
+
+
+def test_screen_settles_once_it_stops_changing(monkeypatch):
+    backend = _use(monkeypatch, MovingBackend(moves=5))
+    assert wait_until_stable(stable_ms=50, timeout=2, interval=0.01)
+    assert backend.captures > 5
+
+
+def test_changing_screen_times_out(monkeypatch):
+    _use(monkeypatch, MovingBackend())
+    start = time.monotonic()
+    assert not wait_until_stable(stable_ms=50, timeout=0.2, interval=0.01)
+    assert 0.2 <= time.monotonic() - start < 1
+
+
+def test_changes_outside_the_region_are_ignored(monkeypatch):
+    # The cursor only moves across the middle of the screen, above the watched region
+    _use(monkeypatch, MovingBackend())
+    assert wait_until_stable(region=(0, 160, 320, 80), stable_ms=50, timeout=1, interval=0.01)
@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+from utils.single_flight import SingleFlight, payload_key
+
+
+@pytest.fixture
+def flights(fresh):
+    return fresh(SingleFlight)
+
+
+class Upstream:
+    def __init__(self, result=None, error=None, delay=0.05):
+        self.calls = 0
+        self.result = result if result is not None else {"choices": [{"text": "ok"}]}
+        self.error = error
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def test_payload_key_ignores_key_order():
+    assert payload_key("u", {"a": 1, "b": [1, 2]}) == payload_key("u", {"b": [1, 2], "a": 1})
+    assert payload_key("u", {"a": 1}) != payload_key("u", {"a": 2})
+
+
+def test_identical_calls_share_one_upstream_call(flights):
+    upstream = Upstream()
+
+    async def run():
+        return await asyncio.gather(*(flights.do("k", upstream) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert upstream.calls == 1
+    assert all(result == upstream.result for result in results)
+    assert flights.stats() == {"calls": 5, "shared": 4, "in_flight": 0}
+
+
+def test_every_caller_gets_its_own_copy(flights):
+    upstream = Upstream()
+
+    async def run():
+        return await asyncio.gather(*(flights.do("k", upstream) for _ in range(3)))
+
+    results = asyncio.run(run())
+    results[0]["choices"][0]["text"] = "changed"
+    assert results[1]["choices"][0]["text"] == "ok"
+    assert results[2]["choices"][0]["text"] == "ok"
+    assert upstream.result["choices"][0]["text"] == "ok"
+
+
+def test_failure_reaches_every_caller(flights):
+    upstream = Upstream(error=RuntimeError("upstream down"))
+
+    async def run():
+        return await asyncio.gather(*(flights.do("k", upstream) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert upstream.calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelled_originator_does_not_orphan_joiners(flights):
+    upstream = Upstream()
+
+    async def run():
+        originator = asyncio.ensure_future(flights.do("k", upstream))
+        await asyncio.sleep(0)
+        joiner = asyncio.ensure_future(flights.do("k", upstream))
+        await asyncio.sleep(0.01)
+        originator.cancel()
+        result = await joiner
+        with pytest.raises(asyncio.CancelledError):
+            await originator
+        return result
+
+    assert asyncio.run(run()) == upstream.result
+    assert upstream.calls == 1
+
+
+def test_call_is_cancelled_once_nobody_waits(flights):
+    upstream = Upstream(delay=10)
+
+    async def run():
+        callers = [asyncio.ensure_future(flights.do("k", upstream)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        flight = flights.flights["k"]
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flight
+
+    flight = asyncio.run(run())
+    assert flight.task.cancelled()
+    assert flights.stats()["in_flight"] == 0
@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+import config
+from agents.main_agent import MainAgent
+from executor.command_compiler import Instruction, Opcode, compile_commands
+from executor.plan_graph import PlanGraph
+from executor.speculation import SYMBOLIC_BOX_SIZE, rebase, symbolic_elements
+from system.element_store import ElementStore
+from system.regions import box_center, boxes_intersect, first_box
+
+
+def _element(box):
+    return {"element_type": "ui_element", "coordinates": [box]}
+
+
+def test_symbolic_boxes_are_distinct_and_sized():
+    names = [f"element {i}" for i in range(14)]
+    symbolic = symbolic_elements(names)
+    assert list(symbolic) == names
+    boxes = [first_box(data["coordinates"]) for data in symbolic.values()]
+    for i, box in enumerate(boxes):
+        assert (box[2] - box[0], box[3] - box[1]) == SYMBOLIC_BOX_SIZE
+        assert not any(boxes_intersect(box, other) for other in boxes[i + 1:])
+
+
+def test_rebase_maps_positions_proportionally():
+    symbolic = symbolic_elements(["search", "submit"])
+    sx1, sy1, sx2, sy2 = first_box(symbolic["submit"]["coordinates"])
+    elements = {"search": _element([0, 0, 10, 10]), "submit": _element([1000, 500, 1080, 524])}
+    program = [
+        Instruction(Opcode.MOUSE_LEFT_CLICK, ((sx1 + sx2) // 2, (sy1 + sy2) // 2)),
+        Instruction(Opcode.MOUSE_MOVE, (sx1, sy2), {"duration": 0.2}),
+        Instruction(Opcode.KEYBOARD_TYPE, ("hello",)),
+    ]
+    rebased = rebase(program, symbolic, elements)
+    assert rebased[0].args == (1040, 512)
+    assert rebased[1].args == (1000, 524)
+    assert rebased[1].kwargs == {"duration": 0.2}
+    assert rebased[2] is program[2]
+
+
+def test_rebase_rejects_positions_outside_located_elements():
+    symbolic = symbolic_elements(["search", "submit"])
+    x, y = box_center(first_box(symbolic["submit"]["coordinates"]))
+    # Not inside any stand-in box
+    assert rebase([Instruction(Opcode.MOUSE_LEFT_CLICK, (5, 5))], symbolic, {}) is None
+    # Inside the stand-in box of an element that was not located
+    click = [Instruction(Opcode.MOUSE_LEFT_CLICK, (x, y))]
+    assert rebase(click, symbolic, {"search": _element([0, 0, 10, 10])}) is None
+
+
+class TaskData:
+    def __init__(self, **data):
+        self.data = data
+
+    def get_task_data(self, task_id, key):
+        return self.data.get(key)
+
+
+class SymbolicOperations:
+    """Clicks the center of whatever box it is given for the element."""
+
+    async def generate_commands(self, instruction, element_data, elements):
+        x, y = box_center(first_box(element_data["coordinates"]))
+        return [f"mouse_left_click({x}, {y})"]
+
+
+PLAN = [
+    {"type": "screenshot", "description": "shot"},
+    {"type": "vision_analysis", "description": "find", "prompt": "search"},
+    {"type": "operation", "description": "click", "instruction": "click search"},
+    {"type": "screenshot", "description": "shot"},
+    {"type": "vision_analysis", "description": "find", "prompt": "submit"},
+    {"type": "operation", "description": "click", "instruction": "click submit"},
+]
+
+
+def _agent(monkeypatch, elements):
+    monkeypatch.setattr(config, "FRAME_DIFF_ENABLED", True)
+    monkeypatch.setattr(config, "OPTIMIZER_ENABLED", False)
+    agent = MainAgent.__new__(MainAgent)
+    agent.operation_agent = SymbolicOperations()
+    agent.state_manager = TaskData(elements=elements)
+    return agent
+
+
+def _store(**boxes):
+    store = ElementStore()
+    for name, box in boxes.items():
+        store.add(name, _element(box))
+    return store
+
+
+def _speculate_and_adopt(agent, located):
+    async def run():
+        speculation = asyncio.ensure_future(agent._speculate("t", PlanGraph(PLAN), 5))
+        await asyncio.sleep(0)
+        agent.state_manager.data["elements"] = located
+        return await agent._adopt_speculation("t", speculation, located.get("submit").data)
+
+    return asyncio.run(run())
+
+
+def test_speculation_is_rebased_onto_the_located_element(monkeypatch):
+    agent = _agent(monkeypatch, _store(search=[10, 10, 110, 40]))
+    located = _store(search=[12, 11, 112, 41], submit=[500, 600, 580, 630])
+    program = _speculate_and_adopt(agent, located)
+    assert [(instruction.op, instruction.args) for instruction in program] == [
+        (Opcode.MOUSE_LEFT_CLICK, (540, 615))
+    ]
+
+
+def test_speculation_is_discarded_when_a_seen_element_moved(monkeypatch):
+    agent = _agent(monkeypatch, _store(search=[10, 10, 110, 40]))
+    located = _store(search=[400, 300, 500, 330], submit=[500, 600, 580, 630])
+    assert _speculate_and_adopt(agent, located) is None
+
+
+def test_speculation_is_discarded_when_a_seen_element_is_gone(monkeypatch):
+    agent = _agent(monkeypatch, _store(search=[10, 10, 110, 40]))
+    located = _store(submit=[500, 600, 580, 630])
+    assert _speculate_and_adopt(agent, located) is None
+
+
+def test_commands_outside_the_stand_in_boxes_are_discarded(monkeypatch):
+    agent = _agent(monkeypatch, _store(search=[10, 10, 110, 40]))
+    located = _store(search=[10, 10, 110, 40], submit=[500, 600, 580, 630])
+
+    async def speculation():
+        return symbolic_elements(["search", "submit"]), "submit", {}, compile_commands(["mouse_left_click(5, 5)"])
+
+    async def run():
+        agent.state_manager.data["elements"] = located
+        return await agent._adopt_speculation("t", asyncio.ensure_future(speculation()),
+                                              located.get("submit").data)
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,76 @@
+import json
+import pytest
+from utils.streaming import JSONArrayStream
+
+PLAN = [
+    {"type": "operation", "description": "type a bracket", "instruction": "type ']' then '}'"},
+    {"type": "operation", "description": "quote", "commands": ["keyboard_type('say \"hi\" [ok]')"]},
+    {"type": "vision_analysis", "description": "nested", "prompt": "a {\"b\": [1, 2]} c\\\\"},
+    "scalar ] string",
+    42,
+    None,
+    [1, [2, {"x": "]"}]],
+]
+TEXT = "```json\n" + json.dumps(PLAN, ensure_ascii=False, indent=2) + "\n```"
+
+
+def _parse(chunks):
+    parser = JSONArrayStream()
+    elements = []
+    for chunk in chunks:
+        elements.extend(parser.feed(chunk))
+    return parser, elements
+
+
+def test_whole_text():
+    parser, elements = _parse([TEXT])
+    assert elements == PLAN
+    assert parser.started and parser.finished
+
+
+@pytest.mark.parametrize("split", range(1, len(TEXT)))
+def test_every_chunk_boundary(split):
+    # Covers boundaries inside strings, escapes, numbers and keywords
+    parser, elements = _parse([TEXT[:split], TEXT[split:]])
+    assert elements == PLAN
+    assert parser.finished
+
+
+def test_one_character_at_a_time():
+    parser, elements = _parse(TEXT)
+    assert elements == PLAN
+
+
+def test_elements_are_yielded_as_soon_as_they_close():
+    parser = JSONArrayStream()
+    assert parser.feed('[{"a": "x]"}, {"b"') == [{"a": "x]"}]
+    assert parser.feed(': 2}') == [{"b": 2}]
+    assert not parser.finished
+    assert parser.feed(', 3') == []
+    assert parser.feed(']') == [3]
+    assert parser.finished
+
+
+def test_text_around_array_is_ignored():
+    parser, elements = _parse(['Here is the plan:\n[1, ', '2] and some ', 'trailing [3]'])
+    assert elements == [1, 2]
+
+
+def test_unstarted_and_truncated_streams():
+    parser, elements = _parse(["no array here"])
+    assert elements == [] and not parser.started
+
+    parser, elements = _parse(['[{"a": 1}, {"b": "unterminated'])
+    assert elements == [{"a": 1}]
+    assert parser.started and not parser.finished
+
+
+@pytest.mark.parametrize("text", [
+    '[{"a": 1,}]',
+    '[{"a": tru}]',
+    "[{'a': 1}]",
+    '[1 2]',
+])
+def test_malformed_elements_raise(text):
+    with pytest.raises(json.JSONDecodeError):
+        _parse([text])
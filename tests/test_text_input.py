@@ -0,0 +1,42 @@
+import config
+import system.backend as backend_module
+from executor.text_input import choose_mode, enter_text
+from system.backend import ClipboardError, NullBackend
+
+
+def _backend(monkeypatch):
+    backend = NullBackend(screen_size=(200, 100))
+    monkeypatch.setattr(backend_module, "_backend", backend)
+    monkeypatch.setattr(config, "TEXT_PASTE_RESTORE_DELAY", 0)
+    return backend
+
+
+def test_paste_goes_through_backend_clipboard_and_restores_it(monkeypatch):
+    backend = _backend(monkeypatch)
+    backend.clipboard = "earlier"
+    pasted = []
+    backend.hotkey = lambda *keys: pasted.append(backend.clipboard)
+
+    enter_text("你好", mode="auto")
+    assert pasted == ["你好"]
+    assert backend.clipboard == "earlier"
+
+
+def test_unusable_clipboard_falls_back_to_typing(monkeypatch):
+    backend = _backend(monkeypatch)
+
+    def unavailable(*args):
+        raise ClipboardError("no clipboard")
+
+    backend.get_clipboard = unavailable
+    enter_text("x" * 100, mode="paste")
+    assert [event[1:] for event in backend.events] == [("type_text", ("x" * 100,))]
+
+
+def test_auto_mode_types_without_clipboard(monkeypatch):
+    backend = _backend(monkeypatch)
+    backend.clipboard_available = lambda: False
+    monkeypatch.setattr(config, "TEXT_INPUT_MODE", "auto")
+    monkeypatch.setattr(config, "TEXT_PASTE_THRESHOLD", 32)
+    assert choose_mode("x" * 100) == "type"
+    assert choose_mode("x" * 100, mode="paste") == "paste"
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import pytest
+import config
+import agents.main_agent as main_agent
+from agents.main_agent import MainAgent
+from system.state_manager import StateManager
+from system.trace_cache import TraceCache
+
+PLAN = [{"type": "screenshot", "description": "shot"}]
+RECORDS = [{}]
+
+
+@pytest.fixture
+def trace_cache(fresh, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TRACE_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "TRACE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "TRACE_STORE_TEXT", False)
+    return fresh(TraceCache)
+
+
+def test_key_keeps_case_and_inner_spacing():
+    assert TraceCache.make_key("type 'ABC'") != TraceCache.make_key("type 'abc'")
+    assert TraceCache.make_key("type 'a  b'") != TraceCache.make_key("type 'a b'")
+    assert TraceCache.make_key("  type 'abc' ") == TraceCache.make_key("type 'abc'")
+
+
+def test_trace_without_typed_text_is_written_to_disk(trace_cache, tmp_path):
+    trace_cache.put("press enter", PLAN, [{"commands": ["keyboard_press('enter')"]}])
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_typed_text_stays_in_memory_unless_opted_in(trace_cache, tmp_path, monkeypatch):
+    records = [{"commands": ["keyboard_type('secret')"]}]
+    trace_cache.put("type the password", PLAN, records)
+    assert os.listdir(tmp_path) == []
+    assert trace_cache.get("type the password")["records"] == records
+
+    monkeypatch.setattr(config, "TRACE_STORE_TEXT", True)
+    trace_cache.put("type the password", PLAN, records)
+    assert len(os.listdir(tmp_path)) == 1
+
+
+
+def test_trace_with_typed_text_replaces_the_one_on_disk(trace_cache, tmp_path):
+    trace_cache.put("log in", PLAN, [{"commands": ["keyboard_press('enter')"]}])
+    trace_cache.put("log in", PLAN, [{"commands": ["keyboard_type('secret')"]}])
+    assert os.listdir(tmp_path) == []
+    assert trace_cache.disk_count == 0
+
+    # A fresh process only sees what is on disk
+    trace_cache.memory.clear()
+    assert trace_cache.get("log in") is None
+
+
+def test_disk_is_trimmed_below_the_limit(trace_cache, tmp_path, monkeypatch):
+    trace_cache.max_entries = 10
+    listdir_calls = []
+    real_listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path: listdir_calls.append(path) or real_listdir(path))
+
+    for i in range(11):
+        trace_cache.put(f"task {i}", PLAN, RECORDS)
+    # Counted once on first write, then once more when the limit is exceeded
+    assert len(listdir_calls) == 2
+    assert trace_cache.disk_count == len(real_listdir(tmp_path)) == 9
+
+    trace_cache.invalidate("task 10")
+    assert trace_cache.disk_count == len(real_listdir(tmp_path)) == 8
+
+class RecordingExecutor:
+    def __init__(self):
+        self.executed = []
+
+    async def execute_async(self, instruction):
+        self.executed.append(repr(instruction))
+
+
+def _replay(trace_cache, plan, records, matches=True, monkeypatch=None):
+    agent = MainAgent.__new__(MainAgent)
+    agent.state_manager = StateManager()
+    agent.trace_cache = trace_cache
+    agent.command_executor = RecordingExecutor()
+    agent.state_manager.register_task("replay-test", "session")
+
+    async def screenshot():
+        return object()
+
+    monkeypatch.setattr(main_agent, "take_screenshot_async", screenshot)
+    monkeypatch.setattr(main_agent, "match_fingerprint", lambda frame, recorded: matches)
+    monkeypatch.setattr(config, "FRAME_DIFF_ENABLED", False)
+    monkeypatch.setattr(main_agent, "ElementStore", lambda frame: _Store())
+    replayed = asyncio.run(agent._replay_trace("replay-test", {"plan": plan, "records": records}))
+    return replayed, agent.command_executor.executed
+
+
+class _Store:
+    def __init__(self):
+        self.elements = {}
+
+    def add(self, name, data):
+        self.elements[name] = data
+
+    def __len__(self):
+        return len(self.elements)
+
+
+SCREENSHOT = {"type": "screenshot", "description": "shot"}
+VISION = {"type": "vision_analysis", "description": "find", "prompt": "the input box"}
+OPERATION = {"type": "operation", "description": "click", "instruction": "click the input box"}
+VISION_RECORD = {"element_data": {"coordinates": [[0, 0, 10, 10]]}, "fingerprint": {"box": [0, 0, 10, 10]}}
+
+
+def test_operation_without_vision_step_is_not_replayed(trace_cache, monkeypatch):
+    plan = [SCREENSHOT, OPERATION]
+    records = [{}, {"commands": ["keyboard_press('enter')"]}]
+    replayed, executed = _replay(trace_cache, plan, records, monkeypatch=monkeypatch)
+    assert len(replayed) == 1
+    assert executed == []
+
+
+def test_replay_stops_at_second_operation_on_unchecked_screen(trace_cache, monkeypatch):
+    plan = [SCREENSHOT, VISION, OPERATION, OPERATION]
+    records = [{}, VISION_RECORD, {"commands": ["mouse_left_click(5, 5)"]}, {"commands": ["keyboard_press('enter')"]}]
+    replayed, executed = _replay(trace_cache, plan, records, monkeypatch=monkeypatch)
+    assert len(replayed) == 3
+    assert executed == ["mouse_left_click(5, 5)"]
+
+
+def test_replay_stops_when_screen_does_not_match(trace_cache, monkeypatch):
+    plan = [SCREENSHOT, VISION, OPERATION]
+    records = [{}, VISION_RECORD, {"commands": ["mouse_left_click(5, 5)"]}]
+    replayed, executed = _replay(trace_cache, plan, records, matches=False, monkeypatch=monkeypatch)
+    assert len(replayed) == 1
+    assert executed == []
@@ -0,0 +1,61 @@
+import asyncio
+from PIL import Image
+import config
+from agents.vision_agent import VisionAgent
+from system.frame import Frame
+
+BOXES = {"the button": [100, 100, 150, 120], "the field": [300, 200, 400, 220]}
+
+
+class Grounding:
+    """Answers with fixed boxes in the pixels of whatever image it is sent, and logs its scale."""
+
+    def __init__(self):
+        self.requests = []
+
+    async def __call__(self, frame, prompts):
+        self.requests.append((frame.scale, list(prompts)))
+        if frame.origin != (0, 0):
+            # A fine crop: the element is near its top-left corner
+            return f"<|ref|>{prompts[0]}<|/ref|><|det|>[[10, 10, 60, 30]]<|/det|>"
+        return "".join(f"<|ref|>{prompt}<|/ref|><|det|>[{BOXES[prompt]}]<|/det|>" for prompt in prompts)
+
+
+def _agent(monkeypatch, localization):
+    monkeypatch.setattr(config, "VISION_LOCALIZATION", localization)
+    monkeypatch.setattr(config, "VISION_COARSE_DIMENSION", 1000)
+    monkeypatch.setattr(config, "VISION_FINE_MIN_SIZE", 256)
+    agent = VisionAgent.__new__(VisionAgent)
+    agent.model_name = "vision"
+    agent.vision_cache = type("NoCache", (), {"enabled": False})()
+    agent._ground = Grounding()
+    return agent
+
+
+def _frame():
+    return Frame(Image.new("RGB", (2000, 1200), (240, 240, 240)), b"", "PNG")
+
+
+def test_batched_prompts_are_refined_coarse_to_fine(monkeypatch):
+    agent = _agent(monkeypatch, "coarse_to_fine")
+    results = asyncio.run(agent.analyze_elements(_frame(), list(BOXES)))
+
+    coarse, *fine = agent._ground.requests
+    assert coarse == ((2.0, 2.0), list(BOXES))
+    assert sorted(prompts[0] for _, prompts in fine) == sorted(BOXES)
+    for prompt, result in results.items():
+        x1, y1 = result["region"][:2]
+        assert result["coordinates"] == [[x1 + 10, y1 + 10, x1 + 60, y1 + 30]]
+        # The crop is around the coarse box, scaled back to screen pixels
+        bx1, by1, bx2, by2 = (value * 2 for value in BOXES[prompt])
+        assert x1 <= bx1 and y1 <= by1
+        assert result["region"][2] >= bx2 and result["region"][3] >= by2
+
+
+def test_batched_prompts_use_full_frame_in_single_mode(monkeypatch):
+    agent = _agent(monkeypatch, "single")
+    results = asyncio.run(agent.analyze_elements(_frame(), list(BOXES)))
+
+    assert agent._ground.requests == [((1.0, 1.0), list(BOXES))]
+    assert results["the field"]["coordinates"] == [BOXES["the field"]]
+    assert results["the field"]["region"] == [0, 0, 2000, 1200]
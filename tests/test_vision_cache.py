@@ -0,0 +1,64 @@
+import pytest
+import config
+from system.vision_cache import VisionCache
+
+BUTTON = {"element_type": "button", "coordinates": [[10, 10, 50, 30]], "raw_response": "a button"}
+REGION = (0, 0, 800, 600)
+
+
+@pytest.fixture
+def cache(fresh, monkeypatch):
+    monkeypatch.setattr(config, "VISION_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "VISION_CACHE_TOLERANCE", 2)
+    return fresh(VisionCache)
+
+
+def test_similar_image_hits_and_different_image_misses(cache):
+    cache.put(0b1010, "ok button", "model", BUTTON, region=REGION)
+    assert cache.get(0b1011, "ok button", "model", region=REGION) == BUTTON
+    assert cache.get(0b0101, "ok button", "model", region=REGION) is None
+    assert cache.get(0b1010, "cancel button", "model", region=REGION) is None
+    assert cache.get(0b1010, "ok button", "other model", region=REGION) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+
+
+def test_hits_are_copies(cache):
+    cache.put(0, "ok button", "model", BUTTON)
+    cache.get(0, "ok button", "model")["coordinates"][0][0] = 999
+    assert cache.get(0, "ok button", "model") == BUTTON
+
+
+def test_entries_are_keyed_by_region(cache):
+    cache.put(0, "ok button", "model", BUTTON, region=REGION)
+    assert cache.get(0, "ok button", "model", region=(0, 0, 400, 300)) is None
+    assert cache.get(0, "ok button", "model") is None
+    assert cache.get(0, "ok button", "model", region=list(REGION)) == BUTTON
+
+
+def test_size_counts_the_raw_response_and_coordinates():
+    small = VisionCache._estimate_size(BUTTON)
+    assert VisionCache._estimate_size(dict(BUTTON, raw_response="x" * 10000)) > small + 9000
+    assert VisionCache._estimate_size(dict(BUTTON, coordinates=[[1, 2, 3, 4]] * 100)) > small + 1000
+
+
+def test_least_recently_used_entries_are_evicted_over_the_byte_cap(cache):
+    size = VisionCache._estimate_size(BUTTON)
+    cache.max_bytes = size * 2
+    cache.put(0, "first", "model", BUTTON)
+    cache.put(0, "second", "model", BUTTON)
+    assert cache.get(0, "first", "model") is not None
+    cache.put(0, "third", "model", BUTTON)
+
+    assert cache.get(0, "second", "model") is None
+    assert cache.get(0, "first", "model") is not None
+    assert cache.get(0, "third", "model") is not None
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, size * 2, 1)
+
+
+def test_invalidate_drops_everything(cache):
+    cache.put(0, "ok button", "model", BUTTON)
+    cache.invalidate()
+    assert cache.get(0, "ok button", "model") is None
+    assert cache.stats()["bytes"] == 0
@@ -1,3 +1,5 @@
+import functools
+import inspect
 import traceback
 from utils.logger import get_logger
 
@@ -22,18 +24,38 @@ class OperationError(AutomationError):
     """Exception raised for operation execution errors."""
     pass
 
+def _log_and_wrap(e):
+    """Log an exception and return the AutomationError to raise for it."""
+    if isinstance(e, AutomationError):
+        logger.error(f"{e.__class__.__name__}: {e.message}")
+        if e.details:
+            logger.error(f"Details: {e.details}")
+        return e
+    logger.error(f"Unexpected error: {str(e)}")
+    logger.error(traceback.format_exc())
+    return AutomationError(f"Unexpected error: {str(e)}", traceback.format_exc())
+
 def handle_error(func):
-    """Decorator to handle exceptions in functions."""
+    """Decorator to handle exceptions in functions and coroutine functions."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                error = _log_and_wrap(e)
+                if error is e:
+                    raise
+                raise error
+        return async_wrapper
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
-        except AutomationError as e:
-            logger.error(f"{e.__class__.__name__}: {e.message}")
-            if e.details:
-                logger.error(f"Details: {e.details}")
-            raise
         except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}")
-            logger.error(traceback.format_exc())
-            raise AutomationError(f"Unexpected error: {str(e)}", traceback.format_exc())
+            error = _log_and_wrap(e)
+            if error is e:
+                raise
+            raise error
     return wrapper
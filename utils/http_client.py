@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import weakref
+import httpx
+import config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# One client per event loop, since a client's connections belong to the loop that opened them
+_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _http2_available():
+    """Check whether the optional h2 package is installed."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_client():
+    """Build a pooled HTTP client from the configuration."""
+    http2 = config.HTTP2_ENABLED and _http2_available()
+    if config.HTTP2_ENABLED and not http2:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1")
+
+    limits = httpx.Limits(
+        max_connections=config.HTTP_POOL_SIZE,
+        max_keepalive_connections=config.HTTP_POOL_SIZE,
+        keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(
+        connect=config.HTTP_CONNECT_TIMEOUT,
+        read=config.HTTP_READ_TIMEOUT,
+        write=config.HTTP_CONNECT_TIMEOUT,
+        pool=config.HTTP_CONNECT_TIMEOUT
+    )
+
+    logger.info(f"Opening HTTP client (pool_size={config.HTTP_POOL_SIZE}, http2={http2})")
+    return httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
+
+
+def open_client():
+    """Open the running event loop's shared HTTP client if it is not open yet."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _clients.get(loop)
+        if client is None or client.is_closed:
+            client = _clients[loop] = _build_client()
+        return client
+
+
+def get_client():
+    """Get the running event loop's shared HTTP client, opening it on first use."""
+    client = _clients.get(asyncio.get_running_loop())
+    if client is None or client.is_closed:
+        client = open_client()
+    return client
+
+
+async def close_client():
+    """Close the running event loop's shared HTTP client and release its connections."""
+    with _lock:
+        client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        logger.info("Closing HTTP client")
+        await client.aclose()
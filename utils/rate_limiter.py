@@ -0,0 +1,196 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+import config
+from utils.logger import get_logger
+from utils.request_policy import LatencyHistogram
+
+logger = get_logger(__name__)
+
+# Priority of the current task's model calls; lower goes first. Tasks that started
+# earlier get lower values, so work already in flight finishes before new work starts.
+_task_priority = contextvars.ContextVar("task_priority", default=None)
+
+
+def set_task_priority(priority=None):
+    """Set the priority of the model calls made from the current task (default: its start time)."""
+    _task_priority.set(time.monotonic() if priority is None else priority)
+
+
+def estimate_tokens(messages, max_tokens):
+    """Rough token count of a request: about four characters per token, plus the completion."""
+    chars = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            # Images count as a flat allowance, text parts by length
+            chars += sum(len(part.get("text", "")) if part.get("type") == "text" else 4000
+                         for part in content)
+    return chars // 4 + max_tokens
+
+
+class TokenBucket:
+    """Refills at a per-minute rate up to one minute's worth; a rate of 0 means unlimited."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount can be taken, 0 when it can be taken now."""
+        if not self.rate:
+            return 0
+        self._refill()
+        # Requests bigger than the bucket only wait for a full bucket
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0) / self.rate
+
+    def take(self, amount):
+        if self.rate:
+            self._refill()
+            self.level -= amount
+
+
+class ModelLimiter:
+    """Concurrency cap plus request and token budgets for one model.
+
+    Callers queue by priority and are let through in that order when a
+    slot is free and both budgets allow the request, so a request is never
+    overtaken by a lower-priority one.
+    """
+
+    def __init__(self, model, max_concurrency, requests_per_minute, tokens_per_minute):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self.queue = []
+        self._sequence = itertools.count()
+        self._timer = None
+        self.wait_histogram = LatencyHistogram()
+        self.counters = {"requests": 0, "queued": 0, "cancelled": 0}
+
+    @property
+    def queue_depth(self):
+        """Number of requests waiting; cancelled waits may linger in the heap until popped."""
+        return sum(1 for entry in self.queue if entry[3] is not None and not entry[3].done())
+
+    @property
+    def saturated(self):
+        """Whether requests are waiting, i.e. more would only queue up."""
+        return self.queue_depth > 0
+
+    @contextlib.asynccontextmanager
+    async def slot(self, tokens=0):
+        """Wait for a turn to send a request of an estimated size, and hold it while sending."""
+        priority = _task_priority.get()
+        if priority is None:
+            priority = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._sequence), tokens, waiter]
+        start = time.perf_counter()
+        heapq.heappush(self.queue, entry)
+        self._dispatch()
+        if not waiter.done():
+            self.counters["queued"] += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just as the wait was cancelled: give the slot back
+                self._release()
+            else:
+                entry[3] = None
+                self.counters["cancelled"] += 1
+                self._dispatch()
+            raise
+        self.wait_histogram.observe(time.perf_counter() - start)
+        self.counters["requests"] += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def record_usage(self, estimated, actual):
+        """Correct the token budget once a response reports how many tokens it really used."""
+        self.tokens.take(actual - estimated)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Let queued requests through in priority order while slots and budgets allow."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self.queue:
+            _, _, tokens, waiter = self.queue[0]
+            if waiter is None or waiter.done():
+                heapq.heappop(self.queue)
+                continue
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                return
+            delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if delay > 0:
+                # Try again once the budgets have refilled enough for the head of the queue
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self.queue)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def stats(self):
+        return dict(
+            self.counters,
+            in_flight=self.in_flight,
+            queue_depth=self.queue_depth,
+            wait_p50=self.wait_histogram.percentile(50),
+            wait_p99=self.wait_histogram.percentile(99),
+            wait_mean=round(self.wait_histogram.total / self.wait_histogram.count, 3)
+            if self.wait_histogram.count else None
+        )
+
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+def get_limiter(model):
+    """Get the limiter shared by every call to a model, creating it on first use."""
+    with _lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            concurrency, requests_per_minute, tokens_per_minute = config.MODEL_LIMITS.get(
+                model, (config.MODEL_MAX_CONCURRENCY, config.MODEL_REQUESTS_PER_MINUTE,
+                        config.MODEL_TOKENS_PER_MINUTE)
+            )
+            limiter = _limiters[model] = ModelLimiter(
+                model, concurrency, requests_per_minute, tokens_per_minute
+            )
+            logger.info(f"Limiting {model} to {concurrency or 'unlimited'} concurrent requests, "
+                        f"{requests_per_minute or 'unlimited'} requests/min, "
+                        f"{tokens_per_minute or 'unlimited'} tokens/min")
+        return limiter
+
+
+def limiter_stats():
+    """Get queue and wait metrics per model."""
+    with _lock:
+        return {model: limiter.stats() for model, limiter in _limiters.items()}
@@ -0,0 +1,235 @@
+import asyncio
+import bisect
+import contextlib
+import random
+import threading
+import time
+import httpx
+import config
+from utils.error_handler import APIError
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# HTTP statuses worth retrying: rate limiting and server-side failures
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def _bucket_bounds():
+    """Upper bounds of the latency buckets in seconds: 50 ms to 2 minutes, 25% apart."""
+    bounds = []
+    bound = 0.05
+    while bound < 120:
+        bounds.append(round(bound, 4))
+        bound *= 1.25
+    return bounds
+
+
+class LatencyHistogram:
+    """Latency histogram with logarithmic buckets, for percentiles at constant memory."""
+    BOUNDS = _bucket_bounds()
+
+    def __init__(self):
+        # One count per bucket, plus one for anything slower than the last bound
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, percent):
+        """Get the upper bound of the bucket holding a percentile, or None without samples."""
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for idx, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.BOUNDS[idx] if idx < len(self.BOUNDS) else self.BOUNDS[-1]
+        return self.BOUNDS[-1]
+
+
+class _CallStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.counters = {"calls": 0, "hedges": 0, "hedge_wins": 0, "retries": 0, "deadline_exceeded": 0}
+
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def _get_stats(call_type):
+    with _lock:
+        stats = _stats.get(call_type)
+        if stats is None:
+            stats = _stats[call_type] = _CallStats()
+        return stats
+
+
+def _count(call_type, counter):
+    stats = _get_stats(call_type)
+    with _lock:
+        stats.counters[counter] += 1
+
+
+def deadline_for(call_type):
+    """Get the deadline in seconds for a type of model call."""
+    return config.LLM_DEADLINES.get(call_type, config.LLM_DEADLINES["default"])
+
+
+def hedge_delay(call_type):
+    """Get how long to wait before hedging a call, or None while there are too few samples."""
+    stats = _get_stats(call_type)
+    with _lock:
+        if stats.histogram.count < config.HEDGE_MIN_SAMPLES:
+            return None
+        return stats.histogram.percentile(config.HEDGE_PERCENTILE)
+
+
+def latency_stats():
+    """Get latency percentiles and counters per type of model call."""
+    with _lock:
+        result = {}
+        for call_type, stats in _stats.items():
+            histogram = stats.histogram
+            result[call_type] = dict(
+                stats.counters,
+                samples=histogram.count,
+                mean=round(histogram.total / histogram.count, 3) if histogram.count else None,
+                p50=histogram.percentile(50),
+                p90=histogram.percentile(90),
+                p99=histogram.percentile(99),
+                hedge_after=histogram.percentile(config.HEDGE_PERCENTILE)
+                if histogram.count >= config.HEDGE_MIN_SAMPLES else None
+            )
+        return result
+
+
+def _retry_delay(attempt, error):
+    """Jittered exponential backoff, stretched to honour a Retry-After header."""
+    delay = random.uniform(0.5, 1.0) * min(config.RETRY_BACKOFF_MAX, config.RETRY_BACKOFF_BASE * 2 ** attempt)
+    if isinstance(error, httpx.HTTPStatusError):
+        try:
+            delay = max(delay, float(error.response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return min(delay, config.RETRY_BACKOFF_MAX)
+
+
+def _retryable(error):
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUSES
+    # A truncated or garbled body is as transient as a dropped connection
+    return isinstance(error, (httpx.TransportError, httpx.DecodingError))
+
+
+async def _attempt(call_type, send, limiter, tokens, primary=True):
+    """Send one request, retrying rate limits and server errors with backoff.
+
+    Only the primary request of a call records how long it took when it is
+    cancelled: a hedge is cancelled early whenever the primary wins, and
+    those short samples would pull the hedge threshold down.
+    """
+    stats = _get_stats(call_type)
+    attempt = 0
+    while True:
+        start = None
+        try:
+            async with limiter.slot(tokens) if limiter else contextlib.nullcontext():
+                # Time the request itself, not the wait for the limiter
+                start = time.perf_counter()
+                result = await send()
+        except asyncio.CancelledError:
+            if start is not None and primary:
+                # A primary request that lost the race still took at least this long;
+                # leaving it out would make the tail look shorter than it is
+                with _lock:
+                    stats.histogram.observe(time.perf_counter() - start)
+            raise
+        except httpx.HTTPError as e:
+            if not _retryable(e) or attempt + 1 >= config.RETRY_MAX_ATTEMPTS:
+                raise
+            delay = _retry_delay(attempt, e)
+            logger.warning(f"Retrying {call_type} call in {delay:.2f}s after: {str(e)}")
+            _count(call_type, "retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+            continue
+        with _lock:
+            stats.histogram.observe(time.perf_counter() - start)
+        return result
+
+
+async def _race(call_type, send, limiter, tokens, hedge=True):
+    """Run a call, sending a duplicate when it is slower than usual; the first success wins."""
+    primary = asyncio.ensure_future(_attempt(call_type, send, limiter, tokens))
+    tasks = [primary]
+    sent = 1
+    delay = hedge_delay(call_type) if config.HEDGE_ENABLED and hedge else None
+    error = None
+    try:
+        while tasks:
+            timeout = delay if delay is not None and sent < config.HEDGE_MAX_REQUESTS else None
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if limiter is not None and limiter.saturated:
+                    # A duplicate would only queue behind other calls to the same model
+                    logger.debug(f"Not hedging {call_type} call, {limiter.model} is saturated")
+                    delay = None
+                    continue
+                logger.info(f"Hedging {call_type} call after {delay:.2f}s")
+                _count(call_type, "hedges")
+                tasks.append(asyncio.ensure_future(_attempt(call_type, send, limiter, tokens, primary=False)))
+                sent += 1
+                continue
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        _count(call_type, "hedge_wins")
+                    return task.result()
+                error = task.exception()
+            # A failed request is no reason to give up on one still in flight
+            tasks = [task for task in tasks if task not in done]
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call_with_policy(call_type, send, limiter=None, tokens=0, stream=False):
+    """
+    Make a model call with a deadline, retries and hedging.
+
+    Args:
+        call_type (str): 'plan', 'vision', 'operation' or 'default'; selects the
+            deadline and the latency histogram that sets the hedge threshold
+        send: Coroutine function that sends the request once and returns the result
+        limiter (ModelLimiter): Limiter every request (retries and hedges included) waits for
+        tokens (int): Estimated size of a request, for the limiter's token budget
+        stream (bool): send opens a stream and returns once its first chunk arrived.
+            Streams get the call type's deadline and retries but are not hedged, as
+            a stream cannot be handed over once read from, and their time to first
+            chunk is kept in a histogram of its own ('<call_type>_stream')
+
+    Returns:
+        The result of the first request that succeeded
+
+    Raises:
+        APIError: If the deadline passed first
+        httpx.HTTPError: If every request failed
+    """
+    deadline = deadline_for(call_type)
+    if stream:
+        call_type = f"{call_type}_stream"
+    _count(call_type, "calls")
+    try:
+        return await asyncio.wait_for(_race(call_type, send, limiter, tokens, hedge=not stream),
+                                      timeout=deadline or None)
+    except asyncio.TimeoutError:
+        _count(call_type, "deadline_exceeded")
+        raise APIError(f"{call_type} call exceeded its {deadline}s deadline")
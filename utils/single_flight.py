@@ -0,0 +1,83 @@
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def payload_key(url, payload):
+    """Hash a request canonically, so byte-for-byte equal requests share a key."""
+    canonical = json.dumps([url, payload], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs identical concurrent calls once and gives every caller the result.
+
+    Nothing is kept once a call finishes: a call made after that is sent
+    again. A shared call is only cancelled when every caller waiting on it
+    has given up.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(SingleFlight, cls).__new__(cls)
+                cls._instance._initialize()
+            return cls._instance
+
+    def _initialize(self):
+        self.flights = {}
+        self.stats_counters = {"calls": 0, "shared": 0}
+
+    async def do(self, key, call):
+        """
+        Run call(), or wait for the identical call already in flight.
+
+        Args:
+            key (str): Identity of the call, e.g. from payload_key
+            call: Coroutine function making the call
+
+        Returns:
+            A copy of the call's result, so no caller sees another one's changes to it
+        """
+        flight = self.flights.get(key)
+        joined = flight is not None
+        if joined:
+            self.stats_counters["shared"] += 1
+            logger.debug(f"Joining in-flight call {key[:12]}")
+        else:
+            flight = self.flights[key] = _Flight(asyncio.ensure_future(call()))
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+        self.stats_counters["calls"] += 1
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Nobody wants the result any more
+                flight.task.cancel()
+        return copy.deepcopy(result)
+
+    def _land(self, key, flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+    def stats(self):
+        """Get call counters and the number of calls in flight."""
+        return dict(self.stats_counters, in_flight=len(self.flights))
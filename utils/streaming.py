@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+_DONE = object()
+
+
+class JSONArrayStream:
+    """Incremental parser that yields elements of a JSON array as soon as they close.
+
+    Text before the opening '[' (e.g. a markdown code fence) is ignored, as is
+    anything after the closing ']'.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._element_start = None
+        self.started = False
+        self.finished = False
+
+    def feed(self, text):
+        """Feed a chunk of text and return the list of newly completed elements."""
+        self._buffer += text
+        elements = []
+
+        while self._pos < len(self._buffer) and not self.finished:
+            char = self._buffer[self._pos]
+
+            if not self.started:
+                if char == '[':
+                    self.started = True
+                    self._depth = 1
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        elements.append(self._close_element(self._pos + 1))
+            elif char == '"':
+                if self._depth == 1:
+                    self._element_start = self._pos
+                self._in_string = True
+            elif char in '[{':
+                if self._depth == 1:
+                    self._element_start = self._pos
+                self._depth += 1
+            elif char in ']}':
+                self._depth -= 1
+                if self._depth == 1:
+                    elements.append(self._close_element(self._pos + 1))
+                elif self._depth == 0:
+                    # End of the top-level array; flush a trailing scalar if any
+                    if self._element_start is not None:
+                        elements.append(self._close_element(self._pos))
+                    self.finished = True
+            elif self._depth == 1:
+                if char == ',':
+                    if self._element_start is not None:
+                        elements.append(self._close_element(self._pos))
+                elif not char.isspace() and self._element_start is None:
+                    self._element_start = self._pos
+
+            self._pos += 1
+
+        # Drop consumed text so the buffer does not grow with the response
+        if self._element_start is None and self._pos > 0:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+
+        return elements
+
+    def _close_element(self, end):
+        """Decode the element that started at _element_start and ends at end."""
+        raw = self._buffer[self._element_start:end].strip()
+        self._element_start = None
+        return json.loads(raw)
+
+
+async def read_ahead(async_iterable, maxsize=0):
+    """Consume an async iterable in a background task and yield its items.
+
+    This keeps a network stream flowing while the consumer is busy with
+    earlier items (for example while commands are being executed).
+    """
+    queue = asyncio.Queue(maxsize)
+
+    async def pump():
+        try:
+            async for item in async_iterable:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_DONE)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        if not task.done():
+            task.cancel()
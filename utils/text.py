@@ -0,0 +1,10 @@
+import unicodedata
+
+
+def normalize_key(text):
+    """Normalize user-given text (an intent, a prompt) for use as a cache key.
+
+    Only the Unicode form and surrounding whitespace are normalized: case,
+    inner spacing and punctuation can be part of the text a plan types.
+    """
+    return unicodedata.normalize("NFKC", text).strip()